@@ -1,6 +1,6 @@
 import pandas as pd
 import streamlit as st
-from dao import database
+from dao import cache, cliente_http, database, journal, resiliente, trazas
 from tabs.tab_analisis import AnalisisTab
 from tabs.tab_historial import HistorialTab
 from tabs.tab_reduccion import ReduccionTab
@@ -8,84 +8,177 @@ from tabs.tab_reduccion_por_tiempo import PlanificacionTiempoTab
 from tabs.tab_reduccion_por_dosis import PlanificacionDosisTab
 from tabs.tab_toma import TomaTab
 import logging
-from state import load_config # <-- Importa la nueva función
-import streamlit.components.v1 as components
-from config import constants
+import time
+from neg import instantanea
+from state import cambiar_perfil, load_config, invalidate_config # <-- Importa la nueva función
+from config import constants, perfiles
 
 # --- CONFIGURACIÓN DE LOGGING --- (si no la tienes ya)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
 
+
+def elegir_perfil():
+    """
+    Con PERFILES, la sesión necesita uno antes de cargar nada: el de ?perfil=nombre en la
+    URL si no pide clave, o el elegido en la pantalla de entrada.
+    """
+    if not constants.PERFILES:
+        return
+    pedido = st.query_params.get("perfil")
+    actual = st.session_state.get("perfil")
+    if actual is not None and pedido in (None, actual):
+        return
+    if pedido in constants.PERFILES and perfiles.clave_valida(pedido, None):
+        cambiar_perfil(pedido)
+        return
+
+    st.title("📉 Reductor GHB")
+    nombres = perfiles.nombres()
+    with st.form("entrada"):
+        perfil = st.selectbox("Perfil", nombres, index=nombres.index(pedido) if pedido in nombres else 0)
+        clave = st.text_input("Clave", type="password")
+        if st.form_submit_button("Entrar"):
+            if perfiles.clave_valida(perfil, clave):
+                cambiar_perfil(perfil)
+                st.rerun()
+            st.error("Clave incorrecta")
+    st.stop()
+
+
 # --- CARGA INICIAL DEL ESTADO ---
-load_config() # <-- Llama a la función aquí
+inicio_rerun = time.time()
+elegir_perfil()
+resiliente.iniciar_presupuesto()  # Las lecturas remotas de este rerun no esperan más de PRESUPUESTO_PAGINA_SEGUNDOS
+journal.arrancar()  # Reenvía las tomas que quedaran pendientes de una ejecución anterior
+with trazas.span("load_config"):
+    load_config() # <-- Llama a la función aquí
+instantanea.construir()  # "ahora", fila de hoy de cada plan y última toma para todo el rerun
 # ------------------------------
 
 
 st.set_page_config(page_title="Reductor GHB", layout="wide")
 st.title("📉 Reductor GHB")
+if constants.PERFILES:
+    st.sidebar.caption(f"👤 {st.session_state.perfil}")
+    if st.sidebar.button("Cambiar de perfil"):
+        cambiar_perfil(None)
+        st.rerun()
+diario = journal.estado()
+if diario["pendientes"]:
+    st.sidebar.warning(f"📮 {diario['pendientes']} escritura(s) pendiente(s) de enviar"
+                       + (f". Último error: {diario['ultimo_error']}" if diario["ultimo_error"] else ""))
+if diario["descartados"]:
+    st.sidebar.error(f"🚫 {diario['descartados']} escritura(s) no aceptada(s) por el servidor, guardadas en "
+                     f"{diario['fichero_descartados']}. Última: {diario['ultimo_descarte']}")
+if perfiles.valor("BACKEND") != "sheets" and perfiles.valor("SYNC_SHEETS"):
+    replica = journal.estado("replica")
+    if replica["pendientes"] or replica["descartados"]:
+        st.sidebar.warning(f"🔁 Réplica en Sheets: {replica['pendientes']} pendiente(s), "
+                           f"{replica['descartados']} descartada(s) en {replica['fichero_descartados']}"
+                           + (f". Último error: {replica['ultimo_error']}" if replica["ultimo_error"] else ""))
+with st.sidebar.expander("🗄️ Caché local", expanded=False):
+    st.json(database.estadisticas_cache())
+    st.caption("Latencia de las últimas llamadas HTTP")
+    st.dataframe(pd.DataFrame(cliente_http.latencias()), hide_index=True)
+    st.caption("Caché compartida entre sesiones")
+    st.json(cache.estadisticas())
+    st.json(cache.memoria())
+    st.caption("Circuitos de lectura del Web App")
+    st.json(resiliente.estado())
+    if st.button("🔄 Resincronizar tomas"):
+        database.sync_tomas(completo=True)
+        invalidate_config(cache.TOMAS)
+        st.rerun()
 # try:
-excel_data = database.get_excel_data()
-
-# Definir pestañas dinámicamente
-tabs_labels = ["📉 Tomas", "⏱️ Planificador", "⏱️ Reducción por Tiempos", "💊 Reducción por Dosis"]
-if constants.SHOW_BIO_ANALYSIS:
-    tabs_labels.append("🧬 Bio-Análisis")
-tabs_labels.append("📜 Historial")
+excel_data = st.session_state.tomas
 
-tabs = st.tabs(tabs_labels)
-
-# Asignar pestañas a variables
-t_toma = tabs[0]
-t_plan = tabs[1]
-t_red_tiempo = tabs[2]
-t_red_dosis = tabs[3]
-
-idx = 4
-t_bio = None
-if constants.SHOW_BIO_ANALYSIS:
-    t_bio = tabs[idx]
-    idx += 1
-
-t_historial = tabs[idx]
-
-with t_toma:
+@trazas.medido("seccion.tomas")
+def seccion_tomas():
     tab = TomaTab(excel_data)
     tab.mostrar_registro()
+    tab.mostrar_pendientes()
     tab.mostrar_metricas()
     st.markdown("---")
-with t_plan:
+
+
+@trazas.medido("seccion.planificador")
+def seccion_planificador():
     st.header("⏱️ Planificación:")
     tab = ReduccionTab()
     tab.render()
-with t_red_tiempo:
+
+
+@trazas.medido("seccion.reduccion_tiempo")
+def seccion_reduccion_tiempo():
     st.header("⏱️ Planificación: Reducción por Tiempo")
     tab = PlanificacionTiempoTab(excel_data)
     tab.render()
-with t_red_dosis:
+
+
+@trazas.medido("seccion.reduccion_dosis")
+def seccion_reduccion_dosis():
     st.header("💊 Planificación: Reducción por Dosis")
     tab = PlanificacionDosisTab()
     tab.render()
 
-if t_bio:
-    with t_bio:
-        st.subheader("🧬 Bio-Análisis y Calibración")
-        tab = AnalisisTab(excel_data)
-        ka, hl = tab.render_parametros_simulacion()
-        tab.render_grafica(hl, ka)
 
-with t_historial:
+@trazas.medido("seccion.bio")
+def seccion_bio():
+    st.subheader("🧬 Bio-Análisis y Calibración")
+    tab = AnalisisTab(excel_data)
+    ka, hl = tab.render_parametros_simulacion()
+    tab.render_grafica(hl, ka)
+
+
+@trazas.medido("seccion.historial")
+def seccion_historial():
     st.subheader("📜 Historial Detallado de Tomas")
     tab = HistorialTab(excel_data)
+    with st.expander("📊 Resumen por día", expanded=False):
+        tab.render_resumen_diario()
     tab.render_tabla_historial()
 
-# Auto-refresco cada 5 minutos (300000 ms)
-components.html(
-    """
-    <script>
-        setTimeout(function(){
-            window.location.reload();
-        }, 300000);
-    </script>
-    """,
-    height=0,
-    width=0
-)
+
+# Definir secciones dinámicamente
+secciones = {
+    "📉 Tomas": seccion_tomas,
+    "⏱️ Planificador": seccion_planificador,
+    "⏱️ Reducción por Tiempos": seccion_reduccion_tiempo,
+    "💊 Reducción por Dosis": seccion_reduccion_dosis,
+}
+if constants.SHOW_BIO_ANALYSIS:
+    secciones["🧬 Bio-Análisis"] = seccion_bio
+secciones["📜 Historial"] = seccion_historial
+
+if constants.NAVEGACION == "secciones":
+    # Solo se ejecuta la sección elegida: registrar una toma no paga el historial ni el análisis
+    elegida = st.segmented_control("Sección", list(secciones), default="📉 Tomas",
+                                   key="seccion", label_visibility="collapsed")
+    secciones[elegida or "📉 Tomas"]()
+else:
+    for contenedor, seccion in zip(st.tabs(list(secciones)), secciones.values()):
+        with contenedor:
+            seccion()
+
+if constants.TRAZAS_PANEL:
+    with st.sidebar.expander("🐞 Trazas", expanded=False):
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        st.caption("Este rerun")
+        spans = trazas.recientes(get_script_run_ctx().session_id, desde=inicio_rerun)
+        st.dataframe(pd.DataFrame(spans, columns=["nombre", "padre", "ms", "bytes", "cache", "error"]),
+                     hide_index=True)
+        st.caption("Acumulado del proceso")
+        st.dataframe(pd.DataFrame(trazas.resumen()), hide_index=True)
+
+# Refresco de datos remotos sin recargar la página (que crearía una sesión nueva): cada
+# DATOS_REFRESCO_SEGUNDOS se recargan las fuentes caducadas y, si ha cambiado algo, se
+# vuelve a pintar la página con los datos nuevos.
+@st.fragment(run_every=constants.DATOS_REFRESCO_SEGUNDOS)
+def refresco_datos():
+    resiliente.iniciar_presupuesto()
+    if load_config():
+        st.rerun()
+
+
+refresco_datos()
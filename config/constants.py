@@ -5,6 +5,98 @@ URL_WEB_APP = "https://script.google.com/macros/s/AKfycbyHETndHtDHHJENi-GjW1MvK-
 
 # ID de la hoja de cálculo de Google Sheets
 SHEET_ID = "18KYPnVSOQF6I2Lm5P1j5nFx1y1RXSmfMWf9jBR2WJ-Q"
+# Exportación CSV de la hoja de tomas (con scripts/servidor_webapp_local.py: "http://127.0.0.1:8765/export")
+URL_EXPORT_CSV = "https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
+
+# Perfiles: varias personas servidas por el mismo proceso. Cada perfil puede redefinir
+# SHEET_ID, URL_WEB_APP, URL_EXPORT_CSV, BACKEND, SYNC_SHEETS y GOOGLE_FIT_SECRET, y opcionalmente
+# pedir una CLAVE al entrar; sus ficheros locales (CACHE_DIR, SQLITE_PATH, JOURNAL_PATH,
+# PULSO_DIR) van a una subcarpeta con su nombre. Se elige al entrar o con ?perfil=nombre.
+# Vacío: una sola persona con los valores de este fichero.
+# PERFILES = {"ana": {"SHEET_ID": "...", "URL_WEB_APP": "...", "CLAVE": "..."}, "luis": {...}}
+PERFILES = {}
 
 # Mostrar u ocultar secciones
-SHOW_BIO_ANALYSIS = False
\ No newline at end of file
+SHOW_BIO_ANALYSIS = False
+
+# Snapshot local de datos remotos
+CACHE_DIR = ".cache"
+CACHE_REFRESCO_SEGUNDOS = 60
+# Pedir al Web App solo las tomas nuevas (acción get_tomas_since) en lugar del CSV completo
+SYNC_INCREMENTAL = True
+
+# Usar el sustituto en memoria del Web App (dao/webapp_local.py) para trabajar sin red
+WEB_APP_LOCAL = False
+
+# Cliente HTTP compartido: timeout (conexión, lectura) en segundos y tamaño del pool
+HTTP_TIMEOUT = (5, 20)
+HTTP_POOL_HOSTS = 4
+HTTP_POOL_CONEXIONES = 16
+
+# Lecturas resilientes del Web App (dao/resiliente.py): tiempo máximo de las lecturas de un
+# rerun, reintentos con espera exponencial (base en segundos) y circuit breaker (fallos
+# seguidos que lo abren y segundos que sirve el último valor bueno sin llamar al remoto)
+PRESUPUESTO_PAGINA_SEGUNDOS = 15
+REINTENTOS_LECTURA = 3
+REINTENTO_BASE_SEGUNDOS = 0.5
+CIRCUITO_FALLOS = 3
+CIRCUITO_ABIERTO_SEGUNDOS = 60
+# Timeout (conexión, lectura) del envío directo de una toma
+HTTP_TIMEOUT_TOMA = (5, 15)
+
+# Caché compartida entre sesiones (dao/cache.py): memoria máxima (MB) de los datos de un
+# perfil y del total; al superarla se descartan los valores usados hace más tiempo
+CACHE_MEMORIA_PERFIL_MB = 64
+CACHE_MEMORIA_TOTAL_MB = 512
+# Segundos de vida por fuente
+CACHE_TTL_SEGUNDOS = {
+    "config": 300,
+    "plan_tiempo": 300,
+    "plan_dosis": 300,
+    "tomas": 120,
+    "google_fit": 60,
+    # Sonda get_revisions: la comparten las cargas de un mismo refresco
+    "revisiones": 10,
+}
+
+# Backend de datos: "sheets" (Google Sheets + Apps Script) o "sqlite" (fichero local)
+BACKEND = "sheets"
+SQLITE_PATH = "datos/reductor.sqlite3"
+# Con backend "sqlite", replicar también cada escritura en Google Sheets
+SYNC_SHEETS = False
+
+# Diario local de escrituras pendientes de confirmar (dao/journal.py)
+JOURNAL_PATH = "datos/journal.jsonl"
+JOURNAL_REINTENTO_MAX_SEGUNDOS = 300
+# Lotes que el remoto rechaza, o que fallan JOURNAL_MAX_INTENTOS veces con respuesta del
+# servidor, pasan a este fichero para no bloquear los siguientes (sin red no cuenta como intento)
+JOURNAL_FALLIDOS_PATH = "datos/journal_fallidos.jsonl"
+JOURNAL_MAX_INTENTOS = 8
+# Cola de réplica en Google Sheets de las escrituras del backend local (SYNC_SHEETS)
+JOURNAL_REPLICA_PATH = "datos/replica_sheets.jsonl"
+JOURNAL_REPLICA_FALLIDOS_PATH = "datos/replica_sheets_fallidos.jsonl"
+
+# Refresco sin recargar la página: métricas de la pestaña de tomas (solo con datos ya
+# cargados) y comprobación de datos remotos caducados en la caché compartida
+METRICAS_REFRESCO_SEGUNDOS = 30
+DATOS_REFRESCO_SEGUNDOS = 300
+
+# Navegación: "secciones" (solo se calcula y pinta la sección elegida) o "pestañas"
+# (st.tabs, que pinta todas en cada rerun)
+NAVEGACION = "secciones"
+
+# Trazas (dao/trazas.py): panel de depuración en la barra lateral y salida persistente,
+# None, "jsonl" (un span por línea) o "prometheus" (textfile para node_exporter)
+TRAZAS_PANEL = False
+TRAZAS_SALIDA = None
+TRAZAS_RUTA = "datos/trazas.jsonl"
+TRAZAS_VOLCADO_SEGUNDOS = 10
+
+# Pulso de Google Fit: almacén local incremental y horas que se muestran
+PULSO_DIR = "datos/pulso"
+# Secreto de Streamlit con el token de Google Fit
+GOOGLE_FIT_SECRET = "google_fit_token"
+FIT_VENTANA_HORAS = 48
+# Horas que se vuelven a pedir antes del último minuto guardado: Google Fit recibe tarde
+# el pulso que el reloj sincroniza con retraso (los minutos repetidos se sobrescriben)
+FIT_SOLAPE_HORAS = 3
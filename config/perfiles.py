@@ -0,0 +1,65 @@
+import hmac
+import os
+import threading
+from contextlib import contextmanager
+
+from config import constants
+
+# Perfil (persona) de la sesión en curso. Cada perfil tiene su hoja, su Web App y sus
+# ficheros locales; el proceso, el pool HTTP y la caché compartida son comunes.
+# Sin PERFILES en config/constants.py todo funciona como con una sola persona.
+
+_local = threading.local()
+
+
+def nombres():
+    return list(constants.PERFILES)
+
+
+def actual():
+    """
+    Perfil en uso: el fijado con usar() en este hilo o, dentro de un rerun de Streamlit,
+    el elegido en la sesión. None si no hay perfiles configurados.
+    """
+    perfil = getattr(_local, "perfil", None)
+    if perfil is not None or not constants.PERFILES:
+        return perfil
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    return st.session_state.get("perfil") if get_script_run_ctx(suppress_warning=True) else None
+
+
+@contextmanager
+def usar(perfil):
+    """Fija el perfil en este hilo (hilos en segundo plano y trabajadores de load_config)."""
+    anterior = getattr(_local, "perfil", None)
+    _local.perfil = perfil
+    try:
+        yield
+    finally:
+        _local.perfil = anterior
+
+
+def valor(nombre):
+    """Valor de la constante `nombre` redefinido por el perfil en uso, o el de constants."""
+    return constants.PERFILES.get(actual(), {}).get(nombre, getattr(constants, nombre))
+
+
+def ruta(base):
+    """
+    Ruta local de `base` (fichero o carpeta) en el espacio del perfil en uso: una
+    subcarpeta con su nombre junto a ella. Sin perfil, la propia `base`.
+    """
+    perfil = actual()
+    if perfil is None:
+        return base
+    directorio, nombre = os.path.split(base)
+    if os.path.splitext(nombre)[1]:
+        return os.path.join(directorio, perfil, nombre)
+    return os.path.join(base, perfil)
+
+
+def clave_valida(perfil, clave):
+    """True si `clave` abre el perfil (los perfiles sin CLAVE no la piden)."""
+    esperada = constants.PERFILES.get(perfil, {}).get("CLAVE")
+    return perfil in constants.PERFILES and (not esperada or hmac.compare_digest(str(clave or ""), esperada))
@@ -0,0 +1,81 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config import constants, perfiles
+
+# Almacén local de pulso: un único .npy mapeado en memoria, ordenado por minuto, con dos campos
+# int64 (minutos desde epoch, UTC) y float32 (lpm). Al ser un solo fichero, una reescritura se
+# publica con un único os.replace y un lector nunca ve minutos y lpm de versiones distintas.
+_DTYPE = np.dtype([('minuto', np.int64), ('bpm', np.float32)])
+_lock = threading.Lock()
+
+
+def _dir():
+    return perfiles.ruta(constants.PULSO_DIR)
+
+
+def _ruta():
+    return os.path.join(_dir(), "pulso.npy")
+
+
+def _rutas_antiguas():
+    # Formato anterior: minutos y lpm en dos ficheros
+    return os.path.join(_dir(), "minutos.npy"), os.path.join(_dir(), "bpm.npy")
+
+
+def cargar():
+    """Devuelve (minutos, bpm) mapeados en memoria, o arrays vacíos si aún no hay datos."""
+    try:
+        datos = np.load(_ruta(), mmap_mode='r')
+    except FileNotFoundError:
+        ruta_min, ruta_bpm = _rutas_antiguas()
+        if not (os.path.exists(ruta_min) and os.path.exists(ruta_bpm)):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.load(ruta_min), np.load(ruta_bpm)
+    return datos['minuto'], datos['bpm']
+
+
+def ultimo_minuto():
+    minutos, _ = cargar()
+    return int(minutos[-1]) if len(minutos) else None
+
+
+def anadir(minutos_nuevos, bpm_nuevos):
+    """Fusiona minutos nuevos (los repetidos se sobrescriben) y reescribe el fichero de forma atómica."""
+    if len(minutos_nuevos) == 0:
+        return
+    with _lock:
+        previos, bpm_previos = cargar()
+        minutos = np.concatenate([np.asarray(previos), np.asarray(minutos_nuevos, dtype=np.int64)])
+        bpm = np.concatenate([np.asarray(bpm_previos), np.asarray(bpm_nuevos, dtype=np.float32)])
+        # Ante minutos repetidos se queda el valor más reciente (el último añadido)
+        orden = np.argsort(minutos, kind='stable')
+        minutos, bpm = minutos[orden], bpm[orden]
+        ultimo_de_cada = np.append(minutos[1:] != minutos[:-1], True)
+        minutos, bpm = minutos[ultimo_de_cada], bpm[ultimo_de_cada]
+        if np.array_equal(minutos, previos) and np.array_equal(bpm, bpm_previos):
+            return  # Solo minutos ya guardados (el solape de Google Fit): nada que reescribir
+
+        datos = np.empty(len(minutos), dtype=_DTYPE)
+        datos['minuto'], datos['bpm'] = minutos, bpm
+        os.makedirs(_dir(), exist_ok=True)
+        tmp = _ruta() + ".tmp.npy"
+        np.save(tmp, datos)
+        os.replace(tmp, _ruta())
+        for ruta in _rutas_antiguas():
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def ventana(desde_minuto, hasta_minuto=None):
+    """DataFrame 'hr' con índice Europe/Madrid entre los minutos indicados (búsqueda binaria)."""
+    minutos, bpm = cargar()
+    ini = np.searchsorted(minutos, desde_minuto, side='left')
+    fin = len(minutos) if hasta_minuto is None else np.searchsorted(minutos, hasta_minuto, side='right')
+    if fin <= ini:
+        return pd.DataFrame()
+    indice = pd.to_datetime(np.asarray(minutos[ini:fin]) * 60, unit='s', utc=True).tz_convert('Europe/Madrid')
+    return pd.DataFrame({'hr': np.asarray(bpm[ini:fin], dtype=float)}, index=pd.Index(indice, name='timestamp'))
@@ -0,0 +1,303 @@
+import functools
+import logging
+
+import pandas as pd
+import io
+import hashlib
+
+from config import constants, perfiles
+from dao import cliente_http, google_fit, resiliente, snapshot, webapp_local
+from dao.operaciones import LoteRechazado, op_save_config, op_save_plan_history, op_update_plan_rows
+
+SNAPSHOT_TOMAS = "tomas"
+
+
+def _get_web_app(params, timeout=None):
+    if constants.WEB_APP_LOCAL:
+        return webapp_local.get(params)
+    return cliente_http.get(perfiles.valor("URL_WEB_APP"), params=params, timeout=timeout or constants.HTTP_TIMEOUT)
+
+
+def _post_web_app(payload, timeout=None):
+    if constants.WEB_APP_LOCAL:
+        return webapp_local.post(payload)
+    return cliente_http.post(perfiles.valor("URL_WEB_APP"), json=payload, timeout=timeout or constants.HTTP_TIMEOUT)
+
+
+def _leer_web_app(params):
+    """
+    Lectura idempotente del Web App dentro del presupuesto de la página. Devuelve el campo
+    'data' y lanza una excepción ante un error HTTP, una página HTML o un status != success.
+    """
+    response = _get_web_app(params, timeout=resiliente.limitar(constants.HTTP_TIMEOUT))
+    response.raise_for_status()
+    try:
+        json_response = response.json()
+    except ValueError:
+        raise RuntimeError(f"Respuesta no válida del Web App: {response.text[:200]}")
+    if json_response.get('status') != 'success':
+        raise RuntimeError(f"Error del Web App en {params.get('action')}: {json_response.get('message')}")
+    return json_response.get('data')
+
+
+def _parsear_excel(contenido):
+    return _normalizar_tomas(pd.read_csv(io.BytesIO(contenido)))
+
+
+def _normalizar_tomas(df):
+    df.columns = df.columns.str.strip().str.lower()
+
+    if 'ml' in df.columns:
+        df['ml'] = df['ml'].astype(str).str.replace(',', '.').pipe(pd.to_numeric, errors='coerce').fillna(0)
+
+    # Formato fijo (rápido) y 'mixed' solo para las filas que no encajen
+    texto = df['fecha'].astype(str) + ' ' + df['hora'].astype(str)
+    df['timestamp'] = pd.to_datetime(texto, format='%d/%m/%Y %H:%M:%S', errors='coerce')
+    pendientes = df['timestamp'].isna()
+    if pendientes.any():
+        df.loc[pendientes, 'timestamp'] = pd.to_datetime(texto[pendientes], format='mixed', dayfirst=True)
+    if df['timestamp'].dt.tz is None:
+        df['timestamp'] = df['timestamp'].dt.tz_localize('Europe/Madrid')
+
+    return df.sort_values('timestamp', ascending=False)
+
+
+def _descargar_excel():
+    """
+    Descarga el CSV con una petición condicional (ETag/Last-Modified). Si el remoto
+    no ha cambiado (304 o mismo hash) solo renueva el snapshot. Devuelve el DataFrame
+    nuevo o None si no hubo cambios.
+    """
+    url = perfiles.valor("URL_EXPORT_CSV").format(sheet_id=perfiles.valor("SHEET_ID"))
+    meta = snapshot.leer_meta(SNAPSHOT_TOMAS)
+    cabeceras = {"Cache-Control": "no-cache"}
+    if not meta.get("invalidado"):
+        if meta.get("etag"):
+            cabeceras["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            cabeceras["If-Modified-Since"] = meta["last_modified"]
+
+    if constants.WEB_APP_LOCAL:
+        response = webapp_local.exportar_csv()
+    else:
+        response = cliente_http.get(url, etiqueta="export_csv", headers=cabeceras)
+    if response.status_code == 304:
+        snapshot.registrar_descarga(0, modificado=False)
+        snapshot.registrar_ahorro(meta.get("bytes", 0))
+        snapshot.marcar_comprobado(SNAPSHOT_TOMAS)
+        return None
+    response.raise_for_status()
+
+    contenido = response.content
+    huella = hashlib.sha256(contenido).hexdigest()
+    if huella == meta.get("sha256") and not meta.get("invalidado"):
+        snapshot.registrar_descarga(len(contenido), modificado=False)
+        snapshot.marcar_comprobado(SNAPSHOT_TOMAS)
+        return None
+
+    snapshot.registrar_descarga(len(contenido), modificado=True)
+    df = _parsear_excel(contenido)
+    snapshot.guardar(SNAPSHOT_TOMAS, df, sha256=huella, bytes=len(contenido), filas=len(df),
+                     etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+    return df
+
+
+def _checksum_tomas(df):
+    # Entero en centésimas de ml: sumar floats en JS y en pandas puede diferir en el último decimal
+    return int((df['ml'] * 100).round().sum()) if not df.empty else 0
+
+
+def sync_tomas(completo=False, df_local=None):
+    """
+    Sincronización incremental de tomas. Pide al Web App solo las filas posteriores a la
+    última conocida (marca de agua `filas` del snapshot) y las añade a la tabla local.
+
+    Contrato de la acción `get_tomas_since` (GET ?action=get_tomas_since&fila=N):
+    {"status": "success", "data": [{"fecha", "hora", "ml"}, ...],  # filas N+1..total
+     "total_filas": total, "checksum": suma de Math.round(ml * 100) de todas las filas}
+
+    Hace una descarga completa si se pide (`completo`), si no hay snapshot, si el remoto
+    tiene menos filas que la marca de agua o si el checksum no coincide tras la fusión.
+    `df_local` es el snapshot si quien llama ya lo ha cargado.
+    Devuelve el DataFrame resultante o None si el remoto no ha cambiado.
+    """
+    meta = snapshot.leer_meta(SNAPSHOT_TOMAS)
+    if completo or meta.get("invalidado") or "filas" not in meta:
+        df_local = None
+    elif df_local is None:
+        df_local = snapshot.cargar(SNAPSHOT_TOMAS)
+    if df_local is None:
+        return _descargar_excel()
+
+    try:
+        params = {"action": "get_tomas_since", "fila": meta["filas"]}
+        response = _get_web_app(params)
+        json_response = response.json()
+    except Exception as e:
+        logging.warning(f"SYNC: get_tomas_since no disponible ({e}), descarga completa")
+        return _descargar_excel()
+    if json_response.get('status') != 'success' or json_response.get('total_filas', 0) < meta["filas"]:
+        snapshot.invalidar(SNAPSHOT_TOMAS)
+        return _descargar_excel()
+
+    snapshot.registrar_descarga(len(response.content), modificado=bool(json_response.get('data')))
+    snapshot.registrar_ahorro(max(0, meta.get("bytes", 0) - len(response.content)))
+    data = json_response.get('data', [])
+    df = df_local
+    if data:
+        nuevas = _normalizar_tomas(pd.DataFrame(data))
+        df = pd.concat([nuevas, df_local], ignore_index=True).sort_values('timestamp', ascending=False)
+
+    if len(df) != json_response['total_filas'] or _checksum_tomas(df) != int(json_response.get('checksum', 0)):
+        logging.warning("SYNC: checksum de tomas distinto, resincronización completa")
+        snapshot.invalidar(SNAPSHOT_TOMAS)
+        return _descargar_excel()
+
+    if not data:
+        snapshot.marcar_comprobado(SNAPSHOT_TOMAS)
+        return None
+    snapshot.guardar(SNAPSHOT_TOMAS, df, **{**meta, "filas": len(df), "bytes": meta.get("bytes", 0),
+                                            "sha256": None, "etag": None, "last_modified": None})
+    return df
+
+
+def get_excel_data():
+    """
+    Tabla de tomas. Sirve el snapshot local si existe (y lo refresca en segundo plano);
+    si no, descarga y parsea el CSV de la hoja.
+    """
+    df = snapshot.cargar(SNAPSHOT_TOMAS)
+    # El snapshot ya cargado se reutiliza en la sincronización (una sola lectura y un solo hit)
+    refrescar = functools.partial(sync_tomas, df_local=df) if constants.SYNC_INCREMENTAL else _descargar_excel
+    if df is not None and snapshot.leer_meta(SNAPSHOT_TOMAS).get("desactualizado"):
+        # Tras registrar una toma: sincronizar ya (en modo incremental solo trae la fila nueva)
+        actualizado = refrescar()
+        return actualizado if actualizado is not None else df
+    if df is not None:
+        if not snapshot.refrescar_en_segundo_plano(SNAPSHOT_TOMAS, refrescar):
+            snapshot.registrar_ahorro(snapshot.leer_meta(SNAPSHOT_TOMAS).get("bytes", 0))
+        return df
+
+    df = _descargar_excel()
+    if df is None:
+        # Sin cambios en remoto pero el snapshot no se pudo leer: forzar descarga completa
+        snapshot.invalidar(SNAPSHOT_TOMAS)
+        df = _descargar_excel()
+    return df
+
+
+def forzar_sync_tomas():
+    """La próxima get_excel_data sincroniza con el remoto antes de servir el snapshot."""
+    snapshot.marcar_desactualizado(SNAPSHOT_TOMAS)
+
+
+def estadisticas_cache():
+    return snapshot.estadisticas(SNAPSHOT_TOMAS)
+
+
+def enviar_toma_api(fecha_str, hora_str, cantidad):
+    # Escritura no idempotente: sin reintentos (los hace el diario), pero con timeout acotado
+    payload = {"fecha": fecha_str, "hora": hora_str, "ml": cantidad}
+    response = _post_web_app(payload, timeout=constants.HTTP_TIMEOUT_TOMA)
+    snapshot.marcar_desactualizado(SNAPSHOT_TOMAS)
+    return response
+
+
+def ejecutar_lote(operaciones, id_lote=None):
+    """
+    Envía varias escrituras en una sola petición (acción `batch`) y devuelve la lista de
+    resultados. El Web App las aplica en orden bajo un único lock y, si alguna falla, no
+    aplica el resto y responde {"status": "error", "index": i, "message": ...}.
+    Con `id_lote`, un lote ya aplicado con ese id se responde como éxito sin repetirlo.
+    Lanza LoteRechazado si el Web App no acepta el lote (status != success o HTTP 4xx) y
+    otra excepción si el fallo puede ser pasajero (red, HTTP 5xx, página HTML).
+    """
+    # El lote hace varias escrituras en el Apps Script: más margen de lectura
+    response = _post_web_app({"action": "batch", "id": id_lote, "ops": operaciones}, timeout=(constants.HTTP_TIMEOUT[0], 40))
+    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+        raise LoteRechazado(f"El Web App rechaza el lote (HTTP {response.status_code})")
+    response.raise_for_status()
+    try:
+        json_response = response.json()
+    except ValueError:
+        raise RuntimeError(f"Respuesta no válida del Web App: {response.text[:200]}")
+    if json_response.get('status') != 'success':
+        raise LoteRechazado(f"Lote rechazado en la operación {json_response.get('index')}: {json_response.get('message')}")
+    if any(op.get("action") in ("add_toma", "delete_last") for op in operaciones):
+        snapshot.marcar_desactualizado(SNAPSHOT_TOMAS)
+    return json_response.get('results', [])
+def get_plan_history_data(sheet_name="Plan Tiempo"):
+    """
+    Obtiene el historial del plan desde Google Sheets. Si el remoto falla, sirve el último
+    historial bueno (dao/resiliente.py) en vez de una tabla vacía.
+    """
+    data = resiliente.leer(f"get_plan_history:{sheet_name}",
+                           lambda: _leer_web_app({"action": "get_plan_history", "sheetName": sheet_name}), vacio=[])
+    return pd.DataFrame(data) if data else pd.DataFrame()
+
+def save_plan_history_data(df, sheet_name="Plan Tiempo"):
+    """Guarda el historial del plan en Google Sheets."""
+    try:
+        _post_web_app(op_save_plan_history(df, sheet_name))
+    except Exception as e:
+        print(f"Error guardando historial plan: {e}")
+def update_plan_rows(sheet_name, cambios):
+    """Envía solo las celdas modificadas del plan (ver op_update_plan_rows)."""
+    try:
+        _post_web_app(op_update_plan_rows(sheet_name, cambios))
+        return True
+    except Exception as e:
+        print(f"Error actualizando filas del plan: {e}")
+        return False
+def get_revisions():
+    """
+    Revisión de cada conjunto de datos, para no volver a descargar los que no han cambiado.
+
+    Contrato de la acción `get_revisions` (GET ?action=get_revisions):
+    {"status": "success", "data": {"config": r, "tomas": r, "Plan Tiempo": r, "Plan Dosis": r}}
+    donde cada r es un contador o un hash que cambia con cualquier modificación de la hoja
+    (escrituras del Web App y ediciones a mano). Un conjunto que falte se descarga siempre.
+    Devuelve {} si la acción no está disponible.
+    """
+    try:
+        return _leer_web_app({"action": "get_revisions"}) or {}
+    except Exception as e:
+        logging.warning(f"REVISIONES: get_revisions no disponible ({e}), se descarga todo")
+        return {}
+
+
+def get_config():
+    """Obtiene la configuración desde la hoja 'Config' (o la última buena si el remoto falla)."""
+    return resiliente.leer("get_config", lambda: _leer_web_app({"action": "get_config"}) or {}, vacio={})
+
+def save_config(data):
+    """Guarda/Actualiza la configuración en la hoja 'Config'."""
+    try:
+        _post_web_app(op_save_config(data))
+        return True
+    except Exception as e:
+        print(f"Error guardando config remota: {e}")
+        return False
+def eliminar_ultima_toma():
+    try:
+        # Enviamos una petición POST con un parámetro especial para indicar borrado
+        # OJO: Tu Google Apps Script debe estar preparado para recibir esto.
+        # Si no lo está, tendrás que modificar el script.gs también.
+        # Asumiremos que mandamos action="delete_last"
+        payload = {"action": "delete_last"}
+        response = _post_web_app(payload)
+        snapshot.invalidar(SNAPSHOT_TOMAS)
+
+        if response.status_code == 200:
+            return True
+        else:
+            return False
+    except Exception as e:
+        print(f"Error al eliminar: {e}")
+        return False
+def get_google_fit_data(horas=None):
+    return google_fit.get_google_fit_data(horas)
+
+
+def get_pulso_guardado(horas=None):
+    return google_fit.get_pulso_guardado(horas)
@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from config import constants, perfiles
+from dao import google_fit
+from dao.operaciones import LoteRechazado, aplicar_celdas, op_save_config, op_save_plan_history, op_toma, op_update_plan_rows
+
+# Backend embebido: las mismas funciones que dao/backend_sheets.py sobre un fichero SQLite local.
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tomas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,          -- epoch (s, UTC)
+    fecha TEXT NOT NULL,          -- dd/mm/YYYY, como en la hoja
+    hora TEXT NOT NULL,           -- HH:MM:SS
+    ml REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tomas_ts ON tomas(ts);
+CREATE TABLE IF NOT EXISTS config (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL           -- JSON
+);
+CREATE TABLE IF NOT EXISTS planes (
+    hoja TEXT NOT NULL,
+    fecha TEXT NOT NULL,          -- YYYY-MM-DD
+    fila TEXT NOT NULL,           -- JSON con todas las columnas
+    PRIMARY KEY (hoja, fecha)
+);
+CREATE TABLE IF NOT EXISTS lotes (
+    id TEXT PRIMARY KEY           -- id de cliente de los lotes ya aplicados (reenvíos idempotentes)
+);
+"""
+
+_lock = threading.RLock()
+
+
+def _ruta():
+    return perfiles.ruta(constants.SQLITE_PATH)
+
+
+@st.cache_resource
+def _conexion(ruta):
+    """Una conexión por fichero (uno por perfil), compartida por sus sesiones."""
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    con = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(_ESQUEMA)
+    return con
+
+
+def _consulta(sql, params=()):
+    with _lock:
+        return _conexion(_ruta()).execute(sql, params).fetchall()
+
+
+@contextmanager
+def _transaccion():
+    con = _conexion(_ruta())
+    with _lock:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+
+def _json(valor):
+    return json.dumps(valor, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+
+
+def _ts_toma(fecha_str, hora_str):
+    ts = pd.to_datetime(f"{fecha_str} {hora_str}", format='%d/%m/%Y %H:%M:%S').tz_localize('Europe/Madrid')
+    return int(ts.timestamp())
+
+
+def _aplicar(con, op):
+    accion = op.get("action")
+    if accion is None or accion == "add_toma":
+        con.execute("INSERT INTO tomas (ts, fecha, hora, ml) VALUES (?, ?, ?, ?)",
+                    (_ts_toma(op["fecha"], op["hora"]), op["fecha"], op["hora"], float(op["ml"])))
+    elif accion == "save_config":
+        con.executemany("INSERT OR REPLACE INTO config (clave, valor) VALUES (?, ?)",
+                        [(clave, _json(valor)) for clave, valor in op.get("data", {}).items()])
+    elif accion == "save_plan_history":
+        con.execute("DELETE FROM planes WHERE hoja = ?", (op["sheetName"],))
+        con.executemany("INSERT OR REPLACE INTO planes (hoja, fecha, fila) VALUES (?, ?, ?)",
+                        [(op["sheetName"], str(fila["Fecha"])[:10], _json(fila)) for fila in op.get("data", [])])
+    elif accion == "update_plan_rows":
+        for fecha, cambios in op.get("data", {}).items():
+            actual = con.execute("SELECT fila FROM planes WHERE hoja = ? AND fecha = ?",
+                                 (op["sheetName"], fecha)).fetchone()
+            if actual:
+                con.execute("UPDATE planes SET fila = ? WHERE hoja = ? AND fecha = ?",
+                            (_json(aplicar_celdas(json.loads(actual[0]), cambios)), op["sheetName"], fecha))
+    elif accion == "delete_last":
+        con.execute("DELETE FROM tomas WHERE id = (SELECT MAX(id) FROM tomas)")
+    else:
+        raise ValueError(f"Acción desconocida: {accion}")
+    return {"status": "success"}
+
+
+def get_excel_data():
+    filas = _consulta("SELECT fecha, hora, ml, ts FROM tomas ORDER BY ts DESC")
+    df = pd.DataFrame(filas, columns=['fecha', 'hora', 'ml', 'ts'])
+    df['timestamp'] = pd.to_datetime(df.pop('ts'), unit='s', utc=True).dt.tz_convert('Europe/Madrid')
+    return df
+
+
+def sync_tomas(completo=False):
+    # Los datos ya son locales: no hay nada que sincronizar
+    return get_excel_data()
+
+
+def forzar_sync_tomas():
+    # Sin copia local que pueda quedarse atrás
+    pass
+
+
+def estadisticas_cache():
+    ruta = _ruta()
+    n_tomas = _consulta("SELECT COUNT(*) FROM tomas")[0][0]
+    return {"backend": "sqlite", "ruta": ruta, "tomas": n_tomas,
+            "bytes": os.path.getsize(ruta) if os.path.exists(ruta) else 0}
+
+
+def ejecutar_lote(operaciones, id_lote=None):
+    """
+    Aplica las operaciones en una única transacción: o todas o ninguna. Un lote con un
+    `id_lote` ya aplicado no se repite. Lanza LoteRechazado si alguna operación no es válida.
+    """
+    resultados = []
+    try:
+        with _transaccion() as con:
+            if id_lote is not None:
+                if con.execute("SELECT 1 FROM lotes WHERE id = ?", (id_lote,)).fetchone():
+                    return resultados
+                con.execute("INSERT INTO lotes (id) VALUES (?)", (id_lote,))
+            for i, op in enumerate(operaciones):
+                try:
+                    resultados.append(_aplicar(con, op))
+                except (KeyError, ValueError) as e:
+                    raise LoteRechazado(f"Lote rechazado en la operación {i}: {e}") from e
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Error de SQLite aplicando el lote: {e}") from e
+    return resultados
+
+
+def enviar_toma_api(fecha_str, hora_str, cantidad):
+    return ejecutar_lote([op_toma(fecha_str, hora_str, cantidad)])
+
+
+def get_plan_history_data(sheet_name="Plan Tiempo"):
+    filas = _consulta("SELECT fila FROM planes WHERE hoja = ? ORDER BY fecha", (sheet_name,))
+    return pd.DataFrame([json.loads(f[0]) for f in filas]) if filas else pd.DataFrame()
+
+
+def save_plan_history_data(df, sheet_name="Plan Tiempo"):
+    ejecutar_lote([op_save_plan_history(df, sheet_name)])
+
+
+def update_plan_rows(sheet_name, cambios):
+    ejecutar_lote([op_update_plan_rows(sheet_name, cambios)])
+    return True
+
+
+def get_revisions():
+    # Las lecturas locales son baratas: sin sonda, siempre se leen
+    return {}
+
+
+def get_config():
+    filas = _consulta("SELECT clave, valor FROM config")
+    return {clave: json.loads(valor) for clave, valor in filas}
+
+
+def save_config(data):
+    ejecutar_lote([op_save_config(data)])
+    return True
+
+
+def eliminar_ultima_toma():
+    ejecutar_lote([{"action": "delete_last"}])
+    return True
+
+
+def get_google_fit_data(horas=None):
+    # El pulso vive en su propio almacén local (dao/almacen_pulso.py), común a todos los backends
+    return google_fit.get_google_fit_data(horas)
+
+
+def get_pulso_guardado(horas=None):
+    return google_fit.get_pulso_guardado(horas)
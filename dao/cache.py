@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import streamlit as st
+
+from config import constants, perfiles
+from dao import resiliente, trazas
+
+# Claves por fuente de datos
+CONFIG = "config"
+PLAN_TIEMPO = "plan_tiempo"
+PLAN_DOSIS = "plan_dosis"
+TOMAS = "tomas"
+GOOGLE_FIT = "google_fit"
+REVISIONES = "revisiones"
+
+_CONTADORES = ("hits", "misses", "esperas", "sin_cambios", "expulsiones")
+
+
+class _Almacen:
+    # Las entradas se guardan por (perfil, clave): cada perfil ve solo sus datos
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.valores = OrderedDict()  # (perfil, clave) -> (valor, expira), del menos al más usado
+        self.bytes = {}      # (perfil, clave) -> tamaño aproximado del valor
+        self.bytes_perfil = {}  # perfil -> suma de sus tamaños
+        self.versiones = {}  # (perfil, clave) -> nº de cargas, para detectar cambios desde una sesión
+        self.revisiones = {}  # (perfil, clave) -> revisión remota del valor guardado (ver obtener)
+        self.en_vuelo = {}   # (perfil, clave) -> Future
+        self.stats = {}      # (perfil, clave) -> {contador: n} (ver _CONTADORES)
+
+
+@st.cache_resource
+def _almacen():
+    """Un único almacén por proceso, compartido por todas las sesiones y perfiles."""
+    return _Almacen()
+
+
+def _copia(valor):
+    # Cada sesión recibe su copia: las mutaciones locales no se filtran al resto
+    return valor.copy() if hasattr(valor, "copy") else valor
+
+
+def _clave(clave):
+    return perfiles.actual(), clave
+
+
+def _tamano(valor):
+    """Bytes aproximados de un valor guardado (DataFrame, TomasStore, dict de config...)."""
+    if hasattr(valor, "memory_usage"):
+        return int(valor.memory_usage(deep=True).sum())
+    if hasattr(valor, "nbytes"):
+        return int(valor.nbytes)
+    return len(repr(valor))
+
+
+def _stats(almacen, k):
+    return almacen.stats.setdefault(k, dict.fromkeys(_CONTADORES, 0))
+
+
+def _quitar(almacen, k):
+    almacen.valores.pop(k, None)
+    almacen.revisiones.pop(k, None)
+    tamano = almacen.bytes.pop(k, 0)
+    almacen.bytes_perfil[k[0]] = almacen.bytes_perfil.get(k[0], 0) - tamano
+
+
+def _guardar(almacen, k, valor, expira):
+    """Guarda el valor como el más reciente y expulsa los menos usados si se pasa de memoria (con lock)."""
+    _quitar(almacen, k)
+    almacen.valores[k] = (valor, expira)
+    almacen.bytes[k] = _tamano(valor)
+    almacen.bytes_perfil[k[0]] = almacen.bytes_perfil.get(k[0], 0) + almacen.bytes[k]
+
+    def _expulsar(candidatas):
+        victima = next((c for c in candidatas if c != k), None)
+        if victima is None:
+            return False
+        _quitar(almacen, victima)
+        _stats(almacen, victima)["expulsiones"] += 1
+        logging.info(f"CACHE: Expulsada {victima} por límite de memoria")
+        return True
+
+    while almacen.bytes_perfil[k[0]] > constants.CACHE_MEMORIA_PERFIL_MB * 2**20:
+        if not _expulsar(c for c in almacen.valores if c[0] == k[0]):
+            break
+    while sum(almacen.bytes.values()) > constants.CACHE_MEMORIA_TOTAL_MB * 2**20:
+        if not _expulsar(iter(almacen.valores)):
+            break
+
+
+def obtener(clave, cargar, ttl=None, revision=None, forzar_remoto=None):
+    """
+    Devuelve el valor cacheado de `clave` o lo carga con `cargar()`. Si otra sesión ya lo
+    está cargando, espera a esa misma petición en lugar de lanzar otra.
+    Con `revision` (función que devuelve la revisión remota del dato, o None si no se
+    conoce), al caducar se consulta primero: si coincide con la del valor guardado, este
+    se renueva sin volver a descargarlo y sin cambiar de versión.
+    `forzar_remoto` es para los `cargar` que pueden servir una copia local antigua (el
+    snapshot de tomas): se llama antes de cada carga con revisión conocida, para que el valor
+    guardado corresponda de verdad a esa revisión y no se renueve después como sin cambios.
+    """
+    almacen = _almacen()
+    ttl = constants.CACHE_TTL_SEGUNDOS.get(clave, 300) if ttl is None else ttl
+    clave = _clave(clave)
+    with almacen.lock:
+        stats = _stats(almacen, clave)
+        valor, expira = almacen.valores.get(clave, (None, 0))
+        if expira > time.time():
+            almacen.valores.move_to_end(clave)
+            stats["hits"] += 1
+            trazas.anotar(cache="hit")
+            return _copia(valor)
+        futuro = almacen.en_vuelo.get(clave)
+        cargador = futuro is None
+        if cargador:
+            futuro = Future()
+            almacen.en_vuelo[clave] = futuro
+        else:
+            stats["esperas"] += 1
+    if not cargador:
+        trazas.anotar(cache="espera")
+        return _copia(futuro.result())
+
+    try:
+        actual = revision() if revision else None
+        with almacen.lock:
+            previo = almacen.valores.get(clave)
+            if actual is not None and previo is not None and almacen.revisiones.get(clave) == actual:
+                almacen.valores[clave] = (previo[0], time.time() + ttl)
+                almacen.valores.move_to_end(clave)
+                almacen.en_vuelo.pop(clave, None)
+                stats["sin_cambios"] += 1
+                sin_cambios = True
+            else:
+                stats["misses"] += 1
+                sin_cambios = False
+        if sin_cambios:
+            trazas.anotar(cache="sin_cambios")
+            futuro.set_result(previo[0])
+            return _copia(previo[0])
+
+        trazas.anotar(cache="miss")
+        if forzar_remoto is not None and actual is not None:
+            forzar_remoto()
+        resiliente.degradado()
+        valor = cargar()
+    except BaseException as e:
+        with almacen.lock:
+            almacen.en_vuelo.pop(clave, None)
+        futuro.set_exception(e)
+        raise
+    if resiliente.degradado():
+        # Valor de respaldo por fallo del remoto: se vuelve a intentar cuando se cierre el
+        # circuito, y sin revisión para no darlo por bueno en la siguiente comprobación
+        ttl = min(ttl, constants.CIRCUITO_ABIERTO_SEGUNDOS)
+        actual = None
+    with almacen.lock:
+        _guardar(almacen, clave, valor, time.time() + ttl)
+        almacen.versiones[clave] = almacen.versiones.get(clave, 0) + 1
+        almacen.revisiones[clave] = actual
+        almacen.en_vuelo.pop(clave, None)
+    futuro.set_result(valor)
+    return _copia(valor)
+
+
+def version(clave):
+    """Versión vigente de `clave` o None si no está cargada o ha caducado."""
+    almacen = _almacen()
+    clave = _clave(clave)
+    with almacen.lock:
+        if almacen.valores.get(clave, (None, 0))[1] > time.time():
+            return almacen.versiones.get(clave)
+    return None
+
+
+def invalidar(*claves):
+    """Descarta solo las claves indicadas del perfil en uso (todas si no se indica ninguna)."""
+    almacen = _almacen()
+    perfil = perfiles.actual()
+    with almacen.lock:
+        for k in [_clave(c) for c in claves] or [k for k in almacen.valores if k[0] == perfil]:
+            _quitar(almacen, k)
+    logging.info(f"CACHE: Invalidadas {claves or 'todas las claves'} del perfil {perfil}")
+
+
+def estadisticas():
+    """Aciertos, fallos, vida restante y tamaño (KB) de cada clave del perfil en uso."""
+    almacen = _almacen()
+    ahora, perfil = time.time(), perfiles.actual()
+    with almacen.lock:
+        return {
+            clave: {**stats, "ttl_restante_s": round(max(0.0, almacen.valores.get((p, clave), (None, 0))[1] - ahora), 1),
+                    "kb": round(almacen.bytes.get((p, clave), 0) / 1024, 1)}
+            for (p, clave), stats in almacen.stats.items() if p == perfil
+        }
+
+
+def memoria():
+    """KB ocupados por el perfil en uso y por todo el proceso, y nº de perfiles con datos."""
+    almacen = _almacen()
+    with almacen.lock:
+        return {"perfil_kb": round(almacen.bytes_perfil.get(perfiles.actual(), 0) / 1024, 1),
+                "total_kb": round(sum(almacen.bytes.values()) / 1024, 1),
+                "perfiles": len({p for p, _ in almacen.valores})}
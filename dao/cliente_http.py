@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+from config import constants, perfiles
+from dao import trazas
+
+_latencias = {}  # perfil -> últimas llamadas HTTP
+_lock = threading.Lock()
+
+
+@st.cache_resource
+def sesion():
+    """
+    Sesión HTTP compartida por todas las sesiones de Streamlit del proceso: reutiliza
+    las conexiones TCP/TLS (keep-alive) con script.google.com, script.googleusercontent.com
+    (redirección del Apps Script) y docs.google.com.
+    """
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=constants.HTTP_POOL_HOSTS, pool_maxsize=constants.HTTP_POOL_CONEXIONES)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    return s
+
+
+def _medir(metodo, url, etiqueta, **kwargs):
+    kwargs.setdefault("timeout", constants.HTTP_TIMEOUT)
+    inicio = time.perf_counter()
+    estado = None
+    n_bytes = 0
+    try:
+        response = sesion().request(metodo, url, **kwargs)
+        estado = response.status_code
+        n_bytes = len(response.content)
+        return response
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        perfil = perfiles.actual()
+        with _lock:
+            _latencias.setdefault(perfil, deque(maxlen=200)).append(
+                {"metodo": metodo, "accion": etiqueta, "estado": estado, "ms": round(ms, 1), "bytes": n_bytes})
+        trazas.anotar(bytes=n_bytes)
+        logging.info(f"HTTP: {metodo} {etiqueta} -> {estado} en {ms:.0f} ms ({n_bytes} bytes)")
+
+
+def get(url, etiqueta=None, **kwargs):
+    return _medir("GET", url, etiqueta or (kwargs.get("params") or {}).get("action", url), **kwargs)
+
+
+def post(url, etiqueta=None, **kwargs):
+    return _medir("POST", url, etiqueta or (kwargs.get("json") or {}).get("action", "add_toma"), **kwargs)
+
+
+def latencias():
+    """Últimas llamadas HTTP del perfil en uso (más recientes primero) con su latencia en ms."""
+    with _lock:
+        return list(reversed(_latencias.get(perfiles.actual(), ())))
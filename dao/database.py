@@ -1,156 +1,135 @@
-import logging
-
-import streamlit as st
-import pandas as pd
-import os.path
-import time
-import requests
-import json
-
-from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from config import constants
-
-URL_WEB_APP = constants.URL_WEB_APP
+from config import perfiles
+from dao import backend_sheets, backend_sqlite, cache, journal, trazas
+from dao.operaciones import op_save_config, op_save_plan_history, op_toma, op_update_plan_rows
+
+# Backends intercambiables: cada módulo implementa las mismas funciones
+# (tomas, config, historial de planes, borrar la última toma y pulso).
+BACKENDS = {
+    "sheets": backend_sheets,
+    "sqlite": backend_sqlite,
+}
+
+# Conjunto de get_revisions que corresponde a cada clave de la caché compartida
+_CONJUNTOS = {
+    cache.CONFIG: "config",
+    cache.PLAN_TIEMPO: "Plan Tiempo",
+    cache.PLAN_DOSIS: "Plan Dosis",
+    cache.TOMAS: "tomas",
+}
+
+
+def _backend():
+    return BACKENDS[perfiles.valor("BACKEND")]
+
+
+def _replicar(operaciones, id_lote=None):
+    """
+    Con un backend local y SYNC_SHEETS activo, encola la escritura para Google Sheets: la cola
+    "replica" del diario la envía en orden, por perfil y con reintentos (dao/journal.py).
+    """
+    if perfiles.valor("BACKEND") == "sheets" or not perfiles.valor("SYNC_SHEETS"):
+        return
+    journal.registrar(operaciones, cola="replica", id_lote=id_lote)
+
+
+@trazas.medido("database.get_excel_data")
 def get_excel_data():
-    # Usamos el ID de tu hoja que ya tenías
-    SHEET_ID = constants.SHEET_ID
-    url = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=csv&cache_bust={int(time.time())}"
+    return _backend().get_excel_data()
+
+
+@trazas.medido("database.sync_tomas")
+def sync_tomas(completo=False):
+    return _backend().sync_tomas(completo)
+
+
+def forzar_remoto(clave_cache):
+    """
+    Para cache.obtener: función que hace que la siguiente carga de `clave_cache` lea del
+    remoto y no de una copia local, o None si el backend no la sirve de una copia local.
+    """
+    if clave_cache == cache.TOMAS:
+        return _backend().forzar_sync_tomas
+    return None
+
+
+@trazas.medido("database.estadisticas_cache")
+def estadisticas_cache():
+    return _backend().estadisticas_cache()
+
+
+@trazas.medido("database.enviar_toma_api")
+def enviar_toma_api(fecha_str, hora_str, cantidad):
+    resultado = _backend().enviar_toma_api(fecha_str, hora_str, cantidad)
+    _replicar([op_toma(fecha_str, hora_str, cantidad)])
+    return resultado
 
-    df = pd.read_csv(url)
-    df.columns = df.columns.str.strip().str.lower()
 
-    if 'ml' in df.columns:
-        df['ml'] = df['ml'].astype(str).str.replace(',', '.').pipe(pd.to_numeric, errors='coerce').fillna(0)
+@trazas.medido("database.ejecutar_lote")
+def ejecutar_lote(operaciones, id_lote=None):
+    resultado = _backend().ejecutar_lote(operaciones, id_lote)
+    _replicar(operaciones, id_lote)
+    return resultado
 
-    df['timestamp'] = pd.to_datetime(df['fecha'] + ' ' + df['hora'], format='mixed', dayfirst=True)
-    if df['timestamp'].dt.tz is None:
-        df['timestamp'] = df['timestamp'].dt.tz_localize('Europe/Madrid')
 
-    return df.sort_values('timestamp', ascending=False)
-def enviar_toma_api( fecha_str, hora_str, cantidad):
-    payload = {"fecha": fecha_str, "hora": hora_str, "ml": cantidad}
-    return requests.post(URL_WEB_APP, json=payload)
+@trazas.medido("database.get_plan_history_data")
 def get_plan_history_data(sheet_name="Plan Tiempo"):
-    """Obtiene el historial del plan desde Google Sheets."""
-    try:
-        params = {"action": "get_plan_history", "sheetName": sheet_name}
-        response = requests.get(URL_WEB_APP, params=params, timeout=10)
-        if response.status_code == 200:
-            try:
-                json_response = response.json()
-                if json_response.get('status') == 'success':
-                    data = json_response.get('data', [])
-                    return pd.DataFrame(data) if data else pd.DataFrame()
-            except ValueError:
-                print(f"Error decodificando respuesta JSON de Sheets: {response.text[:100]}")
-    except Exception as e:
-        print(f"Error cargando historial plan: {e}")
-    return pd.DataFrame()
+    return _backend().get_plan_history_data(sheet_name)
 
+
+@trazas.medido("database.save_plan_history_data")
 def save_plan_history_data(df, sheet_name="Plan Tiempo"):
-    """Guarda el historial del plan en Google Sheets."""
-    try:
-        data_list = df.to_dict(orient='records')
-        payload = {"action": "save_plan_history", "data": data_list, "sheetName": sheet_name}
-        requests.post(URL_WEB_APP, json=payload, timeout=15)
-    except Exception as e:
-        print(f"Error guardando historial plan: {e}")
+    resultado = _backend().save_plan_history_data(df, sheet_name)
+    _replicar([op_save_plan_history(df, sheet_name)])
+    return resultado
+
+
+@trazas.medido("database.update_plan_rows")
+def update_plan_rows(sheet_name, cambios):
+    resultado = _backend().update_plan_rows(sheet_name, cambios)
+    _replicar([op_update_plan_rows(sheet_name, cambios)])
+    return resultado
+
+
+@trazas.medido("database.get_revisions")
+def get_revisions():
+    return _backend().get_revisions()
+
+
+def revision(clave_cache):
+    """
+    Revisión remota del dato de `clave_cache` o None si no se conoce. Todas las cargas de un
+    refresco comparten una sola llamada a get_revisions (caché de pocos segundos).
+    """
+    conjunto = _CONJUNTOS.get(clave_cache)
+    if conjunto is None:
+        return None
+    return cache.obtener(cache.REVISIONES, get_revisions).get(conjunto)
+
+
+@trazas.medido("database.get_config")
 def get_config():
-    """Obtiene la configuración desde la hoja 'Config'."""
-    logging.warning("Cargando configuracion")
-    try:
-        params = {"action": "get_config"}
-        response = requests.get(URL_WEB_APP, params=params, timeout=15)
-        if response.status_code == 200:
-            try:
-                json_response = response.json()
-                if json_response.get('status') == 'success':
-                    config =json_response.get('data', {})
-                    print(f"{config}")
-                    return config
-            except ValueError:
-                print(f"Error decodificando config JSON de Sheets: {response.text[:200]}")
-    except Exception as e:
-        print(f"Error cargando config remota: {e}")
-    return {}
+    return _backend().get_config()
+
 
+@trazas.medido("database.save_config")
 def save_config(data):
-    """Guarda/Actualiza la configuración en la hoja 'Config'."""
-    try:
-        payload = {"action": "save_config", "data": data}
-        requests.post(URL_WEB_APP, json=payload, timeout=15)
-        return True
-    except Exception as e:
-        print(f"Error guardando config remota: {e}")
-        return False
+    resultado = _backend().save_config(data)
+    _replicar([op_save_config(data)])
+    return resultado
+
+
+@trazas.medido("database.eliminar_ultima_toma")
 def eliminar_ultima_toma():
-    try:
-        # Enviamos una petición POST con un parámetro especial para indicar borrado
-        # OJO: Tu Google Apps Script debe estar preparado para recibir esto.
-        # Si no lo está, tendrás que modificar el script.gs también.
-        # Asumiremos que mandamos action="delete_last"
-        payload = {"action": "delete_last"}
-        response = requests.post(URL_WEB_APP, json=payload)
-        
-        if response.status_code == 200:
-            return True
-        else:
-            return False
-    except Exception as e:
-        print(f"Error al eliminar: {e}")
-        return False
-def get_google_fit_data():
-    creds = None
-    scopes = ['https://www.googleapis.com/auth/fitness.heart_rate.read']
-
-    # 1. INTENTAR CARGAR DESDE SECRETS (Sin que rompa la app si no existen)
-    try:
-        if "google_fit_token" in st.secrets:
-            token_info = json.loads(st.secrets["google_fit_token"])
-            creds = Credentials.from_authorized_user_info(token_info, scopes)
-    except Exception:
-        # 2. SI NO HAY CREDS, BUSCAR ARCHIVO LOCAL (Modo PC)
-        if not creds and os.path.exists('../local/token.json'):
-            creds = Credentials.from_authorized_user_file('../local/token.json', scopes)
-
-    # 3. Si el token expiró, refrescarlo
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-        # Opcional: imprimir el nuevo token en consola para actualizar el Secret si fuera necesario
-
-    # 4. Si no hay credenciales válidas, iniciar flujo (Solo local)
-    if not creds or not creds.valid:
-        if os.path.exists('../local/credentials.json'):
-            flow = InstalledAppFlow.from_client_secrets_file('../local/credentials.json', scopes)
-            creds = flow.run_local_server(port=0)
-        else:
-            st.error("No se han encontrado credenciales de Google. Configura los Secrets en Streamlit Cloud.")
-            st.stop()
-
-    service = build('fitness', 'v1', credentials=creds)
-    body = {
-        "aggregateBy": [
-            {"dataSourceId": "derived:com.google.heart_rate.bpm:com.google.android.gms:merge_heart_rate_bpm"}],
-        "bucketByTime": {"durationMillis": 60000},
-        "startTimeMillis": int(time.time() * 1000) - (48 * 60 * 60 * 1000),  # Pedimos 48h para los bloques
-        "endTimeMillis": int(time.time() * 1000)
-    }
-
-    raw_data = service.users().dataset().aggregate(userId='me', body=body).execute()
-    extracted_data = []
-    for bucket in raw_data.get('bucket', []):
-        for dataset in bucket.get('dataset', []):
-            for point in dataset.get('point', []):
-                ts = pd.to_datetime(int(point['endTimeNanos']), unit='ns', utc=True).tz_convert('Europe/Madrid')
-                value = point['value'][0]['fpVal']
-                extracted_data.append({'timestamp': ts, 'hr': value})
-
-    df = pd.DataFrame(extracted_data)
-    if not df.empty:
-        df = df.set_index('timestamp').sort_index()
-        df = df.resample('1min').mean().interpolate()
-    return df
\ No newline at end of file
+    resultado = _backend().eliminar_ultima_toma()
+    _replicar([{"action": "delete_last"}])
+    return resultado
+
+
+@trazas.medido("database.get_google_fit_data")
+def get_google_fit_data(horas=None):
+    return _backend().get_google_fit_data(horas)
+
+
+@trazas.medido("database.get_pulso_guardado")
+def get_pulso_guardado(horas=None):
+    return _backend().get_pulso_guardado(horas)
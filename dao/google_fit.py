@@ -0,0 +1,109 @@
+import logging
+import streamlit as st
+import numpy as np
+import os.path
+import time
+import json
+
+from config import constants, perfiles
+from dao import almacen_pulso
+
+
+def _credenciales():
+    # Imports diferidos: el cliente de Google solo se carga si se llega a pedir el pulso
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    creds = None
+    scopes = ['https://www.googleapis.com/auth/fitness.heart_rate.read']
+
+    # 1. INTENTAR CARGAR DESDE SECRETS (Sin que rompa la app si no existen)
+    try:
+        secreto = perfiles.valor("GOOGLE_FIT_SECRET")
+        if secreto in st.secrets:
+            token_info = json.loads(st.secrets[secreto])
+            creds = Credentials.from_authorized_user_info(token_info, scopes)
+    except Exception:
+        # 2. SI NO HAY CREDS, BUSCAR ARCHIVO LOCAL (Modo PC)
+        if not creds and os.path.exists('../local/token.json'):
+            creds = Credentials.from_authorized_user_file('../local/token.json', scopes)
+
+    # 3. Si el token expiró, refrescarlo
+    if creds and creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+        # Opcional: imprimir el nuevo token en consola para actualizar el Secret si fuera necesario
+
+    # 4. Si no hay credenciales válidas, iniciar flujo (Solo local)
+    if not creds or not creds.valid:
+        if os.path.exists('../local/credentials.json'):
+            flow = InstalledAppFlow.from_client_secrets_file('../local/credentials.json', scopes)
+            creds = flow.run_local_server(port=0)
+        else:
+            st.error("No se han encontrado credenciales de Google. Configura los Secrets en Streamlit Cloud.")
+            st.stop()
+
+    return creds
+
+
+def pedir_agregado(inicio_ms, fin_ms):
+    """Respuesta cruda de Google Fit con el pulso agregado por minuto entre los instantes dados."""
+    from googleapiclient.discovery import build
+
+    service = build('fitness', 'v1', credentials=_credenciales())
+    body = {
+        "aggregateBy": [
+            {"dataSourceId": "derived:com.google.heart_rate.bpm:com.google.android.gms:merge_heart_rate_bpm"}],
+        "bucketByTime": {"durationMillis": 60000},
+        "startTimeMillis": inicio_ms,
+        "endTimeMillis": fin_ms
+    }
+    return service.users().dataset().aggregate(userId='me', body=body).execute()
+
+
+def parsear_agregado(raw_data):
+    """(minutos int64 desde epoch UTC, lpm float32) de una respuesta de aggregate."""
+    puntos = [(int(point['endTimeNanos']), point['value'][0]['fpVal'])
+              for bucket in raw_data.get('bucket', [])
+              for dataset in bucket.get('dataset', [])
+              for point in dataset.get('point', [])]
+    if not puntos:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    nanos, bpm = zip(*puntos)
+    return np.asarray(nanos, dtype=np.int64) // 60_000_000_000, np.asarray(bpm, dtype=np.float32)
+
+
+def _desde_minuto(ahora_ms, horas):
+    return ahora_ms // 60000 - (horas or constants.FIT_VENTANA_HORAS) * 60
+
+
+def get_google_fit_data(horas=None):
+    """
+    Pulso por minuto de las últimas `horas` (FIT_VENTANA_HORAS por defecto), interpolado.
+    Solo se pide a Google Fit el tramo posterior al último minuto guardado en el almacén
+    local, más FIT_SOLAPE_HORAS hacia atrás para recoger el pulso que llegue tarde; si
+    Google Fit no responde se sirve lo que haya guardado.
+    """
+    ahora_ms = int(time.time() * 1000)
+    desde_minuto = _desde_minuto(ahora_ms, horas)
+
+    ultimo = almacen_pulso.ultimo_minuto()
+    inicio_minuto = desde_minuto if ultimo is None else max(desde_minuto, ultimo + 1 - constants.FIT_SOLAPE_HORAS * 60)
+    if inicio_minuto * 60000 < ahora_ms:
+        try:
+            almacen_pulso.anadir(*parsear_agregado(pedir_agregado(inicio_minuto * 60000, ahora_ms)))
+        except Exception as e:
+            logging.warning(f"GOOGLE FIT: Sin datos nuevos ({e}), usando el pulso guardado")
+
+    df = almacen_pulso.ventana(desde_minuto)
+    if not df.empty:
+        df = df.resample('1min').mean().interpolate()
+    return df
+
+
+def get_pulso_guardado(horas=None):
+    """
+    Pulso por minuto de las últimas `horas` tal como está en el almacén local, sin
+    interpolar ni pedir nada a Google Fit: los minutos sin lectura no aparecen.
+    """
+    return almacen_pulso.ventana(_desde_minuto(int(time.time() * 1000), horas))
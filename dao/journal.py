@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import threading
+import uuid
+
+import pandas as pd
+import requests
+import streamlit as st
+
+from config import constants, perfiles
+from dao.operaciones import LoteRechazado, aplicar_celdas
+
+# Diario de escrituras (append-only, JSON lines). Cada línea es un lote pendiente
+# {"id", "registrado", "ops"}, la confirmación de uno ya aplicado {"id", "confirmado"}
+# o el descarte de uno que el remoto no acepta {"id", "descartado"} (el lote pasa al
+# fichero de fallidos). Un hilo en segundo plano reenvía los lotes pendientes en orden
+# con su id, así que el remoto puede descartar los duplicados y el reenvío es idempotente.
+#
+# Hay una cola por destino, cada una con su diario: "principal" (el backend en uso) y
+# "replica" (copia en Google Sheets de las escrituras del backend local, con SYNC_SHEETS).
+
+
+def _enviar_principal(operaciones, id_lote):
+    # Import diferido: database importa los backends y estos no dependen del diario
+    from dao import database
+    database.ejecutar_lote(operaciones, id_lote=id_lote)
+
+
+def _enviar_replica(operaciones, id_lote):
+    from dao import backend_sheets
+    backend_sheets.ejecutar_lote(operaciones, id_lote=id_lote)
+
+
+# cola -> (constante con la ruta del diario, constante con la de fallidos, envío de un lote)
+_COLAS = {
+    "principal": ("JOURNAL_PATH", "JOURNAL_FALLIDOS_PATH", _enviar_principal),
+    "replica": ("JOURNAL_REPLICA_PATH", "JOURNAL_REPLICA_FALLIDOS_PATH", _enviar_replica),
+}
+
+_lock = threading.RLock()
+_versiones = {}  # (cola, perfil) -> nº de líneas escritas en su diario por este proceso
+_errores = {}    # (cola, perfil) -> último error de reenvío (None tras un envío correcto)
+
+
+def _ruta(cola="principal"):
+    return perfiles.ruta(getattr(constants, _COLAS[cola][0]))
+
+
+def _ruta_fallidos(cola="principal"):
+    return perfiles.ruta(getattr(constants, _COLAS[cola][1]))
+
+
+def _escribir_linea(registro, ruta, cola):
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with _lock:
+        with open(ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        clave = (cola, perfiles.actual())
+        _versiones[clave] = _versiones.get(clave, 0) + 1
+
+
+def _leer(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return [json.loads(linea) for linea in f if linea.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def pendientes(cola="principal"):
+    """Lotes aún no confirmados ni descartados, en orden de registro."""
+    with _lock:
+        registros = _leer(_ruta(cola))
+    cerrados = {r["id"] for r in registros if r.get("confirmado") or r.get("descartado")}
+    return [r for r in registros if "ops" in r and r["id"] not in cerrados]
+
+
+def version(cola="principal"):
+    """Cambia cada vez que se registra, confirma o descarta un lote."""
+    with _lock:
+        return _versiones.get((cola, perfiles.actual()), 0)
+
+
+def estado(cola="principal"):
+    """
+    Lotes pendientes y descartados del perfil en uso, error del último reenvío (None si fue
+    bien) y motivo del último descarte.
+    """
+    with _lock:
+        descartados = _leer(_ruta_fallidos(cola))
+        return {"pendientes": len(pendientes(cola)), "ultimo_error": _errores.get((cola, perfiles.actual())),
+                "descartados": len(descartados), "fichero_descartados": _ruta_fallidos(cola),
+                "ultimo_descarte": descartados[-1].get("error") if descartados else None}
+
+
+def registrar(operaciones, cola="principal", id_lote=None):
+    """
+    Guarda el lote de forma duradera y vuelve de inmediato; el envío lo hace el hilo de reenvío.
+    `id_lote` reutiliza el id de un lote ya aplicado en otro destino (réplica).
+    """
+    registro = {"id": id_lote or str(uuid.uuid4()), "registrado": pd.Timestamp.now(tz='Europe/Madrid').isoformat(),
+                "ops": operaciones}
+    _escribir_linea(registro, _ruta(cola), cola)
+    _reenvio(perfiles.actual(), cola).despertar()
+    return registro["id"]
+
+
+def _confirmar(id_lote, cola):
+    _escribir_linea({"id": id_lote, "confirmado": True}, _ruta(cola), cola)
+
+
+def _descartar(lote, error, cola):
+    """Saca el lote de la cola: se guarda en el fichero de fallidos y deja de superponerse."""
+    with _lock:
+        _escribir_linea({**lote, "error": error, "descartado": pd.Timestamp.now(tz='Europe/Madrid').isoformat()},
+                        _ruta_fallidos(cola), cola)
+        _escribir_linea({"id": lote["id"], "descartado": True}, _ruta(cola), cola)
+
+
+def _compactar(cola):
+    """Sin pendientes, el diario se vacía para que no crezca indefinidamente."""
+    with _lock:
+        if not pendientes(cola) and os.path.exists(_ruta(cola)):
+            os.remove(_ruta(cola))
+
+
+class _Reenvio:
+    def __init__(self, perfil, cola):
+        self._perfil = perfil
+        self._cola = cola
+        self._evento = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name=f"journal-{cola}-{perfil or 'principal'}", daemon=True)
+        self._hilo.start()
+
+    def despertar(self):
+        self._evento.set()
+
+    def _bucle(self):
+        with perfiles.usar(self._perfil):
+            self._reenviar()
+
+    def _reenviar(self):
+        from dao import cache
+
+        cola, enviar = self._cola, _COLAS[self._cola][2]
+        fallos = 0
+        intentos = {}  # id de lote -> envíos fallidos con respuesta del servidor
+        while True:
+            for lote in pendientes(cola):
+                try:
+                    enviar(lote["ops"], lote["id"])
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    with _lock:
+                        _errores[(cola, self._perfil)] = error
+                    if not isinstance(e, LoteRechazado):
+                        fallos += 1
+                        # Sin conexión el lote no tiene la culpa: se espera sin gastar intentos
+                        if not isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                            intentos[lote["id"]] = intentos.get(lote["id"], 0) + 1
+                        if intentos.get(lote["id"], 0) < constants.JOURNAL_MAX_INTENTOS:
+                            logging.warning(f"JOURNAL: Error reenviando el lote {lote['id']} de {cola} (intento {fallos}): {error}")
+                            break
+                    # Rechazado o agotados los intentos: no debe bloquear a los siguientes
+                    logging.error(f"JOURNAL: Lote {lote['id']} de {cola} descartado a {_ruta_fallidos(cola)}: {error}")
+                    _descartar(lote, error, cola)
+                    intentos.pop(lote["id"], None)
+                    if cola == "principal":
+                        cache.invalidar(*_claves_afectadas(lote["ops"]))
+                    continue
+                fallos = 0
+                intentos.pop(lote["id"], None)
+                with _lock:
+                    _errores[(cola, self._perfil)] = None
+                _confirmar(lote["id"], cola)
+                if cola == "principal":
+                    cache.invalidar(*_claves_afectadas(lote["ops"]))
+                logging.info(f"JOURNAL: Lote {lote['id']} de {cola} confirmado")
+            else:
+                _compactar(cola)
+                self._evento.wait()
+                self._evento.clear()
+                continue
+            # Reintento con espera exponencial (o antes si se registra algo nuevo)
+            self._evento.wait(min(constants.JOURNAL_REINTENTO_MAX_SEGUNDOS, 2 ** fallos))
+            self._evento.clear()
+
+
+@st.cache_resource
+def _reenvio(perfil, cola="principal"):
+    """Un único hilo de reenvío por perfil y cola (cada uno con su diario)."""
+    return _Reenvio(perfil, cola)
+
+
+def arrancar():
+    """Asegura que los hilos de reenvío están activos (p.ej. con pendientes de una ejecución anterior)."""
+    for cola in _COLAS:
+        if pendientes(cola):
+            _reenvio(perfiles.actual(), cola).despertar()
+
+
+def _claves_afectadas(operaciones):
+    from dao import cache
+
+    claves = set()
+    for op in operaciones:
+        accion = op.get("action")
+        if accion in (None, "add_toma", "delete_last"):
+            claves.add(cache.TOMAS)
+        elif accion == "save_config":
+            claves.add(cache.CONFIG)
+        elif accion in ("save_plan_history", "update_plan_rows"):
+            claves.add(cache.PLAN_TIEMPO if op.get("sheetName") == "Plan Tiempo" else cache.PLAN_DOSIS)
+    return claves
+
+
+def aplicar_pendientes(config, df_tiempos, df_dosis, tomas):
+    """
+    Superpone los lotes pendientes a los datos cargados del remoto para que las métricas
+    locales ya los tengan en cuenta. Modifica y devuelve los objetos recibidos (salvo
+    `tomas`, un neg.tomas_store.TomasStore inmutable, que se sustituye por uno nuevo).
+    """
+    nuevas = []
+    planes = {"Plan Tiempo": df_tiempos, "Plan Dosis": df_dosis}
+    for lote in pendientes():
+        for op in lote["ops"]:
+            accion = op.get("action")
+            if accion in (None, "add_toma"):
+                nuevas.append({"fecha": op["fecha"], "hora": op["hora"], "ml": float(op["ml"])})
+            elif accion == "save_config":
+                config.update(op.get("data", {}))
+            elif accion == "update_plan_rows":
+                df = planes.get(op.get("sheetName"))
+                if df is not None:
+                    # Tablas de plan indexadas por Fecha (neg/esquema_plan.py)
+                    for fecha, cambios in op.get("data", {}).items():
+                        dia = pd.Timestamp(fecha)
+                        if dia in df.index:
+                            fila = aplicar_celdas(df.loc[dia].to_dict(), cambios)
+                            for columna in cambios:
+                                df.loc[dia, columna] = fila[columna]
+
+    if nuevas:
+        nuevas = pd.DataFrame(nuevas)
+        instantes = pd.to_datetime(nuevas['fecha'] + ' ' + nuevas['hora'],
+                                   format='%d/%m/%Y %H:%M:%S').dt.tz_localize('Europe/Madrid')
+        tomas = tomas.con_tomas(instantes, nuevas['ml'])
+    return config, df_tiempos, df_dosis, tomas
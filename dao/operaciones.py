@@ -0,0 +1,51 @@
+# Operaciones de escritura (formato de la acción `batch` del Web App), comunes a todos los backends.
+import math
+
+
+class LoteRechazado(RuntimeError):
+    """El remoto ha recibido el lote y no lo acepta: reenviarlo tal cual volverá a fallar."""
+
+
+def op_toma(fecha_str, hora_str, cantidad):
+    return {"action": "add_toma", "fecha": fecha_str, "hora": hora_str, "ml": cantidad}
+
+
+def op_save_config(data):
+    return {"action": "save_config", "data": data}
+
+
+def op_save_plan_history(df, sheet_name):
+    return {"action": "save_plan_history", "data": df.to_dict(orient='records'), "sheetName": sheet_name}
+
+
+def op_update_plan_rows(sheet_name, cambios):
+    """
+    Parche por celdas de un plan: {"YYYY-MM-DD": {"Columna": valor}}. El Web App localiza
+    cada fila por su Fecha (día en Europe/Madrid) y solo escribe esas celdas; las fechas
+    que no existen en la hoja se ignoran. Un valor {"sumar": n} (ver sumar()) suma n a lo
+    que tenga la celda en el remoto en vez de sobrescribirla.
+    """
+    return {"action": "update_plan_rows", "sheetName": sheet_name, "data": cambios}
+
+
+def sumar(cantidad):
+    """Incremento de una celda para op_update_plan_rows: no depende de la copia local del plan."""
+    return {"sumar": cantidad}
+
+
+def _numero(valor):
+    # Celdas vacías o no numéricas cuentan como 0
+    try:
+        numero = float(str(valor).replace(",", "."))
+    except ValueError:
+        return 0.0
+    return 0.0 if math.isnan(numero) else numero
+
+
+def aplicar_celdas(fila, cambios):
+    """Aplica a `fila` (dict) los cambios de una fecha de op_update_plan_rows y la devuelve."""
+    for columna, valor in cambios.items():
+        if isinstance(valor, dict) and "sumar" in valor:
+            valor = _numero(fila.get(columna, 0)) + float(valor["sumar"])
+        fila[columna] = valor
+    return fila
@@ -0,0 +1,154 @@
+import copy
+import logging
+import random
+import threading
+import time
+
+import streamlit as st
+
+from config import constants, perfiles
+
+# Lecturas resilientes del remoto:
+# - presupuesto de tiempo por página: ninguna lectura de un rerun espera más allá del límite
+# - reintentos con espera exponencial y jitter (solo lecturas, que son idempotentes)
+# - circuit breaker por lectura: tras varios fallos seguidos deja de llamar al remoto un
+#   rato y sirve el último valor bueno, en vez de un vacío que borraría el plan de la UI
+
+
+class PresupuestoAgotado(TimeoutError):
+    pass
+
+
+class CircuitoAbierto(ConnectionError):
+    pass
+
+
+class _Circuito:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.ultimo_bueno = None
+        self.tiene_bueno = False
+        self.ultimo_error = None
+
+
+@st.cache_resource
+def _circuitos():
+    """Estado de los circuitos por lectura, compartido por todas las sesiones del proceso."""
+    return {}
+
+
+_limites = {}  # id de sesión de Streamlit -> instante límite de las lecturas del rerun
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _sesion():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else None
+
+
+def iniciar_presupuesto(segundos=None):
+    """Marca el inicio de un rerun: sus lecturas remotas deben acabar en `segundos`."""
+    sesion = _sesion()
+    if sesion is not None:
+        ahora = time.monotonic()
+        with _lock:
+            # Las sesiones cerradas no avisan: se olvidan los límites ya vencidos
+            for otra in [s for s, limite in _limites.items() if limite <= ahora]:
+                del _limites[otra]
+            _limites[sesion] = ahora + (segundos or constants.PRESUPUESTO_PAGINA_SEGUNDOS)
+
+
+def restante():
+    """Segundos que le quedan al rerun en curso, o None fuera de un rerun (hilos en segundo plano)."""
+    sesion = _sesion()
+    with _lock:
+        limite = _limites.get(sesion)
+    return None if limite is None else limite - time.monotonic()
+
+
+def limitar(timeout):
+    """Ajusta un timeout (conexión, lectura) al presupuesto restante; lo lanza si ya no queda."""
+    queda = restante()
+    if queda is None:
+        return timeout
+    if queda <= 0:
+        raise PresupuestoAgotado("Presupuesto de tiempo de la página agotado")
+    conexion, lectura = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return min(conexion, queda), min(lectura, queda)
+
+
+def _circuito(nombre):
+    # Por perfil: el último valor bueno de una persona nunca se sirve a otra
+    return _circuitos().setdefault((perfiles.actual(), nombre), _Circuito())
+
+
+def leer(nombre, fn, vacio=None):
+    """
+    Ejecuta la lectura `fn()` con reintentos y circuit breaker. `fn` debe lanzar una excepción
+    ante cualquier respuesta no válida (HTTP de error, página HTML, status != success).
+    Si el remoto falla, devuelve el último valor bueno de `nombre` o, si no lo hay, `vacio`.
+    """
+    circuito = _circuito(nombre)
+    if circuito.abierto_hasta > time.monotonic():
+        return _degradado(nombre, circuito, vacio, CircuitoAbierto(f"Circuito abierto: {circuito.ultimo_error}"))
+
+    error = None
+    for intento in range(constants.REINTENTOS_LECTURA):
+        try:
+            valor = fn()
+        except Exception as e:
+            error = e
+            logging.warning(f"RESILIENTE: {nombre} falló (intento {intento + 1}): {e}")
+            # Espera exponencial con jitter completo, sin pasarse del presupuesto de la página
+            espera = random.uniform(0, constants.REINTENTO_BASE_SEGUNDOS * 2 ** intento)
+            queda = restante()
+            if intento + 1 == constants.REINTENTOS_LECTURA or isinstance(e, PresupuestoAgotado) \
+                    or (queda is not None and queda <= espera):
+                break
+            time.sleep(espera)
+            continue
+        with circuito.lock:
+            circuito.fallos = 0
+            circuito.abierto_hasta = 0.0
+            circuito.ultimo_bueno = copy.deepcopy(valor)
+            circuito.tiene_bueno = True
+        return valor
+
+    with circuito.lock:
+        circuito.fallos += 1
+        circuito.ultimo_error = f"{type(error).__name__}: {error}"
+        if circuito.fallos >= constants.CIRCUITO_FALLOS:
+            circuito.abierto_hasta = time.monotonic() + constants.CIRCUITO_ABIERTO_SEGUNDOS
+            logging.warning(f"RESILIENTE: circuito de {nombre} abierto {constants.CIRCUITO_ABIERTO_SEGUNDOS} s")
+    return _degradado(nombre, circuito, vacio, error)
+
+
+def _degradado(nombre, circuito, vacio, error):
+    _local.degradado = True
+    with circuito.lock:
+        if circuito.tiene_bueno:
+            logging.warning(f"RESILIENTE: {nombre} sirve el último valor bueno ({error})")
+            return copy.deepcopy(circuito.ultimo_bueno)
+    logging.warning(f"RESILIENTE: {nombre} sin valor previo, se devuelve vacío ({error})")
+    return copy.deepcopy(vacio)
+
+
+def degradado():
+    """True si alguna lectura de este hilo ha servido un valor de respaldo desde la última consulta."""
+    valor = getattr(_local, "degradado", False)
+    _local.degradado = False
+    return valor
+
+
+def estado():
+    """Estado de los circuitos del perfil en uso para el panel de la barra lateral."""
+    ahora, perfil = time.monotonic(), perfiles.actual()
+    return {
+        nombre: {"abierto_s": round(max(0.0, c.abierto_hasta - ahora), 1), "fallos": c.fallos,
+                 "ultimo_bueno": c.tiene_bueno, "ultimo_error": c.ultimo_error}
+        for (p, nombre), c in list(_circuitos().items()) if p == perfil
+    }
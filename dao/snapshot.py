@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from config import constants, perfiles
+
+# Subir al cambiar columnas o tipos: los snapshots de otra versión se descartan.
+ESQUEMA_VERSION = 1
+
+_lock = threading.Lock()
+_local = threading.local()
+_refrescando = set()
+_generaciones = {}  # ruta -> nº de invalidaciones; un refresco lanzado antes de una no debe guardar
+_BANDERAS = ("version", "guardado", "invalidado", "desactualizado")
+_stats = {}  # perfil -> contadores de aciertos, descargas y bytes
+_STATS_VACIAS = {"hits": 0, "misses": 0, "no_modificado": 0, "descargas": 0, "bytes_descargados": 0, "bytes_ahorrados": 0}
+
+
+def _dir():
+    return perfiles.ruta(constants.CACHE_DIR)
+
+
+def _rutas(nombre):
+    return os.path.join(_dir(), f"{nombre}.feather"), os.path.join(_dir(), f"{nombre}.json")
+
+
+def leer_meta(nombre):
+    _, ruta_meta = _rutas(nombre)
+    try:
+        with open(ruta_meta, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return meta if meta.get("version") == ESQUEMA_VERSION else {}
+
+
+def _escribir_meta(nombre, meta):
+    _, ruta_meta = _rutas(nombre)
+    tmp = ruta_meta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, ruta_meta)
+
+
+def cargar(nombre):
+    """Devuelve el DataFrame guardado o None si no existe, es de otra versión o está invalidado."""
+    ruta_datos, _ = _rutas(nombre)
+    meta = leer_meta(nombre)
+    if not meta or meta.get("invalidado") or not os.path.exists(ruta_datos):
+        _contar(misses=1)
+        return None
+    try:
+        df = pd.read_feather(ruta_datos)
+    except Exception as e:
+        logging.warning(f"SNAPSHOT: No se pudo leer {ruta_datos}: {e}")
+        _contar(misses=1)
+        return None
+    _contar(hits=1)
+    return df
+
+
+def _vigente(ruta):
+    """False si este hilo es un refresco lanzado antes de la última invalidación de `ruta` (con _lock)."""
+    inicio = getattr(_local, "generaciones", {}).get(ruta)
+    return inicio is None or inicio == _generaciones.get(ruta, 0)
+
+
+def guardar(nombre, df, **meta):
+    """Escribe el DataFrame y sus metadatos (etag, hash...) de forma atómica."""
+    os.makedirs(_dir(), exist_ok=True)
+    ruta_datos, _ = _rutas(nombre)
+    with _lock:
+        if not _vigente(ruta_datos):
+            logging.info(f"SNAPSHOT: {nombre} cambió durante el refresco, no se guarda")
+            return
+        tmp = ruta_datos + ".tmp"
+        df.reset_index(drop=True).to_feather(tmp)
+        os.replace(tmp, ruta_datos)
+        meta = {k: v for k, v in meta.items() if k not in _BANDERAS}
+        _escribir_meta(nombre, {**meta, "version": ESQUEMA_VERSION, "guardado": time.time()})
+
+
+def marcar_comprobado(nombre):
+    """El remoto no ha cambiado: renueva la antigüedad sin reescribir los datos."""
+    ruta_datos, _ = _rutas(nombre)
+    with _lock:
+        meta = leer_meta(nombre)
+        if meta and _vigente(ruta_datos):
+            _escribir_meta(nombre, {**meta, "guardado": time.time(), "desactualizado": False})
+
+
+def invalidar(nombre):
+    """Obliga a que la próxima lectura vaya al remoto (p.ej. tras registrar o borrar una toma)."""
+    _marcar(nombre, invalidado=True)
+
+
+def marcar_desactualizado(nombre):
+    """El remoto tiene filas nuevas: la próxima lectura debe sincronizar antes de servir el snapshot."""
+    _marcar(nombre, desactualizado=True)
+
+
+def _marcar(nombre, **bandera):
+    ruta_datos, _ = _rutas(nombre)
+    with _lock:
+        _generaciones[ruta_datos] = _generaciones.get(ruta_datos, 0) + 1
+        propias = getattr(_local, "generaciones", {})
+        if ruta_datos in propias:
+            # La invalida el propio refresco (p.ej. checksum distinto): lo que descargue después vale
+            propias[ruta_datos] = _generaciones[ruta_datos]
+        meta = leer_meta(nombre)
+        if meta:
+            _escribir_meta(nombre, {**meta, **bandera})
+
+
+def antiguedad(nombre):
+    meta = leer_meta(nombre)
+    return time.time() - meta["guardado"] if meta else None
+
+
+def refrescar_en_segundo_plano(nombre, descargar):
+    """
+    Lanza `descargar()` en un hilo si el snapshot es más antiguo que CACHE_REFRESCO_SEGUNDOS.
+    Devuelve True si se ha lanzado (o ya había) un refresco en curso.
+    """
+    edad = antiguedad(nombre)
+    if edad is not None and edad < constants.CACHE_REFRESCO_SEGUNDOS:
+        return False
+    ruta, _ = _rutas(nombre)
+    perfil = perfiles.actual()
+    with _lock:
+        if ruta in _refrescando:
+            return True
+        _refrescando.add(ruta)
+        generacion = _generaciones.get(ruta, 0)
+
+    def _tarea():
+        _local.generaciones = {ruta: generacion}
+        try:
+            with perfiles.usar(perfil):
+                descargar()
+        except Exception as e:
+            logging.warning(f"SNAPSHOT: Error refrescando {nombre}: {e}")
+        finally:
+            with _lock:
+                _refrescando.discard(ruta)
+
+    threading.Thread(target=_tarea, name=f"snapshot-{nombre}", daemon=True).start()
+    return True
+
+
+def _contar(**incrementos):
+    perfil = perfiles.actual()
+    with _lock:
+        stats = _stats.setdefault(perfil, dict(_STATS_VACIAS))
+        for clave, n in incrementos.items():
+            stats[clave] += n
+
+
+def registrar_descarga(n_bytes, modificado):
+    _contar(descargas=1, bytes_descargados=n_bytes, no_modificado=0 if modificado else 1)
+
+
+def registrar_ahorro(n_bytes):
+    _contar(bytes_ahorrados=n_bytes)
+
+
+def estadisticas(nombre):
+    """Aciertos/fallos, antigüedad (s) y tamaños del snapshot `nombre`."""
+    ruta_datos, _ = _rutas(nombre)
+    meta = leer_meta(nombre)
+    perfil = perfiles.actual()
+    with _lock:
+        stats = dict(_stats.get(perfil, _STATS_VACIAS))
+    return {
+        **stats,
+        "antiguedad_s": round(antiguedad(nombre), 1) if meta else None,
+        "bytes_snapshot": os.path.getsize(ruta_datos) if os.path.exists(ruta_datos) else 0,
+        "bytes_remoto": meta.get("bytes", 0),
+    }
@@ -0,0 +1,191 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import constants
+
+# Trazas ligeras: cada span registra su duración, los bytes recibidos y el resultado de la
+# caché. Se guardan en memoria para el panel de depuración y, según TRAZAS_SALIDA, en un
+# fichero JSON lines o en un textfile de Prometheus (node_exporter) para ver la evolución.
+
+_spans = deque(maxlen=1000)
+_agregados = {}   # nombre -> {"n", "ms", "bytes", "hit", "miss", "espera", "sin_cambios", "error"}
+_lock = threading.Lock()
+_lock_fichero = threading.Lock()  # Un solo hilo escribe el fichero a la vez, sin bloquear a quien registra spans
+_local = threading.local()
+_ultimo_volcado = [0.0]
+_por_escribir = []  # Registros JSONL pendientes de volcar
+_LOTE_JSONL = 100
+
+
+def activas():
+    return constants.TRAZAS_PANEL or constants.TRAZAS_SALIDA is not None
+
+
+def _sesion():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
+
+@contextmanager
+def span(nombre, **atributos):
+    """
+    Mide el bloque. Dentro se pueden añadir datos al span en curso con anotar();
+    los spans anidados en el mismo hilo guardan el nombre de su padre.
+    """
+    if not activas():
+        yield {}
+        return
+    pila = _local.__dict__.setdefault("pila", [])
+    registro = {"nombre": nombre, "padre": pila[-1]["nombre"] if pila else None, "sesion": _sesion(),
+                "inicio": time.time(), "bytes": 0, "cache": None, "error": None, **atributos}
+    pila.append(registro)
+    t0 = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro["error"] = type(e).__name__
+        raise
+    finally:
+        registro["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        pila.pop()
+        _registrar(registro)
+
+
+def medido(nombre):
+    """Decorador: cada llamada a la función es un span con ese nombre."""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            with span(nombre):
+                return fn(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def anotar(bytes=0, cache=None):
+    """Suma bytes y/o fija el resultado de la caché ("hit", "miss", "espera", "sin_cambios") del span en curso."""
+    pila = _local.__dict__.get("pila")
+    if not pila:
+        return
+    pila[-1]["bytes"] += bytes
+    if cache is not None:
+        pila[-1]["cache"] = cache
+
+
+def _registrar(registro):
+    with _lock:
+        _spans.append(registro)
+        agregado = _agregados.setdefault(registro["nombre"], {"n": 0, "ms": 0.0, "bytes": 0, "hit": 0,
+                                                              "miss": 0, "espera": 0, "sin_cambios": 0,
+                                                              "error": 0})
+        agregado["n"] += 1
+        agregado["ms"] += registro["ms"]
+        agregado["bytes"] += registro["bytes"]
+        if registro["cache"]:
+            agregado[registro["cache"]] += 1
+        if registro["error"]:
+            agregado["error"] += 1
+        if constants.TRAZAS_SALIDA == "jsonl":
+            _por_escribir.append(registro)
+    try:
+        if constants.TRAZAS_SALIDA == "jsonl":
+            _escribir_jsonl()
+        elif constants.TRAZAS_SALIDA == "prometheus":
+            _volcar_prometheus()
+    except OSError as e:
+        logging.warning(f"TRAZAS: No se pudo escribir {constants.TRAZAS_RUTA}: {e}")
+
+
+def _preparar_directorio():
+    directorio = os.path.dirname(constants.TRAZAS_RUTA)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+
+def _escribir_jsonl(forzar=False):
+    """Añade al fichero los registros acumulados (cada _LOTE_JSONL spans o TRAZAS_VOLCADO_SEGUNDOS)."""
+    ahora = time.time()
+    # Si otro hilo ya está escribiendo, sus registros y los nuevos salen en el siguiente volcado
+    if not _lock_fichero.acquire(blocking=forzar):
+        return
+    try:
+        with _lock:
+            if not _por_escribir or not (forzar or len(_por_escribir) >= _LOTE_JSONL
+                                         or ahora - _ultimo_volcado[0] >= constants.TRAZAS_VOLCADO_SEGUNDOS):
+                return
+            _ultimo_volcado[0] = ahora
+            registros = _por_escribir[:]
+            del _por_escribir[:]
+        _preparar_directorio()
+        with open(constants.TRAZAS_RUTA, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, default=str) + "\n" for r in registros))
+    finally:
+        _lock_fichero.release()
+
+
+@atexit.register
+def _volcar_al_salir():
+    try:
+        _escribir_jsonl(forzar=True)
+    except OSError as e:
+        logging.warning(f"TRAZAS: No se pudo escribir {constants.TRAZAS_RUTA}: {e}")
+
+
+def _volcar_prometheus():
+    """Reescribe el textfile (como mucho cada TRAZAS_VOLCADO_SEGUNDOS) con los contadores acumulados."""
+    ahora = time.time()
+    with _lock:
+        if ahora - _ultimo_volcado[0] < constants.TRAZAS_VOLCADO_SEGUNDOS:
+            return
+        _ultimo_volcado[0] = ahora
+        agregados = {nombre: dict(a) for nombre, a in _agregados.items()}
+
+    lineas = [
+        "# HELP reductor_span_segundos_total Tiempo acumulado por span.",
+        "# TYPE reductor_span_segundos_total counter",
+        *(f'reductor_span_segundos_total{{span="{n}"}} {a["ms"] / 1000:.6f}' for n, a in agregados.items()),
+        "# HELP reductor_span_llamadas_total Número de llamadas por span.",
+        "# TYPE reductor_span_llamadas_total counter",
+        *(f'reductor_span_llamadas_total{{span="{n}"}} {a["n"]}' for n, a in agregados.items()),
+        "# HELP reductor_span_bytes_total Bytes recibidos por span.",
+        "# TYPE reductor_span_bytes_total counter",
+        *(f'reductor_span_bytes_total{{span="{n}"}} {a["bytes"]}' for n, a in agregados.items()),
+        "# HELP reductor_span_cache_total Resultado de la caché por span.",
+        "# TYPE reductor_span_cache_total counter",
+        *(f'reductor_span_cache_total{{span="{n}",resultado="{r}"}} {a[r]}'
+          for n, a in agregados.items() for r in ("hit", "miss", "espera", "sin_cambios") if a[r]),
+        "# HELP reductor_span_errores_total Spans terminados con excepción.",
+        "# TYPE reductor_span_errores_total counter",
+        *(f'reductor_span_errores_total{{span="{n}"}} {a["error"]}' for n, a in agregados.items()),
+    ]
+    _preparar_directorio()
+    tmp = constants.TRAZAS_RUTA + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lineas) + "\n")
+    os.replace(tmp, constants.TRAZAS_RUTA)
+
+
+def recientes(sesion=None, desde=0.0):
+    """Spans (más recientes primero) de la sesión indicada desde el instante `desde`."""
+    with _lock:
+        return [dict(s) for s in reversed(_spans)
+                if s["inicio"] >= desde and (sesion is None or s["sesion"] in (sesion, None))]
+
+
+def resumen():
+    """Totales acumulados por nombre de span desde el arranque del proceso."""
+    with _lock:
+        return [{"span": n, "llamadas": a["n"], "ms_medio": round(a["ms"] / a["n"], 1), "ms_total": round(a["ms"]),
+                 "bytes": a["bytes"], "hit": a["hit"], "miss": a["miss"], "espera": a["espera"], "sin_cambios": a["sin_cambios"], "errores": a["error"]}
+                for n, a in sorted(_agregados.items(), key=lambda x: -x[1]["ms"])]
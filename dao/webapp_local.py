@@ -0,0 +1,145 @@
+# Sustituto local (en memoria) del Google Apps Script desplegado como Web App.
+# Implementa el mismo contrato de acciones que usa dao/database.py para poder
+# probar la aplicación sin red. Se activa con WEB_APP_LOCAL = True en config/constants.py.
+# Cada perfil (config/perfiles.py) tiene su propio estado, como si fuera su propia hoja.
+import copy
+import itertools
+import json
+import threading
+
+import pandas as pd
+
+from config import perfiles
+from dao.operaciones import aplicar_celdas
+
+_lock = threading.Lock()
+_estados = {}  # perfil -> {"config", "tomas", "planes", "lotes", "revisiones"}
+# Contador global: una revisión nunca se repite, ni siquiera tras reiniciar()
+_revision = itertools.count(1)
+
+
+class RespuestaLocal:
+    """Imita lo que usa database.py de requests.Response."""
+
+    def __init__(self, cuerpo, status_code=200, headers=None):
+        self.content = cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo).encode("utf-8")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"Web App local: HTTP {self.status_code}")
+
+
+def _datos():
+    """Estado del perfil en uso (llamar con _lock)."""
+    return _estados.setdefault(perfiles.actual(), {"config": {}, "tomas": [], "planes": {}, "lotes": set(),
+                                                   "revisiones": {}})
+
+
+def reiniciar(config=None, tomas=None, planes=None):
+    """Vacía (o precarga) el estado en memoria del perfil en uso."""
+    with _lock:
+        estado = _datos()
+        estado["config"] = dict(config or {})
+        estado["tomas"] = [dict(t) for t in (tomas or [])]
+        estado["planes"] = {k: [dict(r) for r in v] for k, v in (planes or {}).items()}
+        estado["lotes"] = set()
+        estado["revisiones"] = {c: next(_revision) for c in ("config", "tomas", *estado["planes"])}
+
+
+def _tocar(estado, conjunto):
+    estado["revisiones"][conjunto] = next(_revision)
+
+
+def _checksum(tomas):
+    return sum(round(float(str(t["ml"]).replace(",", ".")) * 100) for t in tomas)
+
+
+def _aplicar(estado, op):
+    """Ejecuta una operación de escritura sobre `estado`. Lanza ValueError si no es válida."""
+    accion = op.get("action")
+    if accion is None or accion == "add_toma":
+        # Sin acción: alta de toma (formato original de enviar_toma_api)
+        estado["tomas"].append({"fecha": op["fecha"], "hora": op["hora"], "ml": op["ml"]})
+        _tocar(estado, "tomas")
+    elif accion == "save_config":
+        estado["config"].update(op.get("data", {}))
+        _tocar(estado, "config")
+    elif accion == "save_plan_history":
+        estado["planes"][op["sheetName"]] = [dict(r) for r in op.get("data", [])]
+        _tocar(estado, op["sheetName"])
+    elif accion == "update_plan_rows":
+        for fila in estado["planes"].get(op["sheetName"], []):
+            cambios = op.get("data", {}).get(str(fila.get("Fecha"))[:10])
+            if cambios:
+                aplicar_celdas(fila, cambios)
+        _tocar(estado, op["sheetName"])
+    elif accion == "delete_last":
+        if estado["tomas"]:
+            estado["tomas"].pop()
+        _tocar(estado, "tomas")
+    else:
+        raise ValueError(f"Acción desconocida: {accion}")
+    return {"status": "success"}
+
+
+def get(params):
+    accion = params.get("action")
+    with _lock:
+        estado = _datos()
+        if accion == "get_config":
+            return RespuestaLocal({"status": "success", "data": dict(estado["config"])})
+        if accion == "get_plan_history":
+            return RespuestaLocal({"status": "success", "data": estado["planes"].get(params.get("sheetName"), [])})
+        if accion == "get_revisions":
+            return RespuestaLocal({"status": "success", "data": dict(estado["revisiones"])})
+        if accion == "get_tomas_since":
+            fila = int(params.get("fila", 0))
+            return RespuestaLocal({"status": "success", "data": estado["tomas"][fila:],
+                                   "total_filas": len(estado["tomas"]), "checksum": _checksum(estado["tomas"])})
+    return RespuestaLocal({"status": "error", "message": f"Acción desconocida: {accion}"})
+
+
+def post(payload):
+    """
+    Acciones de escritura. `batch` recibe {"action": "batch", "ops": [...]} y las aplica
+    en orden de forma atómica: si alguna falla no se aplica ninguna y se devuelve
+    {"status": "error", "index": i, "message": ...}. Un lote con un "id" ya aplicado
+    se responde como éxito sin volver a aplicarlo.
+    """
+    with _lock:
+        estado = _datos()
+        if payload.get("action") == "batch":
+            if payload.get("id") and payload["id"] in estado["lotes"]:
+                return RespuestaLocal({"status": "success", "results": [], "duplicado": True})
+            borrador = copy.deepcopy(estado)
+            resultados = []
+            for i, op in enumerate(payload.get("ops", [])):
+                try:
+                    resultados.append(_aplicar(borrador, op))
+                except (KeyError, ValueError) as e:
+                    return RespuestaLocal({"status": "error", "index": i, "message": str(e)})
+            if payload.get("id"):
+                borrador["lotes"].add(payload["id"])
+            estado.update(borrador)
+            return RespuestaLocal({"status": "success", "results": resultados})
+        try:
+            return RespuestaLocal(_aplicar(estado, payload))
+        except (KeyError, ValueError) as e:
+            return RespuestaLocal({"status": "error", "message": str(e)})
+
+
+def exportar_csv():
+    """Equivalente a la exportación CSV de la hoja de tomas."""
+    with _lock:
+        df = pd.DataFrame(_datos()["tomas"], columns=["fecha", "hora", "ml"])
+    df = df.rename(columns={"fecha": "Fecha", "hora": "Hora"})
+    return RespuestaLocal(df.to_csv(index=False).encode("utf-8"))
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Esquema común de las tablas de plan ('Plan Tiempo' y 'Plan Dosis'). En memoria la tabla
+# va indexada por 'Fecha' (DatetimeIndex sin zona, a medianoche de Europe/Madrid); en la
+# hoja, 'Fecha' es una columna de texto 'YYYY-MM-DD'.
+NUMERICAS = ["Objetivo (ml)", "Reducción Diaria", "Dosis", "Real (ml)"]
+TEXTO = ["Intervalo", "Estado"]
+COLUMNAS = ["Objetivo (ml)", "Real (ml)", "Reducción Diaria", "Dosis", "Intervalo", "Estado"]
+
+# Margen (ml) sobre el objetivo con el que un día cerrado aún se da por cumplido
+MARGEN_CUMPLIDO = 0.5
+
+
+def hoy():
+    """Día actual en Europe/Madrid, con el mismo tipo que el índice de las tablas."""
+    return pd.Timestamp.now(tz='Europe/Madrid').tz_localize(None).normalize()
+
+
+def vacia():
+    return pd.DataFrame(columns=COLUMNAS, index=pd.DatetimeIndex([], name="Fecha")).astype(
+        {c: float for c in NUMERICAS})
+
+
+def normalizar(df, dia=None):
+    """
+    Tabla de plan tal como llega del backend -> tabla tipada indexada por Fecha y con el
+    Estado de cada día calculado frente a un único "hoy".
+    """
+    if df is None or df.empty or "Fecha" not in df.columns:
+        return vacia()
+    dia = hoy() if dia is None else dia
+
+    # Fechas 'YYYY-MM-DD' o ISO con zona (las celdas de fecha de Sheets llegan en UTC)
+    fechas = pd.to_datetime(df["Fecha"], format='ISO8601', utc=True, errors='coerce')
+    indice = pd.DatetimeIndex(fechas.dt.tz_convert('Europe/Madrid').dt.tz_localize(None).dt.normalize(), name="Fecha")
+
+    tabla = df.drop(columns="Fecha").set_axis(indice)
+    tabla = tabla[tabla.index.notna() & ~tabla.index.duplicated()].sort_index()
+    for columna in NUMERICAS:
+        valores = tabla[columna] if columna in tabla.columns else 0
+        tabla[columna] = pd.to_numeric(valores, errors='coerce')
+    tabla[NUMERICAS] = tabla[NUMERICAS].fillna(0.0).astype(float)
+    for columna in TEXTO:
+        tabla[columna] = tabla[columna].fillna("").astype(str) if columna in tabla.columns else ""
+
+    tabla["Estado"] = estado(tabla, dia)
+    return tabla
+
+
+def estado(tabla, dia):
+    indice = tabla.index
+    cerrado = indice < dia
+    cumplido = tabla["Real (ml)"].to_numpy() <= tabla["Objetivo (ml)"].to_numpy() + MARGEN_CUMPLIDO
+    return np.select(
+        [cerrado & cumplido, cerrado, indice == dia],
+        ["✅ Sí", "❌ No", "⏳ En curso"],
+        default="🔮 Futuro",
+    )
+
+
+def a_hoja(tabla):
+    """Tabla tipada -> filas con 'Fecha' en texto, listas para guardar en el backend."""
+    filas = tabla.reset_index()
+    filas["Fecha"] = filas["Fecha"].dt.strftime('%Y-%m-%d')
+    return filas.replace([np.inf, -np.inf], 0).fillna(0)
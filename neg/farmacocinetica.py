@@ -0,0 +1,243 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Error absoluto máximo (ml) frente al cálculo toma a toma con iterrows.
+TOLERANCIA_ML = 1e-9
+
+# Máximo exponente k·Δt dentro de un bloque de la suma acumulada (exp(50) ~ 5e21, sin overflow).
+_MAX_EXPONENTE = 50.0
+
+
+def _horas_desde(valores, referencia):
+    """Convierte timestamps a horas (float) relativas a `referencia`."""
+    return np.asarray((pd.DatetimeIndex(valores) - referencia) / pd.Timedelta(hours=1), dtype=float)
+
+
+def _suma_exponencial(t, t_dosis, ml, k, s0=0.0):
+    """
+    S(t_j) = s0 · exp(-k · t_j) + Σ ml_i · exp(-k · (t_j - t_i)) para las dosis con t_i <= t_j.
+
+    `s0` es el valor de la suma en t = 0 (checkpoint); se asume t[0] >= 0.
+    Las dosis anteriores a t[0] se suman directamente al estado inicial; el resto
+    se agrupa en el primer punto del grid >= t_i (con su decaimiento exacto hasta ese
+    punto) y se propaga con el filtro recursivo y[j] = y[j-1]·exp(-k·Δt) + x[j],
+    resuelto por bloques con una suma acumulada escalada.
+    """
+    m = len(t)
+    if m == 0:
+        return np.zeros(0)
+
+    previas = t_dosis <= t[0]
+    estado = s0 * np.exp(-k * t[0]) + float(np.sum(ml[previas] * np.exp(-k * (t[0] - t_dosis[previas]))))
+
+    dentro = ~previas & (t_dosis <= t[-1])
+    idx = np.searchsorted(t, t_dosis[dentro], side='left')
+    x = np.bincount(idx, weights=ml[dentro] * np.exp(-k * (t[idx] - t_dosis[dentro])), minlength=m)
+    x[0] += estado
+
+    y = np.empty(m)
+    acarreo, t_acarreo = 0.0, t[0]
+    inicio = 0
+    while inicio < m:
+        t_b = t[inicio]
+        fin = max(inicio + 1, int(np.searchsorted(t, t_b + _MAX_EXPONENTE / k, side='right')))
+        dt = t[inicio:fin] - t_b
+        bloque = np.exp(-k * dt) * np.cumsum(x[inicio:fin] * np.exp(k * dt))
+        y[inicio:fin] = acarreo * np.exp(-k * (t[inicio:fin] - t_acarreo)) + bloque
+        acarreo, t_acarreo = y[fin - 1], t[fin - 1]
+        inicio = fin
+    return y
+
+
+def constantes(ka, hl):
+    """Devuelve (ka, k_el) evitando la singularidad ka == k_el del modelo de Bateman."""
+    k_el = np.log(2) / hl
+    ka = ka if ka != k_el else ka + 0.01
+    return ka, k_el
+
+
+@dataclass(frozen=True)
+class CheckpointPK:
+    """
+    Estado del modelo de un compartimento con absorción en un instante:
+    cantidad pendiente de absorber (intestino) y cantidad activa (plasma).
+    Solo es válido para los ka/hl con los que se calculó.
+    """
+    timestamp: pd.Timestamp
+    intestino: float
+    plasma: float
+    ka: float
+    hl: float
+    n_tomas: int  # Tomas con timestamp <= self.timestamp ya incorporadas
+
+    def vigente(self, ka, hl, timestamps):
+        """False si cambian ka/hl o si aparecen/desaparecen tomas anteriores al checkpoint."""
+        if self.ka != ka or self.hl != hl:
+            return False
+        return int((pd.DatetimeIndex(timestamps) <= self.timestamp).sum()) == self.n_tomas
+
+    def avanzar(self, timestamp):
+        """Evoluciona el estado analíticamente hasta `timestamp`, sin tomas nuevas."""
+        ka, k_el = constantes(self.ka, self.hl)
+        dt = (timestamp - self.timestamp) / pd.Timedelta(hours=1)
+        intestino = self.intestino * np.exp(-ka * dt)
+        plasma = (self.plasma * np.exp(-k_el * dt)
+                  + self.intestino * ka / (ka - k_el) * (np.exp(-k_el * dt) - np.exp(-ka * dt)))
+        return CheckpointPK(timestamp, float(intestino), float(plasma), self.ka, self.hl, self.n_tomas)
+
+
+def avanzar_curva(timeline, timestamps, ml, ka, hl, checkpoint=None):
+    """
+    Devuelve (curva, checkpoint) donde curva es el nivel estimado en cada punto de
+    `timeline` y checkpoint el estado en su último punto.
+
+    Con `checkpoint`, solo se incorporan las tomas posteriores a él y `timeline`
+    debe empezar después de checkpoint.timestamp: el coste es O(tomas nuevas + puntos).
+    """
+    timeline = pd.DatetimeIndex(timeline)
+    timestamps = pd.DatetimeIndex(timestamps)
+    ml = np.asarray(ml, dtype=float)
+    ka_ef, k_el = constantes(ka, hl)
+    factor = ka_ef / (ka_ef - k_el)
+
+    if checkpoint is None:
+        if len(timeline) == 0:
+            return np.zeros(0), None
+        referencia, s0_el, s0_a, n_previas = timeline[0], 0.0, 0.0, 0
+    else:
+        referencia = checkpoint.timestamp
+        s0_a = checkpoint.intestino
+        s0_el = checkpoint.plasma / factor + checkpoint.intestino
+        n_previas = checkpoint.n_tomas
+        nuevas = timestamps > referencia
+        timestamps, ml = timestamps[nuevas], ml[nuevas]
+        if len(timeline) == 0:
+            return np.zeros(0), checkpoint
+
+    t = _horas_desde(timeline, referencia)
+    t_dosis = _horas_desde(timestamps, referencia)
+
+    s_el = _suma_exponencial(t, t_dosis, ml, k_el, s0_el)
+    s_a = _suma_exponencial(t, t_dosis, ml, ka_ef, s0_a)
+    curva = factor * (s_el - s_a)
+
+    final = CheckpointPK(timeline[-1], float(s_a[-1]), float(curva[-1]), ka, hl,
+                         n_previas + int((timestamps <= timeline[-1]).sum()))
+    return curva, final
+
+
+def curva_concentracion(timeline, timestamps, ml, ka, hl):
+    """
+    Nivel estimado (ml) en cada punto de `timeline` como superposición de Bateman
+    de todas las tomas: ml · ka/(ka-k_el) · (exp(-k_el·t) - exp(-ka·t)).
+
+    Coste O(tomas + puntos) en NumPy. `timeline` debe estar ordenado. Coincide con
+    el cálculo toma a toma hasta TOLERANCIA_ML.
+    """
+    return avanzar_curva(timeline, timestamps, ml, ka, hl)[0]
+
+
+# Calibración de ka/hl con el pulso: mismos rangos que los sliders de ajuste
+KA_RANGO = (0.5, 5.0)
+HL_RANGO = (0.5, 4.0)
+MIN_PUNTOS_PULSO = 60
+
+
+@dataclass(frozen=True)
+class Calibracion:
+    """Mejor (ka, hl) para el modelo pulso ≈ base + pendiente · nivel estimado."""
+    ka: float
+    hl: float
+    r2: float
+    pendiente: float  # lpm por ml de nivel estimado
+    base: float       # lpm con nivel 0
+    n_puntos: int
+
+
+def _sumas_exponenciales(t, t_dosis, ml, k):
+    """
+    Matriz (len(k), len(t)) con S_k(t_j) = Σ ml_i · exp(-k · (t_j - t_i)) para t_i <= t_j,
+    para todas las constantes `k` a la vez. `t` es un grid regular (t[0] = 0).
+
+    Las dosis anteriores a t[0] forman el estado inicial de cada k; las de dentro se llevan
+    al primer punto del grid >= t_i con su decaimiento exacto hasta él, y la propagación
+    es una convolución causal con exp(-k · m · Δt) resuelta con FFT para todas las k.
+    """
+    n = len(t)
+    k = np.asarray(k, dtype=float)[:, None]
+    paso = t[1] - t[0] if n > 1 else 1.0
+    previas = t_dosis <= t[0]
+    inicial = np.exp(-k * (t[0] - t_dosis[previas])) @ ml[previas]          # (K,)
+
+    dentro = ~previas & (t_dosis <= t[-1])
+    idx = np.minimum(np.ceil((t_dosis[dentro] - t[0]) / paso - 1e-9).astype(int), n - 1)
+    x = np.zeros((len(k), n))
+    np.add.at(x, (slice(None), idx), ml[dentro] * np.exp(-k * (t[idx] - t_dosis[dentro])))
+
+    largo = 1 << int(np.ceil(np.log2(2 * n)))
+    nucleo = np.exp(-k * paso * np.arange(n))
+    s = np.fft.irfft(np.fft.rfft(x, largo) * np.fft.rfft(nucleo, largo), largo)[:, :n]
+    return s + inicial[:, None] * np.exp(-k * (t - t[0]))
+
+
+def _evaluar_rejilla(t, t_dosis, ml, pulso, observado, ka, hl):
+    """R², pendiente y base (matrices len(ka) x len(hl)) del ajuste lineal del pulso para cada par."""
+    k_el = np.log(2) / hl
+    s_el = _sumas_exponenciales(t, t_dosis, ml, k_el)[:, observado]         # (H, M)
+    s_a = _sumas_exponenciales(t, t_dosis, ml, ka)[:, observado]            # (A, M)
+    diferencia = ka[:, None] - k_el[None, :]
+    singular = np.abs(diferencia) < 1e-6
+    factor = ka[:, None] / np.where(singular, 1.0, diferencia)
+    nivel = factor[:, :, None] * (s_el[None, :, :] - s_a[:, None, :])     # (A, H, M)
+
+    y = pulso[observado]
+    yc = y - y.mean()
+    media = nivel.mean(axis=-1)
+    centrado = nivel - media[:, :, None]
+    sxy = centrado @ yc
+    sxx = np.einsum('ahm,ahm->ah', centrado, centrado)
+    valido = ~singular & (sxx > 1e-12)
+    sxx = np.where(valido, sxx, 1.0)
+    r2 = np.where(valido, sxy ** 2 / (sxx * (yc @ yc)), -np.inf)
+    pendiente = sxy / sxx
+    return r2, pendiente, y.mean() - pendiente * media
+
+
+def calibrar(pulso, timestamps, ml, ka_rango=KA_RANGO, hl_rango=HL_RANGO, n=24, refinamientos=2):
+    """
+    Ajusta (ka, hl) al pulso por minuto (Series con índice de instantes; NaN = sin dato).
+    Para cada par de una rejilla logarítmica n x n el pulso se modela como
+    base + pendiente · nivel estimado (mínimos cuadrados) y se elige el par con mayor R²;
+    toda la rejilla se evalúa de una vez con broadcasting. Después se repite en rejillas
+    más finas alrededor del mejor par. Devuelve una Calibracion o None si no hay
+    suficiente pulso o el pulso es constante.
+    """
+    pulso = pulso.groupby(level=0).mean()
+    if pulso.notna().sum() < MIN_PUNTOS_PULSO or len(timestamps) == 0:
+        return None
+    grid = pd.date_range(pulso.index.min(), pulso.index.max(), freq='1min')
+    valores = pulso.reindex(grid).to_numpy(dtype=float)
+    observado = ~np.isnan(valores)
+    if np.ptp(valores[observado]) == 0:
+        return None
+
+    t = _horas_desde(grid, grid[0])
+    t_dosis = _horas_desde(timestamps, grid[0])
+    ml = np.asarray(ml, dtype=float)
+
+    ka = np.geomspace(*ka_rango, n)
+    hl = np.geomspace(*hl_rango, n)
+    for ronda in range(refinamientos + 1):
+        r2, pendiente, base = _evaluar_rejilla(t, t_dosis, ml, valores, observado, ka, hl)
+        if not np.isfinite(r2.max()):
+            return None
+        i, j = np.unravel_index(np.argmax(r2), r2.shape)
+        mejor = Calibracion(float(ka[i]), float(hl[j]), float(r2[i, j]), float(pendiente[i, j]),
+                            float(base[i, j]), int(observado.sum()))
+        if ronda < refinamientos:
+            # Rejilla más fina entre los vecinos del mejor par (sin salir de los rangos)
+            ka = np.geomspace(max(ka_rango[0], ka[max(i - 1, 0)]), min(ka_rango[1], ka[min(i + 1, len(ka) - 1)]), 9)
+            hl = np.geomspace(max(hl_rango[0], hl[max(j - 1, 0)]), min(hl_rango[1], hl[min(j + 1, len(hl) - 1)]), 9)
+    return mejor
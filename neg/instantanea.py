@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+
+
+@dataclass(frozen=True)
+class Instantanea:
+    """
+    Valores de un rerun: un "ahora" fijo, la fila de hoy de cada plan y la última toma.
+    Todas las métricas de la página se calculan sobre la misma instantánea.
+    """
+    ahora: pd.Timestamp
+    hoy: str                      # 'YYYY-MM-DD' en Europe/Madrid
+    fila_tiempo: dict | None      # Fila de hoy del 'Plan Tiempo'
+    fila_dosis: dict | None       # Fila de hoy del 'Plan Dosis'
+    ultima_toma: pd.Timestamp | None
+
+    def min_desde_ultima_toma(self):
+        if self.ultima_toma is None:
+            return 0
+        return (self.ahora - self.ultima_toma).total_seconds() / 60
+
+
+def _fila_de_hoy(df, hoy):
+    # Las tablas de plan ya vienen indexadas por Fecha y sin días repetidos (neg/esquema_plan.py)
+    dia = pd.Timestamp(hoy)
+    if df is None or dia not in df.index:
+        return None
+    return df.loc[dia].to_dict()
+
+
+def construir():
+    """Calcula la instantánea a partir de session_state y la guarda para el resto del rerun."""
+    ahora = pd.Timestamp.now(tz='Europe/Madrid')
+    hoy = ahora.strftime('%Y-%m-%d')
+    tomas = st.session_state.get("tomas")
+    ultima = tomas.last() if tomas is not None else None
+    ultima_toma = ultima[0] if ultima else None
+
+    st.session_state.instantanea = Instantanea(
+        ahora=ahora,
+        hoy=hoy,
+        fila_tiempo=_fila_de_hoy(st.session_state.get("df_tiempos"), hoy),
+        fila_dosis=_fila_de_hoy(st.session_state.get("df_dosis"), hoy),
+        ultima_toma=ultima_toma,
+    )
+    return st.session_state.instantanea
+
+
+def actual():
+    """Instantánea del rerun en curso (la construye si aún no existe)."""
+    if "instantanea" not in st.session_state:
+        return construir()
+    return st.session_state.instantanea
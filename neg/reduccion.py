@@ -1,19 +1,64 @@
+import numpy as np
 import pandas as pd
 
 from neg import reduccion_por_dosis,reduccion_por_tiempo
 
 # Importa las funciones de base de datos
-from dao.database import save_plan_history_data, save_config, enviar_toma_api
+from dao import journal
+from dao.database import save_plan_history_data, save_config
+from dao.operaciones import op_save_config, op_toma
 
 def guardar_toma(fecha_toma, hora_toma, ml_toma):
+    # Config, toma y los dos planes en un solo lote (o todo o nada). Se guarda en el
+    # diario local y se envía en segundo plano, así que la toma no se pierde sin red.
+    journal.registrar([
+        op_save_config({
+            "tiempos.checkpoint_ml": reduccion_por_tiempo.mlAcumulados() - ml_toma,
+            "dosis.checkpoint_ml": reduccion_por_tiempo.mlAcumulados() - ml_toma,
+        }),
+        op_toma(fecha_toma.strftime('%d/%m/%Y'), hora_toma.strftime('%H:%M:%S'), ml_toma),
+        reduccion_por_tiempo.add_toma(fecha_toma, ml_toma),
+        reduccion_por_dosis.add_toma(fecha_toma, ml_toma),
+    ])
 
-    save_config({
-        "tiempos.checkpoint_ml": reduccion_por_tiempo.mlAcumulados() - ml_toma,
-        "dosis.checkpoint_ml": reduccion_por_tiempo.mlAcumulados() - ml_toma,
+
+def explorar_planes(ml_dia_actual, reducciones, dosis, intervalos_min):
+    """
+    Evalúa de una vez la rejilla (reducción diaria × dosis × intervalo) sin crear ningún plan:
+    fecha de fin, días y ml totales de cada combinación, más las tomas que supone cada plan.
+    """
+    red, dos, itv = (g.ravel() for g in np.meshgrid(np.asarray(reducciones, dtype=float),
+                                                    np.asarray(dosis, dtype=float),
+                                                    np.asarray(intervalos_min, dtype=float), indexing='ij'))
+    ml = float(ml_dia_actual)
+    hoy = pd.Timestamp.now(tz='Europe/Madrid').tz_localize(None).normalize()
+
+    def resumen(n_dias):
+        # Suma cerrada de la serie aritmética ml, ml - r, ..., ml - (n-1)·r
+        total = n_dias * ml - red * n_dias * (n_dias - 1) / 2
+        fin = (hoy + pd.to_timedelta(np.maximum(n_dias - 1, 0), unit='D')).strftime('%Y-%m-%d')
+        return total.round(1), fin
+
+    dias_t = reduccion_por_tiempo.dias_plan(ml, red)
+    total_t, fin_t = resumen(dias_t)
+    dias_d = reduccion_por_dosis.dias_plan(ml, red)
+    total_d, fin_d = resumen(dias_d)
+    tomas_dia = np.divide(1440, itv, out=np.zeros_like(itv), where=itv > 0)
+
+    return pd.DataFrame({
+        "Reducción Diaria": red.round(2),
+        "Dosis": dos.round(2),
+        "Intervalo (min)": itv.astype(int),
+        "Fin (tiempo)": fin_t,
+        "Días (tiempo)": dias_t,
+        "Total ml (tiempo)": total_t,
+        "Tomas (tiempo)": np.divide(total_t, dos, out=np.zeros_like(dos), where=dos > 0).round().astype(int),
+        "Fin (dosis)": fin_d,
+        "Días (dosis)": dias_d,
+        "Total ml (dosis)": total_d,
+        "Tomas (dosis)": (dias_d * tomas_dia).round().astype(int),
+        "Dosis inicial (dosis)": np.divide(ml, tomas_dia, out=np.zeros_like(itv), where=tomas_dia > 0).round(2),
     })
-    enviar_toma_api(fecha_toma.strftime('%d/%m/%Y'), hora_toma.strftime('%H:%M:%S'), ml_toma)
-    reduccion_por_tiempo.add_toma(fecha_toma, ml_toma)
-    reduccion_por_dosis.add_toma(fecha_toma, ml_toma)
 
 
 def crear_nuevo_plan(ml_dia_actual, ml_dosis_actual, intervalo_horas,reduccion_diaria):
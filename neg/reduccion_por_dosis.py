@@ -1,10 +1,12 @@
-from datetime import datetime, timedelta
-from . import historial
+from datetime import datetime
+from . import esquema_plan, historial, instantanea
+import numpy as np
 import pandas as pd
 import streamlit as st
-from pandas import DataFrame
 
+from dao import trazas
 from dao.database import get_plan_history_data, save_plan_history_data
+from dao.operaciones import op_update_plan_rows, sumar
 
 def mins_espera():
     return  max(0, intervalo() -  historial.minDesdeUltimaToma())
@@ -27,132 +29,106 @@ def mlDesdeUltimaToma():
 def mlAcumulados():
     return  mlDesdeUltimaToma() + float(st.session_state.config.get("dosis.checkpoint_ml",0))
 def objetivo_ml():
-    df = st.session_state.df_tiempos.copy()
-    if df.empty or "Fecha" not in df.columns:
-        return 0
-    row = df[df["Fecha"] == pd.Timestamp.now(tz='Europe/Madrid').strftime('%Y-%m-%d')]
-    if not row.empty:
-        return float(row['Objetivo (ml)'].iloc[0])
-    else:
+    fila = instantanea.actual().fila_tiempo
+    if fila is None:
         return 0
+    return float(fila['Objetivo (ml)'])
 def dosis_actual():
-    df = st.session_state.df_dosis.copy()
-    if df.empty or "Fecha" not in df.columns:
-        return float(0)
-    row = df[df["Fecha"] == pd.Timestamp.now(tz='Europe/Madrid').strftime('%Y-%m-%d')]
-    if not row.empty:
-        return float(row['Dosis'].iloc[0])
-    else:
+    fila = instantanea.actual().fila_dosis
+    if fila is None:
         return float(0)
+    return float(fila['Dosis'])
 def intervalo():
-    df = st.session_state.df_dosis.copy()
-    if df.empty or "Fecha" not in df.columns:
-        return 120
-    row = df[df["Fecha"] == pd.Timestamp.now(tz='Europe/Madrid').strftime('%Y-%m-%d')]
-    if not row.empty:
-        intervalo_str = row['Intervalo'].iloc[0]
+    fila = instantanea.actual().fila_dosis
+    if fila is not None:
+        intervalo_str = fila['Intervalo']
         # Parse "Xh Ym" format
         parts = intervalo_str.replace('h', ' ').replace('m', '').split()
         if len(parts) == 2:
             return int(parts[0]) * 60 + int(parts[1])
     return 120 # Default to 120 minutes
 
+# Tope de días de un plan y objetivo mínimo por debajo del cual el plan termina
+MAX_DIAS = 365
+OBJETIVO_MINIMO = 0.1
+
+
+def _objetivos(ml_dia_actual, reduccion_diaria):
+    """
+    Objetivo de cada uno de los MAX_DIAS días restando la reducción día a día (admite arrays).
+    Se resta en secuencia como el bucle original, así que arrastra los mismos errores de
+    redondeo y da los mismos días y valores.
+    """
+    ml, red = np.broadcast_arrays(np.asarray(ml_dia_actual, dtype=float), np.asarray(reduccion_diaria, dtype=float))
+    pasos = np.empty(ml.shape + (MAX_DIAS,))
+    pasos[..., 0] = ml
+    pasos[..., 1:] = red[..., None]
+    return np.subtract.accumulate(pasos, axis=-1)
+
+
+def _redondear(valores):
+    # round() de Python y no ndarray.round(2), que difiere en los valores ...5 (p.ej. 0.475)
+    return [round(valor, 2) for valor in valores.tolist()]
+
+
+def _dias(objetivos):
+    fuera = ~(objetivos >= OBJETIVO_MINIMO)
+    return np.where(fuera.any(axis=-1), fuera.argmax(axis=-1), MAX_DIAS)
+
+
+def dias_plan(ml_dia_actual, reduccion_diaria):
+    """Días hasta el primer objetivo < OBJETIVO_MINIMO (admite arrays, con tope MAX_DIAS)."""
+    return _dias(_objetivos(ml_dia_actual, reduccion_diaria))
+
+
+@trazas.medido("reduccion_por_dosis.crear_tabla")
 def crear_tabla(reduccion_diaria, ml_dia_actual, intervalo_horas, fecha_inicio=None):
-    tabla = []
     fecha_dia = fecha_inicio if fecha_inicio else datetime.now()
-    objetivo_dia = float(ml_dia_actual)
+    ml_dia_actual = float(ml_dia_actual)
     reduccion_diaria = float(reduccion_diaria)
 
     intervalo_val = intervalo_horas.hour + intervalo_horas.minute / 60.0
-
     tomas_dia = 24 / intervalo_val if intervalo_val > 0 else 0
     horas_int = int(intervalo_val)
     mins_int = int((intervalo_val - horas_int) * 60)
 
-    # Límite de seguridad
-    dias_count = 0
-    while objetivo_dia >= 0.1 and dias_count < 365:
-        tabla.append({
-            "Fecha": fecha_dia.strftime("%Y-%m-%d"),
-            "Objetivo (ml)": round(objetivo_dia, 2),
-            "Reducción Diaria": round(reduccion_diaria, 2),
-            "Dosis": round(objetivo_dia / tomas_dia, 2) if tomas_dia > 0 else 0,
-            "Intervalo": f"{horas_int}h {mins_int}m",
-            "Real (ml)": 0.0,
-            "Estado": ""
-        })
-        
-        objetivo_dia = max(0.0, objetivo_dia - reduccion_diaria)
-        fecha_dia += timedelta(days=1)
-        dias_count += 1
-    return pd.DataFrame(tabla)
+    objetivo = _objetivos(ml_dia_actual, reduccion_diaria)
+    n_dias = int(_dias(objetivo))
+    objetivo = objetivo[:n_dias]
+
+    return pd.DataFrame({
+        "Fecha": pd.date_range(fecha_dia, periods=n_dias, freq="D").strftime("%Y-%m-%d"),
+        "Objetivo (ml)": _redondear(objetivo),
+        "Reducción Diaria": round(reduccion_diaria, 2),
+        "Dosis": _redondear(objetivo / tomas_dia) if tomas_dia > 0 else 0,
+        "Intervalo": f"{horas_int}h {mins_int}m",
+        "Real (ml)": 0.0,
+        "Estado": "",
+    })
+@trazas.medido("reduccion_por_dosis.obtener_tabla")
 def obtener_tabla():
     """
     (LEE DATOS de 'PlanHistory')
-    Obtiene los datos del plan, los convierte a tipos correctos y calcula el estado.
+    Obtiene los datos del plan, tipados e indexados por Fecha, con el estado de cada día.
     """
-    df = get_plan_history_data(sheet_name="Plan Dosis")
-    if df.empty:
-        return pd.DataFrame(columns=['Fecha', 'Objetivo (ml)', 'Real (ml)', 'Reducción Diaria', 'Dosis', 'Estado'])
-
-    # Manejo robusto de fechas
-    df['Fecha'] = pd.to_datetime(df['Fecha'])
-
-    # Si las fechas ya tienen zona horaria (tz-aware), convertimos directamente
-    if df['Fecha'].dt.tz is not None:
-         df['Fecha'] = df['Fecha'].dt.tz_convert('Europe/Madrid')
-    else:
-         # Si no tienen zona horaria (tz-naive), las localizamos primero
-         # Asumimos que vienen en UTC o sin zona, las tratamos como UTC y luego Madrid
-         df['Fecha'] = df['Fecha'].dt.tz_localize('UTC').dt.tz_convert('Europe/Madrid')
-
-
-    def calcular_estado(row):
-        if row["Fecha"] < datetime.now().strftime("%Y-%m-%d"):
-            # Ciclo cerrado (días anteriores)
-            if row['Real (ml)'] <= row['Objetivo (ml)'] + 0.5:
-                return "✅ Sí"
-            else:
-                return "❌ No"
-        elif row["Fecha"] == datetime.now().strftime("%Y-%m-%d"):
-            # Ciclo en curso (hoy)
-            return "⏳ En curso"
-        else:
-            # Días futuros
-            return "🔮 Futuro"
-
-
-    df["Fecha"] = df["Fecha"].dt.strftime('%Y-%m-%d')
-    df["Objetivo (ml)"] = pd.to_numeric(df['Objetivo (ml)'], errors='coerce').fillna(0)
-    df["Reducción Diaria"] = pd.to_numeric(df['Reducción Diaria'], errors='coerce').fillna(0)
-    df['Dosis'] = pd.to_numeric(df['Dosis'], errors='coerce').fillna(0)
-    # df['Intervalo'] = df["Fecha"].dt.strftime('%Y-%m-%d')
-    df['Real (ml)'] = pd.to_numeric( df['Real (ml)'], errors='coerce').fillna(0)
-    df['Estado'] = df.apply(calcular_estado, axis=1)
-
-    return df
+    return esquema_plan.normalizar(get_plan_history_data(sheet_name="Plan Dosis"))
 
 def replanificar(reduccion_diaria, ml_dia_actual, intervalo_horas):
-    fecha_hoy = pd.Timestamp.now(tz='Europe/Madrid').strftime('%Y-%m-%d')
-    df_nuevo = crear_tabla(reduccion_diaria, ml_dia_actual, intervalo_horas, fecha_inicio=datetime.now())
-    df_plan = st.session_state.df_dosis.copy()
-
-    fila_hoy_antigua = df_plan[df_plan["Fecha"] == fecha_hoy]
-    if not fila_hoy_antigua.empty:
-        df_nuevo.loc[df_nuevo['Fecha'] == fecha_hoy, 'Real (ml)']= fila_hoy_antigua['Real (ml)']
-    df_plan = df_plan[df_plan["Fecha"] < fecha_hoy]
-    df_final = pd.concat([df_plan, df_nuevo], ignore_index=True)
+    hoy = esquema_plan.hoy()
+    df_nuevo = esquema_plan.normalizar(crear_tabla(reduccion_diaria, ml_dia_actual, intervalo_horas, fecha_inicio=datetime.now()), hoy)
+    df_plan = st.session_state.df_dosis
 
-    # Sanitize to avoid JSON errors
-    df_final = df_final.replace([float('inf'), float('-inf')], 0)
-    df_final = df_final.fillna(0)
+    if hoy in df_plan.index and hoy in df_nuevo.index:
+        df_nuevo.loc[hoy, 'Real (ml)'] = df_plan.loc[hoy, 'Real (ml)']
+    df_final = pd.concat([df_plan[df_plan.index < hoy], df_nuevo])
 
-    save_plan_history_data(df_final, sheet_name="Plan Dosis")
+    save_plan_history_data(esquema_plan.a_hoja(df_final), sheet_name="Plan Dosis")
     print(f"Plan replanificado en la hoja 'PlanHistory'.")
 
-def add_toma(fecha_toma, ml_toma) -> DataFrame:
-    df = st.session_state.df_dosis.copy()
-    row = df[df["Fecha"] == fecha_toma.strftime('%Y-%m-%d')]
-    if not row.empty:
-        df.loc[df["Fecha"] == fecha_toma.strftime('%Y-%m-%d'), 'Real (ml)']+=ml_toma
-    save_plan_history_data(df, sheet_name="Plan Dosis")
+def add_toma(fecha_toma, ml_toma) -> dict:
+    """
+    Operación de escritura (para database.ejecutar_lote) que suma la toma al 'Real (ml)' del día.
+    Es un incremento que aplica el remoto: la copia del plan en la sesión puede estar desfasada.
+    """
+    dia = pd.Timestamp(fecha_toma).normalize()
+    return op_update_plan_rows("Plan Dosis", {dia.strftime('%Y-%m-%d'): {"Real (ml)": sumar(ml_toma)}})
@@ -1,23 +1,21 @@
-from datetime import datetime, timedelta
-from . import historial
+from datetime import datetime
+from . import esquema_plan, historial, instantanea
+import numpy as np
 import pandas as pd
 import streamlit as st
-from pandas import DataFrame
 
+from dao import trazas
 from dao.database import get_plan_history_data, save_plan_history_data
+from dao.operaciones import op_update_plan_rows, sumar
 
 
 
 
 def objetivo_ml():
-    df = st.session_state.df_tiempos.copy()
-    if df.empty or "Fecha" not in df.columns:
-        return 0
-    row = df[df["Fecha"] == pd.Timestamp.now(tz='Europe/Madrid').strftime('%Y-%m-%d')]
-    if not row.empty:
-        return float(row['Objetivo (ml)'].iloc[0])
-    else:
+    fila = instantanea.actual().fila_tiempo
+    if fila is None:
         return 0
+    return float(fila['Objetivo (ml)'])
 def mlDesdeUltimaToma():
     return  objetivo_ml()/(24*60) * historial.minDesdeUltimaToma()
 def mlAcumulados():
@@ -44,107 +42,70 @@ def mins_espera_saldo():
     return 0
 
 
+# Tope de días de un plan (con reducción <= 0 el objetivo nunca llega a 0)
+MAX_DIAS = 365
+
+
+def dias_plan(ml_dia_actual, reduccion_diaria):
+    """Días con objetivo > 0 de la serie ml_dia - k·reducción (admite arrays, con tope MAX_DIAS)."""
+    ml = np.asarray(ml_dia_actual, dtype=float)
+    red = np.asarray(reduccion_diaria, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # El 1e-9 evita un día extra con objetivo 0 por errores de redondeo (p.ej. 1.0 - 10·0.1)
+        dias = np.where(red > 0, np.ceil(ml / red - 1e-9), MAX_DIAS)
+    return np.clip(np.where(ml > 0, dias, 0), 0, MAX_DIAS).astype(int)
+
+
+@trazas.medido("reduccion_por_tiempo.crear_tabla")
 def crear_tabla(ml_dosis_actual, reduccion_diaria, ml_dia_actual):
+    n_dias = int(dias_plan(ml_dia_actual, reduccion_diaria))
+    objetivo = np.maximum(0.0, ml_dia_actual - np.arange(n_dias) * reduccion_diaria)
 
-    tabla = []
-    fecha_dia = datetime.now()
-    objetivo_dia = ml_dia_actual
-
-    while objetivo_dia > 0:
-        # Intervalo (minutos) = 24h / (Objetivo / Dosis)
-        intervalo_teorico = int((24 * 60) / (objetivo_dia / ml_dosis_actual)) if (objetivo_dia > 0 and ml_dosis_actual > 0) else 0
-        intervalo_horas = f"{intervalo_teorico // 60}h {intervalo_teorico % 60}m" if intervalo_teorico > 0 else "---"
-
-        tabla.append({
-            "Fecha": fecha_dia.strftime("%Y-%m-%d"),
-            "Objetivo (ml)": round(objetivo_dia, 2),
-            "Reducción Diaria": round(reduccion_diaria, 2),
-            "Dosis": round(ml_dosis_actual, 2),
-            "Intervalo": intervalo_horas,
-            "Real (ml)": 0,
-            "Estado": "",
-        })
-        objetivo_dia = max(0, objetivo_dia - reduccion_diaria)
-        fecha_dia += timedelta(days=1)
-        ml_dosis_actual = round(ml_dosis_actual, 2)
-    return pd.DataFrame(tabla)
+    # Intervalo (minutos) = 24h / (Objetivo / Dosis)
+    if ml_dosis_actual > 0:
+        with np.errstate(divide='ignore'):
+            intervalo = np.floor((24 * 60) / (objetivo / ml_dosis_actual)).astype(int)
+    else:
+        intervalo = np.zeros(n_dias, dtype=int)
+    texto = pd.Series(intervalo // 60).astype(str) + "h " + pd.Series(intervalo % 60).astype(str) + "m"
+
+    return pd.DataFrame({
+        "Fecha": pd.date_range(datetime.now(), periods=n_dias, freq="D").strftime("%Y-%m-%d"),
+        "Objetivo (ml)": objetivo.round(2),
+        "Reducción Diaria": round(reduccion_diaria, 2),
+        "Dosis": round(ml_dosis_actual, 2),
+        "Intervalo": texto.where(intervalo > 0, "---").to_numpy(),
+        "Real (ml)": 0,
+        "Estado": "",
+    })
+@trazas.medido("reduccion_por_tiempo.obtener_tabla")
 def obtener_tabla():
     """
     (LEE DATOS de 'PlanHistory')
-    Obtiene los datos del plan, los convierte a tipos correctos y calcula el estado.
+    Obtiene los datos del plan, tipados e indexados por Fecha, con el estado de cada día.
     """
-    df = get_plan_history_data(sheet_name="Plan Tiempo") # <- CORREGIDO
-    if df.empty:
-        return pd.DataFrame(columns=['Fecha', 'Objetivo (ml)', 'Real (ml)', 'Reducción Diaria', 'Dosis', 'Estado'])
-
-    # Manejo robusto de fechas
-    df['Fecha'] = pd.to_datetime(df['Fecha'])
-
-    # Si las fechas ya tienen zona horaria (tz-aware), convertimos directamente
-    if df['Fecha'].dt.tz is not None:
-         df['Fecha'] = df['Fecha'].dt.tz_convert('Europe/Madrid')
-    else:
-         # Si no tienen zona horaria (tz-naive), las localizamos primero
-         # Asumimos que vienen en UTC o sin zona, las tratamos como UTC y luego Madrid
-         df['Fecha'] = df['Fecha'].dt.tz_localize('UTC').dt.tz_convert('Europe/Madrid')
-
-
-    def calcular_estado(row):
-        if row["Fecha"] < datetime.now().strftime("%Y-%m-%d"):
-            # Ciclo cerrado (días anteriores)
-            if row['Real (ml)'] <= row['Objetivo (ml)'] + 0.5:
-                return "✅ Sí"
-            else:
-                return "❌ No"
-        elif row["Fecha"] == datetime.now().strftime("%Y-%m-%d"):
-            # Ciclo en curso (hoy)
-            return "⏳ En curso"
-        else:
-            # Días futuros
-            return "🔮 Futuro"
-
-
-    df["Fecha"] = df["Fecha"].dt.strftime('%Y-%m-%d')
-    df["Objetivo (ml)"] = pd.to_numeric(df['Objetivo (ml)'], errors='coerce').fillna(0)
-    df["Reducción Diaria"] = pd.to_numeric(df['Reducción Diaria'], errors='coerce').fillna(0)
-    df['Dosis'] = pd.to_numeric(df['Dosis'], errors='coerce').fillna(0)
-    # df['Intervalo'] = df["Fecha"].dt.strftime('%Y-%m-%d')
-    df['Real (ml)'] = pd.to_numeric( df['Real (ml)'], errors='coerce').fillna(0)
-    df['Estado'] = df.apply(calcular_estado, axis=1)
-
-    return df
+    return esquema_plan.normalizar(get_plan_history_data(sheet_name="Plan Tiempo"))
 def replanificar(dosis_media, reduccion_diaria, ml_dia_actual):
-    fecha_hoy = pd.Timestamp.now(tz='Europe/Madrid').strftime('%Y-%m-%d')
-    df_nuevo = crear_tabla(dosis_media, reduccion_diaria, ml_dia_actual)
-    df_plan = st.session_state.df_tiempos.copy()
-
-    fila_hoy_antigua = df_plan[df_plan["Fecha"] == fecha_hoy]
-    if not fila_hoy_antigua.empty:
-        df_nuevo.loc[df_nuevo['Fecha'] == fecha_hoy, 'Real (ml)']= fila_hoy_antigua['Real (ml)']
-    df_plan = df_plan[df_plan["Fecha"] < fecha_hoy]
-    df_final = pd.concat([df_plan, df_nuevo], ignore_index=True)
+    hoy = esquema_plan.hoy()
+    df_nuevo = esquema_plan.normalizar(crear_tabla(dosis_media, reduccion_diaria, ml_dia_actual), hoy)
+    df_plan = st.session_state.df_tiempos
 
-    # Sanitize to avoid JSON errors
-    df_final = df_final.replace([float('inf'), float('-inf')], 0)
-    df_final = df_final.fillna(0)
+    if hoy in df_plan.index and hoy in df_nuevo.index:
+        df_nuevo.loc[hoy, 'Real (ml)'] = df_plan.loc[hoy, 'Real (ml)']
+    df_final = pd.concat([df_plan[df_plan.index < hoy], df_nuevo])
 
-    save_plan_history_data(df_final, sheet_name="Plan Tiempo")
+    save_plan_history_data(esquema_plan.a_hoja(df_final), sheet_name="Plan Tiempo")
     print(f"Plan replanificado en la hoja 'PlanHistory'.")
 
-def add_toma(fecha_toma, ml_toma) -> DataFrame:
-    df = st.session_state.df_tiempos.copy()
-    row = df[df["Fecha"] == fecha_toma.strftime('%Y-%m-%d')]
-    if not row.empty:
-        df.loc[df["Fecha"] == fecha_toma.strftime('%Y-%m-%d'), 'Real (ml)']+=ml_toma
-
-
-    save_plan_history_data(df, sheet_name="Plan Tiempo")
+def add_toma(fecha_toma, ml_toma) -> dict:
+    """
+    Operación de escritura (para database.ejecutar_lote) que suma la toma al 'Real (ml)' del día.
+    Es un incremento que aplica el remoto: la copia del plan en la sesión puede estar desfasada.
+    """
+    dia = pd.Timestamp(fecha_toma).normalize()
+    return op_update_plan_rows("Plan Tiempo", {dia.strftime('%Y-%m-%d'): {"Real (ml)": sumar(ml_toma)}})
 def dosis_actual():
-    df = st.session_state.df_tiempos.copy()
-    if df.empty or "Fecha" not in df.columns:
-        return float(0)
-    row = df[df["Fecha"] == pd.Timestamp.now(tz='Europe/Madrid').strftime('%Y-%m-%d')]
-    if not row.empty:
-        return float(row['Dosis'].iloc[0])
-    else:
+    fila = instantanea.actual().fila_tiempo
+    if fila is None:
         return float(0)
+    return float(fila['Dosis'])
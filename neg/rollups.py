@@ -0,0 +1,150 @@
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+ZONA = 'Europe/Madrid'
+_NS_HORA = 3600 * 10**9
+
+
+@dataclass
+class ResumenDia:
+    total: float = 0.0
+    n: int = 0
+    intervalos: list = field(default_factory=list)  # Minutos desde la toma anterior de cada toma del día
+    min_intervalo: float | None = None
+    max_intervalo: float | None = None
+
+    @property
+    def media(self):
+        return self.total / self.n if self.n else 0.0
+
+
+class Rollups:
+    """
+    Agregados de las tomas que se mantienen al añadir o quitar tomas, sin recorrer el
+    historial: totales, nº de tomas, dosis media e intervalos mín./máx. por día, y sumas
+    acumuladas para los bloques de 24h hacia atrás desde "ahora".
+
+    Añadir una toma posterior a la última y quitar la última cuestan O(1) (los mín./máx.
+    de un día se recalculan sobre las pocas tomas de ese día al quitar).
+    """
+
+    def __init__(self):
+        self._dias = {}           # date -> ResumenDia (día natural en Europe/Madrid)
+        self._instantes = []      # ns UTC, ascendente
+        self._ml = []
+        self._acumulado = [0.0]   # _acumulado[i] = ml de las i primeras tomas
+
+    @classmethod
+    def desde_tomas(cls, tomas):
+        rollups = cls()
+        instantes = tomas.timestamps
+        dias = instantes.date
+        for ns, ml, dia in zip(instantes.as_unit('ns').asi8.tolist(), tomas.ml.tolist(), dias):
+            rollups._anadir_ns(ns, ml, dia)
+        return rollups
+
+    @staticmethod
+    def _ns(instante):
+        return pd.Timestamp(instante).tz_convert('UTC').value
+
+    @staticmethod
+    def _dia(ns):
+        return pd.Timestamp(ns, tz='UTC').tz_convert(ZONA).date()
+
+    def __len__(self):
+        return len(self._instantes)
+
+    def anadir(self, instante, ml):
+        """Añade una toma; devuelve False (sin cambios) si es anterior a la última registrada."""
+        ns = self._ns(instante)
+        if self._instantes and ns < self._instantes[-1]:
+            return False
+        self._anadir_ns(ns, ml, self._dia(ns))
+        return True
+
+    def _anadir_ns(self, ns, ml, fecha):
+        dia = self._dias.setdefault(fecha, ResumenDia())
+        dia.total += ml
+        dia.n += 1
+        if self._instantes:
+            intervalo = (ns - self._instantes[-1]) / 60e9
+            dia.intervalos.append(intervalo)
+            dia.min_intervalo = intervalo if dia.min_intervalo is None else min(dia.min_intervalo, intervalo)
+            dia.max_intervalo = intervalo if dia.max_intervalo is None else max(dia.max_intervalo, intervalo)
+        self._instantes.append(ns)
+        self._ml.append(ml)
+        self._acumulado.append(self._acumulado[-1] + ml)
+
+    def quitar_ultima(self):
+        if not self._instantes:
+            return
+        ns, ml = self._instantes.pop(), self._ml.pop()
+        self._acumulado.pop()
+        fecha = self._dia(ns)
+        dia = self._dias[fecha]
+        dia.total -= ml
+        dia.n -= 1
+        if self._instantes:
+            dia.intervalos.pop()
+            dia.min_intervalo = min(dia.intervalos, default=None)
+            dia.max_intervalo = max(dia.intervalos, default=None)
+        if dia.n == 0:
+            del self._dias[fecha]
+
+    def sincronizar(self, tomas):
+        """
+        Lleva los agregados al contenido de `tomas` (un TomasStore) si solo difiere en tomas
+        añadidas al final o en la última toma borrada. Devuelve False si hace falta reconstruir.
+        """
+        n, m = len(self), len(tomas)
+        previa = self._instantes[-1] if n else None
+        instantes = tomas.timestamps
+        if m >= n and (n == 0 or self._ns(instantes[n - 1]) == previa):
+            for instante, ml in zip(instantes[n:], tomas.ml[n:].tolist()):
+                self.anadir(instante, ml)
+            return True
+        if m == n - 1 and (m == 0 or self._ns(instantes[m - 1]) == self._instantes[m - 1]):
+            self.quitar_ultima()
+            return True
+        return False
+
+    def dia(self, fecha):
+        return self._dias.get(pd.Timestamp(fecha).date(), ResumenDia())
+
+    def totales(self, fechas):
+        """Total (ml) de cada día de `fechas` (redondeado: las tomas se guardan en float32)."""
+        return np.array([self.dia(f).total for f in fechas], dtype=float).round(3)
+
+    def por_dia(self):
+        """DataFrame por día (más reciente primero) con total, nº de tomas, media e intervalos."""
+        fechas = sorted(self._dias, reverse=True)
+        return pd.DataFrame({
+            "Fecha": fechas,
+            "Total (ml)": [round(self._dias[f].total, 3) for f in fechas],
+            "Tomas": [self._dias[f].n for f in fechas],
+            "Dosis media (ml)": [self._dias[f].media for f in fechas],
+            "Intervalo mín. (min)": [self._dias[f].min_intervalo for f in fechas],
+            "Intervalo máx. (min)": [self._dias[f].max_intervalo for f in fechas],
+        })
+
+    def bloques(self, ahora, n_bloques=4):
+        """
+        Bloques de 24h hacia atrás desde `ahora` (bloque 0 = últimas 24h) con total_ml,
+        media_ml y num_tomas. No incluye bloques anteriores a la primera toma.
+        """
+        columnas = ['total_ml', 'media_ml', 'num_tomas']
+        if not self._instantes:
+            return pd.DataFrame(columns=columnas, index=pd.Index([], name='bloque_n'))
+        fin = self._ns(ahora)
+        n_bloques = min(n_bloques, max(0, (fin - self._instantes[0]) // (24 * _NS_HORA)) + 1)
+        filas = []
+        for k in range(n_bloques):
+            hasta = bisect_right(self._instantes, fin - k * 24 * _NS_HORA)
+            desde = bisect_right(self._instantes, fin - (k + 1) * 24 * _NS_HORA)
+            num = hasta - desde
+            total = self._acumulado[hasta] - self._acumulado[desde]
+            filas.append((total, total / num if num else 0.0, num))
+        return pd.DataFrame(filas, columns=columnas, index=pd.Index(range(n_bloques), name='bloque_n'))
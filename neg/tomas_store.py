@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+ZONA = 'Europe/Madrid'
+
+
+class TomasStore:
+    """
+    Tomas registradas en dos arrays paralelos ordenados por instante: datetime64[ns] (UTC)
+    y float32 (ml). Es inmutable: las consultas por rango y por día son búsquedas binarias
+    que devuelven vistas, y añadir tomas crea un almacén nuevo.
+    """
+
+    def __init__(self, instantes=None, ml=None):
+        instantes = np.asarray([] if instantes is None else instantes, dtype='datetime64[ns]')
+        ml = np.asarray([] if ml is None else ml, dtype=np.float32)
+        if len(instantes) > 1 and (np.diff(instantes) < np.timedelta64(0)).any():
+            orden = np.argsort(instantes, kind='stable')
+            instantes, ml = instantes[orden], ml[orden]
+        instantes.flags.writeable = False
+        ml.flags.writeable = False
+        self._instantes = instantes
+        self._ml = ml
+
+    @classmethod
+    def desde_df(cls, df):
+        """A partir del DataFrame de tomas del backend (columnas 'timestamp' y 'ml')."""
+        if df is None or df.empty:
+            return cls()
+        instantes = pd.DatetimeIndex(df['timestamp'])
+        if instantes.tz is None:
+            instantes = instantes.tz_localize(ZONA)
+        validas = ~instantes.isna()
+        instantes = instantes[validas].tz_convert('UTC').tz_localize(None)
+        ml = pd.to_numeric(df['ml'], errors='coerce').fillna(0).to_numpy()[validas]
+        return cls(instantes.to_numpy(), ml)
+
+    @staticmethod
+    def _utc(instante):
+        instante = pd.Timestamp(instante)
+        if instante.tz is None:
+            instante = instante.tz_localize(ZONA)
+        return np.datetime64(instante.tz_convert('UTC').tz_localize(None).as_unit('ns'))
+
+    def __len__(self):
+        return len(self._instantes)
+
+    @property
+    def vacio(self):
+        return len(self._instantes) == 0
+
+    @property
+    def nbytes(self):
+        return self._instantes.nbytes + self._ml.nbytes
+
+    @property
+    def ml(self):
+        return self._ml
+
+    @property
+    def timestamps(self):
+        """Instantes de las tomas en Europe/Madrid, en orden ascendente."""
+        return pd.DatetimeIndex(self._instantes).tz_localize('UTC').tz_convert(ZONA)
+
+    def copy(self):
+        # Inmutable: la caché compartida puede repartir la misma instancia a todas las sesiones
+        return self
+
+    def last(self):
+        """(instante, ml) de la última toma o None si no hay ninguna."""
+        if self.vacio:
+            return None
+        return pd.Timestamp(self._instantes[-1]).tz_localize('UTC').tz_convert(ZONA), float(self._ml[-1])
+
+    def first(self):
+        if self.vacio:
+            return None
+        return pd.Timestamp(self._instantes[0]).tz_localize('UTC').tz_convert(ZONA), float(self._ml[0])
+
+    def between(self, inicio=None, fin=None):
+        """Tomas en [inicio, fin); sin zona horaria se interpretan en Europe/Madrid."""
+        ini = 0 if inicio is None else np.searchsorted(self._instantes, self._utc(inicio), side='left')
+        fin = len(self) if fin is None else np.searchsorted(self._instantes, self._utc(fin), side='left')
+        return TomasStore._vista(self._instantes[ini:fin], self._ml[ini:fin])
+
+    def by_day(self, fecha):
+        """Tomas del día natural `fecha` en Europe/Madrid."""
+        dia = pd.Timestamp(fecha).normalize()
+        dia = dia.tz_localize(None) if dia.tz is not None else dia
+        return self.between(dia.tz_localize(ZONA), (dia + pd.Timedelta(days=1)).tz_localize(ZONA))
+
+    def intervals(self):
+        """Minutos entre cada toma y la anterior (len(self) - 1 valores)."""
+        return np.diff(self._instantes).astype('timedelta64[s]').astype(np.float64) / 60
+
+    def con_tomas(self, timestamps, ml):
+        """Almacén nuevo con las tomas añadidas."""
+        nuevas = TomasStore.desde_df(pd.DataFrame({'timestamp': timestamps, 'ml': ml}))
+        return TomasStore(np.concatenate([self._instantes, nuevas._instantes]),
+                          np.concatenate([self._ml, nuevas._ml]))
+
+    def a_df(self):
+        """DataFrame 'timestamp'/'ml' (más reciente primero), para mostrar en tablas."""
+        return pd.DataFrame({'timestamp': self.timestamps[::-1], 'ml': self._ml[::-1].astype(float)})
+
+    @classmethod
+    def _vista(cls, instantes, ml):
+        vista = cls.__new__(cls)
+        vista._instantes, vista._ml = instantes, ml
+        return vista
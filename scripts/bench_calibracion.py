@@ -0,0 +1,96 @@
+"""
+Calibración de ka/hl con el pulso (neg/farmacocinetica.calibrar) sobre datos sintéticos.
+
+Genera tomas cada ~2,5 h y un pulso por minuto = base + pendiente · nivel con unos ka/hl
+conocidos más ruido, y compara la calibración en bloque con recorrer la misma rejilla par
+a par (lo que equivale a ir moviendo los sliders).
+
+    python scripts/bench_calibracion.py                 # 48 h de pulso, rejilla 24 x 24
+    python scripts/bench_calibracion.py --horas 96 --ruido 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from neg import farmacocinetica  # noqa: E402
+
+
+def sinteticos(horas, ka, hl, ruido, semilla=0):
+    """(pulso, timestamps, ml) con tomas desde 12 h antes del inicio del pulso."""
+    rng = np.random.default_rng(semilla)
+    fin = pd.Timestamp("2026-01-10 12:00", tz="Europe/Madrid")
+    inicio = fin - pd.Timedelta(hours=horas)
+    instantes, t = [], inicio - pd.Timedelta(hours=12)
+    while t < fin:
+        instantes.append(t)
+        t += pd.Timedelta(minutes=float(rng.normal(150, 20)))
+    timestamps = pd.DatetimeIndex(instantes)
+    ml = rng.uniform(2.0, 3.5, len(timestamps))
+
+    minutos = pd.date_range(inicio, fin, freq="1min")
+    nivel = farmacocinetica.curva_concentracion(minutos, timestamps, ml, ka, hl)
+    pulso = pd.Series(72 - 4.0 * nivel + rng.normal(0, ruido, len(minutos)), index=minutos)
+    pulso[rng.random(len(pulso)) < 0.05] = np.nan  # Minutos sin lectura del reloj
+    return pulso, timestamps, ml
+
+
+def par_a_par(pulso, timestamps, ml, n):
+    """Referencia: una curva y un ajuste lineal por cada par de la rejilla."""
+    observado = pulso.notna().to_numpy()
+    mejor = (-np.inf, None, None)
+    for ka in np.geomspace(*farmacocinetica.KA_RANGO, n):
+        for hl in np.geomspace(*farmacocinetica.HL_RANGO, n):
+            nivel = farmacocinetica.curva_concentracion(pulso.index, timestamps, ml, ka, hl)[observado]
+            r2 = np.corrcoef(nivel, pulso.to_numpy()[observado])[0, 1] ** 2
+            mejor = max(mejor, (r2, ka, hl), key=lambda x: x[0])
+    return mejor
+
+
+def medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = fn()
+        tiempos.append(time.perf_counter() - t0)
+    return resultado, statistics.median(tiempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--horas", type=int, default=48)
+    parser.add_argument("--ka", type=float, default=2.2)
+    parser.add_argument("--hl", type=float, default=1.1)
+    parser.add_argument("--ruido", type=float, default=2.0, help="Desviación del ruido del pulso (lpm)")
+    parser.add_argument("-n", type=int, default=24, help="Tamaño de la rejilla (n x n)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    pulso, timestamps, ml = sinteticos(args.horas, args.ka, args.hl, args.ruido)
+    print(f"{len(pulso)} minutos de pulso, {len(timestamps)} tomas; real: ka={args.ka} hl={args.hl}")
+
+    # Las sumas exponenciales en bloque deben coincidir con las del cálculo de la curva
+    t = farmacocinetica._horas_desde(pulso.index, pulso.index[0])
+    t_dosis = farmacocinetica._horas_desde(timestamps, pulso.index[0])
+    k = np.log(2) / np.geomspace(*farmacocinetica.HL_RANGO, args.n)
+    bloque = farmacocinetica._sumas_exponenciales(t, t_dosis, ml, k)
+    error = max(np.abs(bloque[i] - farmacocinetica._suma_exponencial(t, t_dosis, ml, ki)).max() for i, ki in enumerate(k))
+    print(f"Error máximo de las sumas en bloque: {error:.2e}")
+
+    calibracion, ms = medir(lambda: farmacocinetica.calibrar(pulso, timestamps, ml, n=args.n), args.repeticiones)
+    print(f"\nEn bloque:  {ms:8.1f} ms  ka={calibracion.ka:.3f} hl={calibracion.hl:.3f} "
+          f"R²={calibracion.r2:.4f} pendiente={calibracion.pendiente:.2f} lpm/ml")
+
+    (r2, ka, hl), ms_ref = medir(lambda: par_a_par(pulso, timestamps, ml, args.n), 1)
+    print(f"Par a par:  {ms_ref:8.1f} ms  ka={ka:.3f} hl={hl:.3f} R²={r2:.4f} ({args.n ** 2} curvas, sin refinar)")
+    print(f"\nAceleración: x{ms_ref / ms:.0f}")
+
+
+if __name__ == "__main__":
+    main()
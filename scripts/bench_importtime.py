@@ -0,0 +1,112 @@
+"""
+Coste de arranque en frío de app.py medido con `python -X importtime`.
+
+Ejecuta en un proceso nuevo solo los imports de nivel superior de app.py (sin el cuerpo
+de la página, que pediría datos al remoto) y resume el tiempo acumulado de cada módulo.
+
+    python scripts/bench_importtime.py                       # resumen y módulos más pesados
+    python scripts/bench_importtime.py --guardar base.json   # guarda la referencia
+    python scripts/bench_importtime.py --comparar base.json  # falla si empeora más del margen
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+
+# Librerías que solo deben cargarse si se usa el Bio-Análisis (streamlit ya carga plotly por
+# su cuenta, así que se comprueba en el código del repo y no en la salida de importtime)
+PEREZOSOS = ("plotly", "googleapiclient", "google_auth_oauthlib", "google.oauth2", "google.auth")
+
+_LINEA = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def imports_de_app():
+    """Sentencias import de nivel superior de app.py, como código ejecutable."""
+    with open(APP, encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    return "\n".join(ast.unparse(n) for n in arbol.body if isinstance(n, (ast.Import, ast.ImportFrom)))
+
+
+def imports_no_diferidos():
+    """[(fichero, módulo)] de los imports de nivel de módulo de librerías PEREZOSOS en el repo."""
+    encontrados = []
+    for carpeta, _, ficheros in os.walk(RAIZ):
+        if os.path.relpath(carpeta, RAIZ).split(os.sep)[0] in ("scripts", ".git", ".cache", "datos"):
+            continue
+        for fichero in (f for f in ficheros if f.endswith(".py")):
+            ruta = os.path.join(carpeta, fichero)
+            with open(ruta, encoding="utf-8") as f:
+                arbol = ast.parse(f.read())
+            for nodo in arbol.body:
+                nombres = [a.name for a in nodo.names] if isinstance(nodo, ast.Import) else \
+                    [nodo.module or ""] if isinstance(nodo, ast.ImportFrom) else []
+                encontrados += [(os.path.relpath(ruta, RAIZ), n) for n in nombres if n.startswith(PEREZOSOS)]
+    return encontrados
+
+
+def medir():
+    """{módulo: µs acumulados} de un arranque en frío y el total de los imports de primer nivel."""
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", imports_de_app()],
+                             cwd=RAIZ, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr.strip().splitlines()[-1])
+    modulos, total = {}, 0
+    for linea in proceso.stderr.splitlines():
+        m = _LINEA.match(linea)
+        if not m:
+            continue
+        acumulado, sangria, modulo = int(m.group(2)), len(m.group(3)), m.group(4)
+        modulos[modulo] = acumulado
+        if sangria == 1:  # Import de primer nivel: su acumulado ya incluye sus dependencias
+            total += acumulado
+    return modulos, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--guardar", metavar="JSON")
+    parser.add_argument("--comparar", metavar="JSON")
+    parser.add_argument("--margen", type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    medidas = [medir() for _ in range(args.repeticiones)]
+    total_ms = statistics.median(total for _, total in medidas) / 1000
+    modulos = {m: statistics.median(med[0].get(m, 0) for med in medidas) / 1000 for m in medidas[0][0]}
+
+    print(f"Imports de app.py: {total_ms:.0f} ms (mediana de {args.repeticiones} arranques en frío)")
+    print("\nMódulos más pesados (ms acumulados):")
+    for modulo, ms in sorted(modulos.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"  {ms:8.1f}  {modulo}")
+
+    no_diferidos = imports_no_diferidos()
+    for fichero, modulo in no_diferidos:
+        print(f"\n❌ {fichero} importa {modulo} al cargarse: debe importarse dentro de la función que lo usa")
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump({"total_ms": total_ms, "modulos": modulos}, f, indent=2)
+        print(f"\nReferencia guardada en {args.guardar}")
+
+    fallo = bool(no_diferidos)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        cambio = total_ms / base["total_ms"] - 1
+        print(f"\nFrente a la referencia: {base['total_ms']:.0f} ms -> {total_ms:.0f} ms ({cambio:+.0%})")
+        if cambio > args.margen:
+            print(f"❌ El arranque empeora más del {args.margen:.0%}")
+            fallo = True
+    sys.exit(1 if fallo else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Web App falso por HTTP: sirve dao/webapp_local.py (el mismo contrato de acciones que el
+Apps Script, incluida get_revisions) y la exportación CSV de las tomas, y cuenta las
+peticiones por acción para comprobar qué descarga la app en cada refresco.
+
+    python scripts/servidor_webapp_local.py --demo          # en http://127.0.0.1:8765
+
+y en config/constants.py:
+
+    URL_WEB_APP = "http://127.0.0.1:8765/exec"
+    URL_EXPORT_CSV = "http://127.0.0.1:8765/export"
+
+Con perfiles (config/perfiles.py), cada uno tiene su propio estado en /<perfil>/exec y
+/<perfil>/export. GET /estadisticas devuelve las peticiones recibidas por acción.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import perfiles  # noqa: E402
+from dao import webapp_local  # noqa: E402
+
+_peticiones = Counter()
+_lock = threading.Lock()
+
+
+class Manejador(BaseHTTPRequestHandler):
+    def _responder(self, respuesta, tipo="application/json"):
+        self.send_response(respuesta.status_code)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(respuesta.content)))
+        self.end_headers()
+        self.wfile.write(respuesta.content)
+
+    def _contar(self, accion):
+        with _lock:
+            _peticiones[accion] += 1
+
+    def _ruta(self):
+        """(perfil o None, ruta final, parámetros) de la petición: /exec o /<perfil>/exec."""
+        url = urlsplit(self.path)
+        partes = url.path.strip("/").split("/")
+        perfil = partes[0] if len(partes) > 1 else None
+        return perfil, partes[-1], dict(parse_qsl(url.query))
+
+    def do_GET(self):
+        perfil, ruta, params = self._ruta()
+        if ruta == "estadisticas":
+            with _lock:
+                self._responder(webapp_local.RespuestaLocal(dict(_peticiones)))
+            return
+        with perfiles.usar(perfil):
+            if ruta == "export":
+                self._contar("export_csv")
+                self._responder(webapp_local.exportar_csv(), tipo="text/csv")
+                return
+            self._contar(params.get("action"))
+            self._responder(webapp_local.get(params))
+
+    def do_POST(self):
+        perfil, _, _ = self._ruta()
+        longitud = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(longitud) or b"{}")
+        except ValueError:
+            self._responder(webapp_local.RespuestaLocal({"status": "error", "message": "JSON no válido"}, 400))
+            return
+        self._contar(payload.get("action", "add_toma"))
+        with perfiles.usar(perfil):
+            self._responder(webapp_local.post(payload))
+
+    def log_message(self, formato, *args):
+        logging.info(f"WEBAPP: {self.address_string()} {formato % args}")
+
+
+def sembrar_demo():
+    """Config y planes de ejemplo, como si se acabara de crear un plan desde la app."""
+    from config import constants
+    from neg import reduccion
+    constants.WEB_APP_LOCAL = True  # Las escrituras de crear_nuevo_plan van directas al estado en memoria
+    webapp_local.reiniciar(config={"dosis.checkpoint_ml": 0, "tiempos.checkpoint_ml": 0})
+    reduccion.crear_nuevo_plan(15, 3, datetime.time(2, 30), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--demo", action="store_true", help="Precargar config y planes de ejemplo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.demo:
+        sembrar_demo()
+    servidor = ThreadingHTTPServer((args.host, args.puerto), Manejador)
+    logging.info(f"WEBAPP: Web App falso en http://{args.host}:{args.puerto}/exec")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,144 @@
 import streamlit as st
-from dao import database
+from config import perfiles
+from dao import cache, database, journal, trazas
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-from neg import reduccion_por_dosis, reduccion_por_tiempo
+from neg import esquema_plan, reduccion_por_dosis, reduccion_por_tiempo
+from neg.rollups import Rollups
+from neg.tomas_store import TomasStore
+
+
+# Lecturas remotas independientes: clave en session_state -> (clave de la caché compartida, carga)
+_FUENTES = {
+    'config': (cache.CONFIG, database.get_config),
+    'df_tiempos': (cache.PLAN_TIEMPO, reduccion_por_tiempo.obtener_tabla),
+    'df_dosis': (cache.PLAN_DOSIS, reduccion_por_dosis.obtener_tabla),
+    'tomas': (cache.TOMAS, lambda: TomasStore.desde_df(database.get_excel_data())),
+}
 
 
 def load_config():
     """
     Carga la configuración en st.session_state si aún no ha sido cargada.
     Esta función es segura para ser llamada múltiples veces.
+    Los datos salen de la caché compartida por todas las sesiones (dao/cache.py): solo se
+    vuelven a copiar a session_state si otra sesión los ha recargado o han caducado. Las
+    fuentes que falten se piden a la vez, así que el tiempo de carga es el de la más lenta.
+    Encima se superponen las escrituras del diario aún no confirmadas (dao/journal.py).
+    Devuelve las claves de session_state recargadas (vacía si no ha cambiado nada).
+    """
+    versiones = st.session_state.setdefault('_versiones_cache', {})
+    pendientes = [clave for clave, (clave_cache, _) in _FUENTES.items()
+                  if clave not in st.session_state or versiones.get(clave) != cache.version(clave_cache)]
+    version_journal = journal.version()
+    cambio_journal = st.session_state.get('_version_journal') != version_journal
+    if cambio_journal or (pendientes and journal.pendientes()):
+        # La superposición del diario se aplica sobre copias limpias de todas las fuentes
+        pendientes = list(_FUENTES)
+    if not pendientes:
+        return []
+    logging.info(f"STATE: Cargando en paralelo desde la caché/base de datos: {pendientes}")
+
+    ctx = get_script_run_ctx()
+    perfil = perfiles.actual()
+
+    def _ejecutar(clave_cache, fn):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        with perfiles.usar(perfil), trazas.span(f"cargar.{clave_cache}"):
+            # Si la sonda de revisiones dice que el remoto no ha cambiado, no se descarga
+            return cache.obtener(clave_cache, fn, revision=lambda: database.revision(clave_cache),
+                                 forzar_remoto=database.forzar_remoto(clave_cache))
+
+    # Dos sesiones que piden la misma fuente a la vez comparten una sola descarga: cache.obtener
+    # es single-flight por (perfil, clave)
+    with ThreadPoolExecutor(max_workers=len(pendientes), thread_name_prefix="load_config") as pool:
+        futuros = {pool.submit(_ejecutar, *_FUENTES[clave]): clave for clave in pendientes}
+        valores = {futuros[futuro]: futuro.result() for futuro in as_completed(futuros)}
+
+    nuevas = {clave: cache.version(_FUENTES[clave][0]) for clave in pendientes}
+    if not cambio_journal and all(clave in st.session_state and versiones.get(clave) == version
+                                  for clave, version in nuevas.items()):
+        # Caducadas pero sin cambios en el remoto (sonda de revisiones): nada que recargar
+        return []
+    for clave, valor in valores.items():
+        st.session_state[clave] = valor
+        versiones[clave] = nuevas[clave]
+        logging.info(f"STATE: {clave} cargada y guardada en session_state.")
+
+    st.session_state._version_journal = version_journal
+    st.session_state.version_datos = st.session_state.get('version_datos', 0) + 1
+    if journal.pendientes():
+        (st.session_state.config, st.session_state.df_tiempos,
+         st.session_state.df_dosis, st.session_state.tomas) = journal.aplicar_pendientes(
+            st.session_state.config, st.session_state.df_tiempos, st.session_state.df_dosis, st.session_state.tomas)
+        logging.info("STATE: Escrituras pendientes del diario superpuestas en session_state.")
+    _actualizar_rollups()
+    return pendientes
+
+
+def _actualizar_rollups():
+    """
+    Agregados de las tomas (neg/rollups.py): solo se aplican las tomas añadidas o la borrada
+    desde la carga anterior. El 'Real (ml)' y el Estado de los planes salen de ellos.
+    """
+    rollups = st.session_state.get('rollups')
+    if rollups is None or not rollups.sincronizar(st.session_state.tomas):
+        rollups = Rollups.desde_tomas(st.session_state.tomas)
+        logging.info("STATE: Agregados de tomas reconstruidos.")
+    st.session_state.rollups = rollups
+
+    hoy = esquema_plan.hoy()
+    for clave in ('df_tiempos', 'df_dosis'):
+        df = st.session_state[clave]
+        df['Real (ml)'] = rollups.totales(df.index)
+        df['Estado'] = esquema_plan.estado(df, hoy)
+
+
+def por_version(nombre, calcular, *clave):
+    """
+    Resultado de `calcular()` guardado en la sesión mientras no cambien los datos cargados
+    (version_datos) ni `clave`: al volver a una sección ya vista no se recalcula nada.
+    """
+    vistas = st.session_state.setdefault('_vistas', {})
+    clave = (st.session_state.get('version_datos', 0), *clave)
+    if nombre not in vistas or vistas[nombre][0] != clave:
+        vistas[nombre] = (clave, calcular())
+    return vistas[nombre][1]
+
+
+def cambiar_perfil(perfil):
+    """
+    Pasa la sesión al perfil indicado (None: volver a la pantalla de entrada). Se vacía
+    session_state entero para que nada del perfil anterior (datos, vistas cacheadas,
+    agregados) sea visible desde el nuevo.
+    """
+    for clave in list(st.session_state):
+        del st.session_state[clave]
+    if perfil is None:
+        st.query_params.pop("perfil", None)
+        return
+    st.session_state.perfil = perfil
+    st.query_params["perfil"] = perfil
+    logging.info(f"STATE: Sesión en el perfil {perfil}.")
+
+
+def invalidate_config(*claves_cache):
+    """
+    Borra de la caché compartida y de st.session_state los datos indicados (claves de
+    dao/cache.py) para forzar su recarga; sin argumentos, todos.
+    Debe llamarse después de cualquier operación que modifique esos datos.
     """
-    if 'config' not in st.session_state:
-        logging.info("STATE: No se encontró config en session_state. Cargando desde la base de datos...")
-        st.session_state.config = database.get_config()
-        logging.info("STATE: Configuración cargada y guardada en session_state.")
-    if 'df_tiempos' not in st.session_state:
-        st.session_state.df_tiempos = reduccion_por_tiempo.obtener_tabla()
-        logging.info("STATE: df_tiempos cargada y guardada en session_state.")
-    if 'df_dosis' not in st.session_state:
-        st.session_state.df_dosis = reduccion_por_dosis.obtener_tabla()
-        logging.info("STATE: df_dosis cargada y guardada en session_state.")
-    if 'df_excel' not in st.session_state:
-        st.session_state.df_excel = database.get_excel_data()
-        logging.info("STATE: df_excel cargada y guardada en session_state.")
-
-
-def invalidate_config():
-    """
-    Borra la configuración de st.session_state para forzar una recarga.
-    Debe llamarse después de cualquier operación que modifique la config.
-    """
-    if 'config' in st.session_state:
-        del st.session_state.config
-        logging.info("STATE: Configuración invalidada (borrada) de session_state.")
-    if 'df_tiempos' in st.session_state:
-        del st.session_state.df_tiempos
-        logging.info("STATE: df_tiempos invalidada (borrada) de session_state.")
-    if 'df_dosis' in st.session_state:
-        del st.session_state.df_dosis
-        logging.info("STATE: df_dosis invalidada (borrada) de session_state.")
-    if 'df_excel' in st.session_state:
-        del st.session_state.df_excel
-        logging.info("STATE: df_dosis invalidada (borrada) de session_state.")
+    claves_cache = claves_cache or tuple(clave_cache for clave_cache, _ in _FUENTES.values())
+    cache.invalidar(*claves_cache)
+    for clave, (clave_cache, _) in _FUENTES.items():
+        if clave_cache in claves_cache and clave in st.session_state:
+            del st.session_state[clave]
+            logging.info(f"STATE: {clave} invalidada (borrada) de session_state.")
+    if 'instantanea' in st.session_state:
+        del st.session_state.instantanea
+    if cache.TOMAS in claves_cache and 'pk_checkpoint' in st.session_state:
+        del st.session_state.pk_checkpoint
+        logging.info("STATE: pk_checkpoint invalidado (borrado) de session_state.")
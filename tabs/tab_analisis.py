@@ -1,33 +1,75 @@
 import pandas as pd
 import streamlit as st
-import plotly.graph_objects as go
-import numpy as np
-from neg import logic
-from dao import database
-from plotly.subplots import make_subplots
+from neg import farmacocinetica, instantanea
+from dao import cache, database, trazas
+from state import por_version
 
 
 class AnalisisTab:
-    def __init__(self, df_excel):
-        self.df_excel = df_excel
-        self.resumen_bloques = logic.calcular_resumen_bloques(df_excel)
+    def __init__(self, tomas):
+        self.tomas = tomas
+        self.resumen_bloques = st.session_state.rollups.bloques(instantanea.actual().ahora)
         # self.media_3d =  self.obtener_media_3d(self.resumen_bloques)
 
     def render_parametros_simulacion(self):
-        with st.expander("🧪 AJUSTES FARMACOCINÉTICOS", expanded=False):
-            saved_hl = st.session_state.config.get("hl", 0.75)
-            saved_ka = st.session_state.config.get("ka", 3.0)
-
-            c1, c2 = st.columns(2)
-            hl = c1.slider("Vida media (h)", 0.5, 4.0, float(saved_hl), help="Tiempo en el que la sustancia se reduce a la mitad")
-            ka = c2.slider("Absorción (ka)", 0.5, 5.0, float(saved_ka), help="Velocidad de entrada en el sistema")
-
-            if hl != saved_hl or ka != saved_ka:
-                database.save_config({"hl": hl, "ka": ka})
+        with st.expander("🧪 AJUSTES FARMACOCINÉTICOS", expanded="pk_calibrado" in st.session_state):
+            if "pk_calibrado" in st.session_state:
+                st.success(st.session_state.pop("pk_calibrado"))
+            if st.button("🎯 Calibrar con el pulso", help="Busca la vida media y la absorción que mejor explican el pulso de la ventana de Google Fit"):
+                self.render_calibracion()
+
+            saved_hl = float(st.session_state.config.get("hl", 0.75))
+            saved_ka = float(st.session_state.config.get("ka", 3.0))
+
+            # En un formulario: mover los sliders no recarga la página ni guarda hasta pulsar Guardar
+            with st.form("ajustes_pk", border=False):
+                c1, c2 = st.columns(2)
+                hl = c1.slider("Vida media (h)", 0.5, 4.0, saved_hl, help="Tiempo en el que la sustancia se reduce a la mitad")
+                ka = c2.slider("Absorción (ka)", 0.5, 5.0, saved_ka, help="Velocidad de entrada en el sistema")
+                if st.form_submit_button("Guardar") and (hl != saved_hl or ka != saved_ka):
+                    self._guardar_parametros(ka, hl)
 
             return ka, hl
 
-    def _render_grafica_principal(self, df_completo):
+    def _guardar_parametros(self, ka, hl):
+        database.save_config({"hl": hl, "ka": ka})
+        st.session_state.config.update({"hl": hl, "ka": ka})
+        cache.invalidar(cache.CONFIG)
+
+    def render_calibracion(self):
+        """Ajusta ka/hl al pulso de la ventana actual y los guarda (una sola vez por ventana de datos)."""
+        with trazas.span("cargar.google_fit"):
+            # Trae el pulso nuevo al almacén local; el ajuste usa las lecturas sin interpolar
+            cache.obtener(cache.GOOGLE_FIT, database.get_google_fit_data)
+            df_pulso = database.get_pulso_guardado()
+        if df_pulso.empty:
+            st.info("Sin pulso de Google Fit para calibrar.")
+            return
+        pulso = df_pulso['hr']
+        # Ventana de datos: el pulso disponible y las tomas registradas
+        ventana = (pulso.index.min(), pulso.index.max(), int(pulso.notna().sum()), len(self.tomas), self.tomas.last())
+        previa = st.session_state.get("pk_calibracion")
+        if previa is not None and previa[0] == ventana:
+            calibracion = previa[1]
+        else:
+            with trazas.span("analisis.calibrar"):
+                calibracion = farmacocinetica.calibrar(pulso, self.tomas.timestamps, self.tomas.ml)
+            st.session_state.pk_calibracion = (ventana, calibracion)
+
+        if calibracion is None:
+            st.info(f"Hacen falta al menos {farmacocinetica.MIN_PUNTOS_PULSO} minutos de pulso y alguna toma para calibrar.")
+            return
+        self._guardar_parametros(round(calibracion.ka, 2), round(calibracion.hl, 2))
+        st.session_state.pk_calibrado = (
+            f"Vida media {calibracion.hl:.2f} h, absorción {calibracion.ka:.2f} "
+            f"(R² {calibracion.r2:.2f}, {calibracion.pendiente:+.1f} lpm por ml, {calibracion.n_puntos} minutos de pulso)")
+        st.rerun()
+
+    def _grafica_principal(self, df_completo):
+        # plotly solo se carga cuando se pinta el Bio-Análisis
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
         fig = make_subplots(specs=[[{"secondary_y": True}]])
         fig.add_trace(go.Scatter(x=df_completo.index, y=df_completo['hr'],
                                  name="Pulso (LPM)", line=dict(color="#FF4B4B")), secondary_y=False)
@@ -35,10 +77,11 @@ class AnalisisTab:
                                  name="Nivel Estimado (ml)", fill='tozeroy',
                                  line=dict(color="rgba(0,150,255,0.5)")), secondary_y=True)
         fig.update_layout(height=400, hovermode="x unified", margin=dict(l=0, r=0, t=20, b=0))
-        st.plotly_chart(fig, width='stretch')
+        return fig
+
+    def _grafica_tendencia(self):
+        import plotly.graph_objects as go
 
-    def _render_grafica_tendencia(self):
-        st.markdown("---")
         if len(self.resumen_bloques) >= 2:
             df_t = self.resumen_bloques.iloc[1:4].iloc[::-1]
             media_3d=self.obtener_media_3d(self.resumen_bloques)
@@ -46,23 +89,34 @@ class AnalisisTab:
             fig_bar.add_trace(go.Bar(x=df_t.index, y=df_t['total_ml'], name="Consumo Diario"))
             fig_bar.add_trace(go.Scatter(x=df_t.index, y=[media_3d] * len(df_t), name="Media", line=dict(dash='dash', color='red')))
             fig_bar.update_layout(height=300, title="Consumo últimos 3 días")
-            st.plotly_chart(fig_bar, width='stretch')
+            return fig_bar
+        return None
+
+    def _graficas(self, df_fit, ka, hl):
+        df_completo = self.rellenar_datos_sin_frecuencia(df_fit, self.tomas)
+        df_completo['ghb_active'] = self.calcular_concentracion_dinamica(df_completo, self.tomas, ka, hl)
+        return self._grafica_principal(df_completo), self._grafica_tendencia()
     def render_grafica(self, hl: float, ka: float):
         try:
-            df_fit = database.get_google_fit_data()
-            df_completo = self.rellenar_datos_sin_frecuencia(df_fit, self.df_excel)
-            df_completo['ghb_active'] = self.calcular_concentracion_dinamica(df_completo, self.df_excel, ka, hl)
-
-            self._render_grafica_principal(df_completo)
-            self._render_grafica_tendencia()
+            with trazas.span("cargar.google_fit"):
+                df_fit = cache.obtener(cache.GOOGLE_FIT, database.get_google_fit_data)
+            # Las gráficas se rehacen solo si cambian los datos, el pulso, ka/hl o el minuto actual
+            principal, tendencia = por_version(
+                "analisis.graficas", lambda: self._graficas(df_fit, ka, hl),
+                ka, hl, cache.version(cache.GOOGLE_FIT), instantanea.actual().ahora.floor('1min'))
+
+            st.plotly_chart(principal, width='stretch')
+            st.markdown("---")
+            if tendencia is not None:
+                st.plotly_chart(tendencia, width='stretch')
 
         except Exception as e:
             st.warning(f"Conecta Google Fit para ver el análisis cardíaco: {e}")
-    def rellenar_datos_sin_frecuencia(self,df_fit, df_excel):
+    def rellenar_datos_sin_frecuencia(self,df_fit, tomas):
         ahora=pd.Timestamp.now(tz='Europe/Madrid')
         # Determinar el punto de inicio
         if df_fit.empty:
-            inicio = df_excel['timestamp'].min() if not df_excel.empty else ahora
+            inicio = tomas.first()[0] if not tomas.vacio else ahora
         else:
             inicio = df_fit.index.max()
 
@@ -72,27 +126,45 @@ class AnalisisTab:
             return pd.concat([df_fit, df_relleno]).sort_index()
         return df_fit
 
-    def calcular_concentracion_dinamica(self,df_final, df_excel, ka_val, hl_val):
-        k_el = np.log(2) / hl_val
+    def calcular_concentracion_dinamica(self,df_final, tomas, ka_val, hl_val):
         timeline = df_final.index
-        concentracion = np.zeros(len(timeline))
-
-        for _, row in df_excel.iterrows():
-            # Calcular tiempo transcurrido desde cada toma en horas
-            t = (timeline - row['timestamp']).total_seconds() / 3600
-            mask = t >= 0
-
-            # Evitar división por cero si ka == k_el
-            curr_ka = ka_val if ka_val != k_el else ka_val + 0.01
+        curva = self._curva_incremental(timeline, tomas, ka_val, hl_val)
 
-            factor_escala = curr_ka / (curr_ka - k_el)
-            curva = row['ml'] * factor_escala * (np.exp(-k_el * t[mask]) - np.exp(-curr_ka * t[mask]))
-            concentracion[mask] += curva
-
-        res = pd.Series(concentracion, index=timeline)
+        res = curva.copy()
         res[res < 0.05] = 0  # Limpiar ruido visual bajo
         return res
 
+    def _curva_incremental(self, timeline, tomas, ka_val, hl_val):
+        """
+        Reutiliza la curva y el checkpoint PK del rerun anterior: solo se calculan los
+        puntos posteriores al checkpoint con las tomas nuevas. Si cambian ka/hl, las
+        tomas ya incorporadas o el inicio del timeline, se recalcula todo.
+        Curva y checkpoint viven en session_state: solo ahorran cálculo mientras la sesión
+        sobrevive entre refrescos, es decir, con el refresco en sitio de app.py (fragmento
+        refresco_datos), no con una recarga de la página, que abre una sesión nueva.
+        """
+        previa = st.session_state.get("pk_curva")
+        checkpoint = st.session_state.get("pk_checkpoint")
+
+        curva = None
+        if previa is not None and checkpoint is not None and len(timeline) > 0 \
+                and checkpoint.vigente(ka_val, hl_val, tomas.timestamps):
+            conocida = previa.reindex(timeline[timeline <= checkpoint.timestamp])
+            if not conocida.isna().any():
+                nuevos = timeline[timeline > checkpoint.timestamp]
+                valores, checkpoint = farmacocinetica.avanzar_curva(
+                    nuevos, tomas.timestamps, tomas.ml, ka_val, hl_val, checkpoint=checkpoint)
+                curva = pd.concat([conocida, pd.Series(valores, index=nuevos)])
+
+        if curva is None:
+            valores, checkpoint = farmacocinetica.avanzar_curva(
+                timeline, tomas.timestamps, tomas.ml, ka_val, hl_val)
+            curva = pd.Series(valores, index=timeline)
+
+        st.session_state.pk_curva = curva
+        st.session_state.pk_checkpoint = checkpoint
+        return curva
+
     def obtener_media_3d(self,resumen):
         if len(resumen) >= 4:
             return resumen.iloc[1:4]['total_ml'].mean()
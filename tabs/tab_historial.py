@@ -1,9 +1,12 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 
+from state import por_version
+
 class HistorialTab:
-    def __init__(self, df):
-        self.df = df
+    def __init__(self, tomas):
+        self.tomas = tomas
 
     def _formatear_delta(self, x):
         if pd.isnull(x): return "---"
@@ -12,18 +15,33 @@ class HistorialTab:
         minutos = (total_segundos % 3600) // 60
         return f"{horas}h {minutos}min"
 
-    def render_tabla_historial(self):
-        if not self.df.empty:
-            df_hist = self.df.copy().sort_values('timestamp', ascending=True)
-            df_hist['diff'] = df_hist['timestamp'].diff()
-            df_hist['Intervalo Real'] = df_hist['diff'].apply(self._formatear_delta)
-
-            df_display = df_hist.sort_values('timestamp', ascending=False)
-            df_display['Fecha'] = df_display['timestamp'].dt.strftime('%d/%m/%Y')
-            df_display['Hora'] = df_display['timestamp'].dt.strftime('%H:%M')
-            df_display['Dosis'] = df_display['ml'].apply(lambda x: f"{x:.2f} ml")
+    def _tabla_historial(self):
+        # Ya viene ordenado: el intervalo de cada toma es respecto a la anterior
+        diffs = pd.to_timedelta(np.concatenate([[np.nan], self.tomas.intervals()]), unit='min')
+        df_display = self.tomas.a_df()
+        df_display['Intervalo Real'] = [self._formatear_delta(x) for x in diffs[::-1]]
+        df_display['Fecha'] = df_display['timestamp'].dt.strftime('%d/%m/%Y')
+        df_display['Hora'] = df_display['timestamp'].dt.strftime('%H:%M')
+        df_display['Dosis'] = df_display['ml'].apply(lambda x: f"{x:.2f} ml")
+        return df_display[['Fecha', 'Hora', 'Dosis', 'Intervalo Real']]
 
-            st.dataframe(df_display[['Fecha', 'Hora', 'Dosis', 'Intervalo Real']], width='stretch', hide_index=True)
+    def render_tabla_historial(self):
+        if not self.tomas.vacio:
+            st.dataframe(por_version("historial.tabla", self._tabla_historial), width='stretch', hide_index=True)
         else:
             st.info("No hay datos registrados todavía.")
 
+    def _resumen_diario(self):
+        resumen = st.session_state.rollups.por_dia()
+        return resumen.style.format({
+            "Total (ml)": "{:.2f}",
+            "Dosis media (ml)": "{:.2f}",
+            "Intervalo mín. (min)": "{:.0f}",
+            "Intervalo máx. (min)": "{:.0f}",
+        }, na_rep="---")
+
+    def render_resumen_diario(self):
+        if len(st.session_state.rollups) == 0:
+            return
+        st.dataframe(por_version("historial.resumen", self._resumen_diario), width='stretch', hide_index=True)
+
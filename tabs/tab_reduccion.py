@@ -1,5 +1,8 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
+from dao import cache
+from dao.database import save_config
 from neg import reduccion
 
 from state import invalidate_config
@@ -31,8 +34,7 @@ class ReduccionTab:
                 "plan.fecha_inicio_plan": 0,
                 "plan.checkpoint_fecha": 0,
            })
-           invalidate_config()
-           st.cache_data.clear()
+           invalidate_config(cache.CONFIG)
            st.rerun()
 
         if c1.button("💾 NUEVO PLAN"):
@@ -42,8 +44,7 @@ class ReduccionTab:
                 st.session_state.get("intervalo_dia_actual"),
                 st.session_state.get("reduccion_diaria"))
             st.success("Configuración del plan guardada.")
-            invalidate_config()
-            st.cache_data.clear()
+            invalidate_config(cache.CONFIG, cache.PLAN_TIEMPO, cache.PLAN_DOSIS)
             st.rerun()
 
         if st.session_state.config.get("plan.fecha_inicio_plan") and c4.button("💾 ACTUALIZAR PLAN"):
@@ -53,6 +54,23 @@ class ReduccionTab:
                 st.session_state.get("intervalo_dia_actual"),
                 st.session_state.get("reduccion_diaria"))
             st.success("Configuración del plan guardada.")
-            invalidate_config()
-            st.cache_data.clear()
+            invalidate_config(cache.CONFIG, cache.PLAN_TIEMPO, cache.PLAN_DOSIS)
             st.rerun()
+
+        self.render_explorador()
+
+    def render_explorador(self):
+        """Compara alternativas de plan antes de guardarlo: rejilla de reducción × dosis × intervalo."""
+        with st.expander("🔍 Explorar alternativas"):
+            c1, c2, c3 = st.columns(3)
+            red_min, red_max = c1.slider("Reducción diaria (ml)", 0.05, 3.0, (0.25, 1.5), step=0.05)
+            dosis_min, dosis_max = c2.slider("Dosis (ml)", 0.5, 10.0, (2.0, 4.0), step=0.5)
+            itv_min, itv_max = c3.slider("Intervalo (min)", 30, 480, (90, 180), step=30)
+
+            df = reduccion.explorar_planes(
+                st.session_state.get("ml_dia_actual"),
+                np.arange(red_min, red_max + 1e-9, 0.05),
+                np.arange(dosis_min, dosis_max + 1e-9, 0.5),
+                np.arange(itv_min, itv_max + 1, 30))
+            st.caption(f"{len(df)} combinaciones desde {st.session_state.get('ml_dia_actual')} ml/día")
+            st.dataframe(df.sort_values(["Días (tiempo)", "Reducción Diaria"]), hide_index=True, width='stretch')
@@ -3,15 +3,15 @@ import math
 import streamlit as st
 import pandas as pd
 
-from dao import database
-from neg import reduccion_por_dosis, reduccion_por_tiempo, reduccion
-from state import invalidate_config
+from config import constants
+from dao import cache, database, journal
+from neg import instantanea, reduccion_por_dosis, reduccion_por_tiempo, reduccion
 
 import time
 
 class TomaTab:
-    def __init__(self, df):
-        self.df = df
+    def __init__(self, tomas):
+        self.tomas = tomas
         st.session_state.visualizacion_activa = st.session_state.config.get("visualizacion_activa", "tiempo")
 
     def mostrar_registro(self):
@@ -38,20 +38,22 @@ class TomaTab:
                    reduccion.guardar_toma(st.session_state.get("fecha_toma_input"),
                                           st.session_state.get("hora_toma_input"),
                                           st.session_state.get("dosis_toma"))
-                   st.success("Registrado")
+                   st.success("Registrado en el diario local; se enviará al servidor en segundo plano")
                    time.sleep(1)
-                   invalidate_config()
-                   st.cache_data.clear()
+                   # El diario ha cambiado: load_config superpone la toma pendiente en el próximo rerun
                    st.rerun()
 
                except Exception as e:
                    st.error(f"Error: {e}")
 
-    def mostrar_metricas(self):
-        ahora = pd.Timestamp.now(tz='Europe/Madrid')
-        ultima_toma = self.df['timestamp'].max() if not self.df.empty else ahora
-        min_desde_ultima_toma = (ahora - ultima_toma).total_seconds() / 60
+    def mostrar_pendientes(self):
+        pendientes = journal.pendientes()
+        if pendientes:
+            tomas = [op for lote in pendientes for op in lote["ops"] if op.get("action") in (None, "add_toma")]
+            st.warning(f"⏳ {len(tomas)} toma(s) pendiente(s) de confirmar por el servidor: "
+                       + ", ".join(f"{t['fecha']} {t['hora']} ({float(t['ml']):.2f} ml)" for t in tomas))
 
+    def mostrar_metricas(self):
         # --- CABECERA CON TÍTULO Y BOTÓN ---
         col_titulo, col_boton = st.columns([3, 1])
 
@@ -69,6 +71,7 @@ class TomaTab:
                     # Guardar preferencia
                     database.save_config({"visualizacion_activa": nuevo_modo})
                     st.session_state.config["visualizacion_activa"] = nuevo_modo
+                    cache.invalidar(cache.CONFIG)
                     st.rerun()
             else:
                 if st.button("🔄 Cambiar a Tiempo"):
@@ -77,10 +80,16 @@ class TomaTab:
                     # Guardar preferencia
                     database.save_config({"visualizacion_activa": nuevo_modo})
                     st.session_state.config["visualizacion_activa"] = nuevo_modo
+                    cache.invalidar(cache.CONFIG)
                     st.rerun()
         
         st.markdown("---") # Separador visual
+        self.metricas_en_vivo()
 
+    @st.fragment(run_every=constants.METRICAS_REFRESCO_SEGUNDOS)
+    def metricas_en_vivo(self):
+        # Se repinta sola con un "ahora" nuevo sobre los datos ya cargados (sin pedir nada al remoto)
+        min_desde_ultima_toma = instantanea.construir().min_desde_ultima_toma()
         tipo_visualizacion = st.session_state.visualizacion_activa
 
         if tipo_visualizacion == "tiempo":
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from config import constants
+from dao import almacen_pulso, google_fit
+
+MINUTO_MS = 60_000
+
+
+def _bucket(minuto, bpm=None):
+    """Bucket de un minuto como los de users.dataset.aggregate (sin punto si no hubo lectura)."""
+    puntos = [] if bpm is None else [{
+        "startTimeNanos": str(minuto * MINUTO_MS * 1_000_000),
+        "endTimeNanos": str((minuto + 1) * MINUTO_MS * 1_000_000 - 1),
+        "dataTypeName": "com.google.heart_rate.summary",
+        "originDataSourceId": "raw:com.google.heart_rate.bpm:reloj",
+        "value": [{"fpVal": bpm, "mapVal": []}, {"fpVal": bpm + 4, "mapVal": []}, {"fpVal": bpm - 4, "mapVal": []}],
+    }]
+    return {
+        "startTimeMillis": str(minuto * MINUTO_MS),
+        "endTimeMillis": str((minuto + 1) * MINUTO_MS),
+        "dataset": [{"dataSourceId": "derived:com.google.heart_rate.summary:com.google.android.gms:aggregated",
+                     "point": puntos}],
+    }
+
+
+def _respuesta(lecturas):
+    """Respuesta de aggregate con un bucket por minuto; `lecturas` es {minuto: lpm o None}."""
+    return {"bucket": [_bucket(minuto, bpm) for minuto, bpm in sorted(lecturas.items())]}
+
+
+@pytest.fixture
+def almacen(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "PULSO_DIR", str(tmp_path / "pulso"))
+    monkeypatch.setattr(constants, "PERFILES", {})
+
+
+@pytest.fixture
+def ahora_minuto(monkeypatch):
+    minuto = 29_000_000  # 2025-02-19 en minutos desde epoch
+    monkeypatch.setattr(time, "time", lambda: minuto * 60 + 30)
+    return minuto
+
+
+def test_parsear_agregado_ignora_los_minutos_sin_lectura():
+    minutos, bpm = google_fit.parsear_agregado(_respuesta({100: 61.5, 101: None, 102: 70.0}))
+    assert minutos.dtype == np.int64 and bpm.dtype == np.float32
+    assert minutos.tolist() == [100, 102]
+    assert bpm.tolist() == [61.5, 70.0]
+
+
+def test_parsear_agregado_vacio():
+    for raw in ({}, {"bucket": []}, _respuesta({100: None})):
+        minutos, bpm = google_fit.parsear_agregado(raw)
+        assert len(minutos) == 0 and len(bpm) == 0
+
+
+def test_anadir_fusiona_ordena_y_se_queda_la_lectura_mas_reciente(almacen):
+    almacen_pulso.anadir(np.array([10, 12, 11], dtype=np.int64), np.array([60, 62, 61], dtype=np.float32))
+    almacen_pulso.anadir(np.array([12, 13, 12], dtype=np.int64), np.array([70, 73, 72], dtype=np.float32))
+
+    minutos, bpm = almacen_pulso.cargar()
+    assert minutos.tolist() == [10, 11, 12, 13]
+    assert bpm.tolist() == [60, 61, 72, 73]
+    assert almacen_pulso.ultimo_minuto() == 13
+
+
+def test_anadir_sin_cambios_no_reescribe(almacen):
+    almacen_pulso.anadir(np.array([10, 11], dtype=np.int64), np.array([60, 61], dtype=np.float32))
+    antes = os.stat(almacen_pulso._ruta()).st_mtime_ns
+    almacen_pulso.anadir(np.array([11], dtype=np.int64), np.array([61], dtype=np.float32))
+    assert os.stat(almacen_pulso._ruta()).st_mtime_ns == antes
+
+
+def test_ventana_recorta_por_minuto(almacen):
+    almacen_pulso.anadir(np.arange(100, 110, dtype=np.int64), np.arange(60, 70, dtype=np.float32))
+
+    df = almacen_pulso.ventana(103, 105)
+    assert df['hr'].tolist() == [63.0, 64.0, 65.0]
+    assert str(df.index.tz) == "Europe/Madrid"
+    assert df.index[0].timestamp() == 103 * 60
+    assert len(almacen_pulso.ventana(105)) == 5
+    assert almacen_pulso.ventana(200).empty
+
+
+def test_lecturas_concurrentes_con_anadir_ven_versiones_completas(almacen):
+    # Cada minuto m se guarda con m % 1000 lpm: una lectura que mezcle versiones no cuadra
+    def escribir():
+        for inicio in range(0, 20_000, 500):
+            minutos = np.arange(inicio, inicio + 500, dtype=np.int64)
+            almacen_pulso.anadir(minutos, (minutos % 1000).astype(np.float32))
+
+    escritor = threading.Thread(target=escribir)
+    escritor.start()
+    lecturas = 0
+    while escritor.is_alive() or lecturas == 0:
+        minutos, bpm = almacen_pulso.cargar()
+        assert len(minutos) == len(bpm)
+        assert np.array_equal(np.asarray(minutos) % 1000, np.asarray(bpm))
+        df = almacen_pulso.ventana(0)
+        if not df.empty:
+            assert np.array_equal((df.index.as_unit('s').asi8 // 60) % 1000, df['hr'].to_numpy())
+        lecturas += 1
+    escritor.join()
+    assert almacen_pulso.ultimo_minuto() == 19_999
+
+
+def test_lee_el_formato_de_dos_ficheros(almacen):
+    ruta_min, ruta_bpm = almacen_pulso._rutas_antiguas()
+    os.makedirs(os.path.dirname(ruta_min))
+    np.save(ruta_min, np.array([10, 11], dtype=np.int64))
+    np.save(ruta_bpm, np.array([60, 61], dtype=np.float32))
+    assert almacen_pulso.ultimo_minuto() == 11
+
+    almacen_pulso.anadir(np.array([12], dtype=np.int64), np.array([62], dtype=np.float32))
+    assert almacen_pulso.ventana(0)['hr'].tolist() == [60.0, 61.0, 62.0]
+    assert not os.path.exists(ruta_min) and not os.path.exists(ruta_bpm)
+
+
+def test_get_google_fit_data_vuelve_a_pedir_el_solape(almacen, ahora_minuto, monkeypatch):
+    ultimo = ahora_minuto - 60
+    almacen_pulso.anadir(np.arange(ultimo - 600, ultimo + 1, dtype=np.int64),
+                         np.full(601, 60, dtype=np.float32))
+    tarde = ultimo - 30  # Lectura que el reloj sincronizó después del último refresco
+    peticiones = []
+
+    def pedir(inicio_ms, fin_ms):
+        peticiones.append((inicio_ms, fin_ms))
+        return _respuesta({tarde: 90.0, ultimo: 60.0, ultimo + 1: 65.0})
+
+    monkeypatch.setattr(google_fit, "pedir_agregado", pedir)
+    df = google_fit.get_google_fit_data(horas=24)
+
+    assert peticiones == [((ultimo + 1 - constants.FIT_SOLAPE_HORAS * 60) * MINUTO_MS, (ahora_minuto * 60 + 30) * 1000)]
+    minutos, bpm = almacen_pulso.cargar()
+    assert bpm[minutos.tolist().index(tarde)] == 90.0
+    assert almacen_pulso.ultimo_minuto() == ultimo + 1
+    # Serie por minuto interpolada para la gráfica; el almacén guarda solo las lecturas
+    assert df.index.to_series().diff().dropna().eq(np.timedelta64(1, "m")).all()
+
+
+def test_get_google_fit_data_sin_red_sirve_lo_guardado(almacen, ahora_minuto, monkeypatch):
+    almacen_pulso.anadir(np.array([ahora_minuto - 10, ahora_minuto - 8], dtype=np.int64),
+                         np.array([60, 64], dtype=np.float32))
+
+    def sin_red(inicio_ms, fin_ms):
+        raise ConnectionError("sin red")
+
+    monkeypatch.setattr(google_fit, "pedir_agregado", sin_red)
+    df = google_fit.get_google_fit_data(horas=1)
+    assert df['hr'].tolist() == [60.0, 62.0, 64.0]
+    # Para calibrar: solo las lecturas reales, sin el minuto interpolado
+    assert google_fit.get_pulso_guardado(horas=1)['hr'].tolist() == [60.0, 64.0]
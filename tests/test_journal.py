@@ -0,0 +1,124 @@
+import time
+
+import pytest
+import requests
+
+from config import constants
+from dao import journal, webapp_local
+from dao.operaciones import op_toma
+
+
+@pytest.fixture
+def diario(tmp_path, monkeypatch):
+    for nombre, valor in {"PERFILES": {}, "BACKEND": "sheets", "WEB_APP_LOCAL": True, "SYNC_SHEETS": False,
+                          "CACHE_DIR": str(tmp_path / "cache"), "JOURNAL_PATH": str(tmp_path / "journal.jsonl"),
+                          "JOURNAL_FALLIDOS_PATH": str(tmp_path / "fallidos.jsonl"),
+                          "JOURNAL_REINTENTO_MAX_SEGUNDOS": 0.05, "JOURNAL_MAX_INTENTOS": 3}.items():
+        monkeypatch.setattr(constants, nombre, valor)
+    webapp_local.reiniciar()
+    post = webapp_local.post
+    yield
+    # El hilo de reenvío sobrevive al test: se deja sin pendientes antes de restaurar las rutas
+    webapp_local.post = post
+    journal.arrancar()
+    _esperar(lambda: not journal.pendientes())
+
+
+def _esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while not condicion():
+        assert time.monotonic() < limite, journal.estado()
+        time.sleep(0.02)
+
+
+def _fallar_primer_lote(monkeypatch, respuesta):
+    """El Web App responde `respuesta` (o la lanza si es una excepción) al primer lote registrado."""
+    post = webapp_local.post
+    primero = []
+
+    def post_con_fallo(payload):
+        primero[:] = primero or [payload.get("id")]
+        if payload.get("id") == primero[0]:
+            if isinstance(respuesta, Exception):
+                raise respuesta
+            return respuesta
+        return post(payload)
+
+    monkeypatch.setattr(webapp_local, "post", post_con_fallo)
+
+
+def _tomas():
+    return [t["hora"] for t in webapp_local._datos()["tomas"]]
+
+
+def test_lote_confirmado(diario):
+    version = journal.version()
+    journal.registrar([op_toma("01/10/2026", "10:00:00", 2.0)])
+    assert journal.version() != version
+    _esperar(lambda: not journal.pendientes())
+    assert _tomas() == ["10:00:00"]
+    assert journal.estado()["ultimo_error"] is None
+
+
+def test_lote_rechazado_se_descarta_sin_bloquear_los_siguientes(diario, monkeypatch):
+    _fallar_primer_lote(monkeypatch, webapp_local.RespuestaLocal(
+        {"status": "error", "message": "Acción desconocida: batch"}))
+    journal.registrar([op_toma("01/10/2026", "10:00:00", 2.0)])
+    journal.registrar([op_toma("01/10/2026", "11:00:00", 1.5)])
+
+    _esperar(lambda: not journal.pendientes())
+    assert _tomas() == ["11:00:00"]
+    estado = journal.estado()
+    assert estado["descartados"] == 1
+    assert "Acción desconocida" in estado["ultimo_descarte"]
+    assert estado["ultimo_error"] is None  # El segundo lote sí se envió
+
+
+def test_error_pasajero_se_reintenta_y_agota_los_intentos(diario, monkeypatch):
+    _fallar_primer_lote(monkeypatch, webapp_local.RespuestaLocal({"status": "error"}, status_code=500))
+    journal.registrar([op_toma("01/10/2026", "10:00:00", 2.0)])
+    journal.registrar([op_toma("01/10/2026", "11:00:00", 1.5)])
+
+    _esperar(lambda: not journal.pendientes())
+    assert _tomas() == ["11:00:00"]
+    assert journal.estado()["descartados"] == 1
+    assert "HTTP 500" in journal.estado()["ultimo_descarte"]
+
+
+def test_sin_conexion_no_gasta_intentos(diario, monkeypatch):
+    _fallar_primer_lote(monkeypatch, requests.ConnectionError("sin red"))
+    journal.registrar([op_toma("01/10/2026", "10:00:00", 2.0)])
+    journal.registrar([op_toma("01/10/2026", "11:00:00", 1.5)])
+
+    time.sleep(0.5)  # Bastante más que JOURNAL_MAX_INTENTOS reintentos
+    assert len(journal.pendientes()) == 2
+    assert journal.estado()["descartados"] == 0
+    assert "sin red" in journal.estado()["ultimo_error"]
+
+
+def test_replica_en_orden_desde_el_backend_local(diario, tmp_path, monkeypatch):
+    from dao import database
+
+    for nombre, valor in {"BACKEND": "sqlite", "SYNC_SHEETS": True, "SQLITE_PATH": str(tmp_path / "local.db"),
+                          "JOURNAL_REPLICA_PATH": str(tmp_path / "replica.jsonl"),
+                          "JOURNAL_REPLICA_FALLIDOS_PATH": str(tmp_path / "replica_fallidos.jsonl")}.items():
+        monkeypatch.setattr(constants, nombre, valor)
+    post = webapp_local.post
+    fallos = []
+
+    def post_falla_una_vez(payload):
+        if not fallos:
+            fallos.append(payload.get("id"))
+            return webapp_local.RespuestaLocal({"status": "error"}, status_code=503)
+        return post(payload)
+
+    monkeypatch.setattr(webapp_local, "post", post_falla_una_vez)
+    database.enviar_toma_api("01/10/2026", "10:00:00", 2.0)
+    database.enviar_toma_api("01/10/2026", "11:00:00", 1.5)
+    database.eliminar_ultima_toma()
+
+    # El primer envío falla: se reintenta sin adelantar a los siguientes
+    _esperar(lambda: not journal.pendientes("replica"))
+    assert _tomas() == ["10:00:00"]
+    assert journal.estado("replica")["descartados"] == 0
+    assert len(fallos) == 1
@@ -0,0 +1,38 @@
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pytest
+
+from neg import reduccion_por_dosis
+
+INICIO = datetime(2026, 10, 1)
+
+
+def _tabla_bucle(reduccion_diaria, ml_dia_actual, intervalo_horas):
+    """Objetivo y dosis de cada día con el bucle de la versión original de crear_tabla."""
+    objetivo_dia, filas = float(ml_dia_actual), []
+    intervalo_val = intervalo_horas.hour + intervalo_horas.minute / 60.0
+    tomas_dia = 24 / intervalo_val
+    while objetivo_dia >= 0.1 and len(filas) < 365:
+        filas.append((round(objetivo_dia, 2), round(objetivo_dia / tomas_dia, 2)))
+        objetivo_dia = max(0.0, objetivo_dia - reduccion_diaria)
+    return filas
+
+
+@pytest.mark.parametrize("ml, reduccion, dias", [(10, 0.3, 33), (3, 0.1, 29), (1, 0.3, 3), (7.3, 0.5, 15)])
+def test_dias_y_valores_como_el_bucle(ml, reduccion, dias):
+    tabla = reduccion_por_dosis.crear_tabla(reduccion, ml, time(3, 0), fecha_inicio=INICIO)
+    assert len(tabla) == dias
+    assert list(zip(tabla["Objetivo (ml)"], tabla["Dosis"])) == _tabla_bucle(reduccion, ml, time(3, 0))
+    assert tabla["Fecha"].iloc[-1] == (INICIO + timedelta(days=dias - 1)).strftime("%Y-%m-%d")
+
+
+def test_dosis_redondeada_como_round():
+    tabla = reduccion_por_dosis.crear_tabla(0.5, 7.3, time(3, 0), fecha_inicio=INICIO)
+    # 7.3 - 7·0.5 = 3.8 (3.7999... en coma flotante) entre 8 tomas
+    assert tabla["Dosis"].iloc[7] == 0.47
+
+
+def test_dias_plan_con_arrays():
+    dias = reduccion_por_dosis.dias_plan(np.array([10, 3, 1, 0.05, 5]), np.array([0.3, 0.1, 0.3, 0.1, 0]))
+    assert dias.tolist() == [33, 29, 3, 0, reduccion_por_dosis.MAX_DIAS]
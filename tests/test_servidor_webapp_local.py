@@ -0,0 +1,131 @@
+import importlib.util
+import json
+import os
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from config import constants
+from dao import cache, resiliente
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _cargar_servidor():
+    spec = importlib.util.spec_from_file_location(
+        "servidor_webapp_local", os.path.join(_RAIZ, "scripts", "servidor_webapp_local.py"))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def _app():
+    import streamlit as st
+    import state
+    st.session_state.recargadas = state.load_config()
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    """Web App falso por HTTP con los planes de demo; la app le habla como al Apps Script."""
+    servidor = _cargar_servidor()
+    for nombre, valor in {"PERFILES": {}, "BACKEND": "sheets", "WEB_APP_LOCAL": True,
+                          "CACHE_DIR": str(tmp_path / "cache"), "JOURNAL_PATH": str(tmp_path / "journal.jsonl"),
+                          "PULSO_DIR": str(tmp_path / "pulso")}.items():
+        monkeypatch.setattr(constants, nombre, valor)
+    servidor.sembrar_demo()
+
+    http = ThreadingHTTPServer(("127.0.0.1", 0), servidor.Manejador)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http.server_address[1]}"
+    monkeypatch.setattr(constants, "WEB_APP_LOCAL", False)
+    monkeypatch.setattr(constants, "URL_WEB_APP", f"{url}/exec")
+    monkeypatch.setattr(constants, "URL_EXPORT_CSV", f"{url}/export")
+    cache._almacen.clear()
+    resiliente._circuitos.clear()
+    yield url
+    http.shutdown()
+    http.server_close()
+    cache._almacen.clear()
+
+
+def _peticiones(url):
+    with urllib.request.urlopen(f"{url}/estadisticas") as respuesta:
+        return json.load(respuesta)
+
+
+def _desde(antes, despues):
+    return {accion: n - antes.get(accion, 0) for accion, n in despues.items() if n != antes.get(accion, 0)}
+
+
+def _revisiones(url):
+    with urllib.request.urlopen(f"{url}/exec?action=get_revisions") as respuesta:
+        return json.load(respuesta)["data"]
+
+
+def _caducar():
+    """Como si hubiera pasado el TTL de todas las entradas de la caché compartida."""
+    almacen = cache._almacen()
+    with almacen.lock:
+        for clave, (valor, _) in list(almacen.valores.items()):
+            almacen.valores[clave] = (valor, 0)
+
+
+def _escribir(url, payload):
+    peticion = urllib.request.Request(f"{url}/exec", data=json.dumps(payload).encode(),
+                                      headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(peticion) as respuesta:
+        assert json.load(respuesta)["status"] == "success"
+
+
+def test_refresco_sin_escrituras_solo_pide_revisiones(web_app):
+    at = AppTest.from_function(_app, default_timeout=30).run()
+    assert not at.exception
+    assert set(at.session_state.recargadas) == {"config", "df_tiempos", "df_dosis", "tomas"}
+    version_datos = at.session_state.version_datos
+
+    antes = _peticiones(web_app)
+    _caducar()
+    at.run()
+    assert _desde(antes, _peticiones(web_app)) == {"get_revisions": 1}
+    assert at.session_state.recargadas == []
+    assert at.session_state.version_datos == version_datos
+
+
+def test_una_escritura_solo_cambia_su_conjunto(web_app):
+    at = AppTest.from_function(_app, default_timeout=30).run()
+    revisiones = _revisiones(web_app)
+    versiones = {clave: cache.version(clave) for clave in (cache.CONFIG, cache.PLAN_TIEMPO, cache.PLAN_DOSIS, cache.TOMAS)}
+
+    _escribir(web_app, {"action": "save_config", "data": {"consumo.ml_dia": 12}})
+    nuevas = _revisiones(web_app)
+    assert {c for c in nuevas if nuevas[c] != revisiones.get(c)} == {"config"}
+
+    antes = _peticiones(web_app)
+    _caducar()
+    at.run()
+    # Solo se descarga la config; el resto se renueva con la sonda de revisiones
+    assert _desde(antes, _peticiones(web_app)) == {"get_revisions": 1, "get_config": 1}
+    assert at.session_state.config["consumo.ml_dia"] == 12
+    cambiadas = {clave for clave, version in versiones.items() if cache.version(clave) != version}
+    assert cambiadas == {cache.CONFIG}
+
+
+def test_toma_de_otro_cliente_llega_a_la_cache(web_app, monkeypatch):
+    # Snapshot de tomas siempre "antiguo": cada carga desde él lanzaría un refresco en segundo plano
+    monkeypatch.setattr(constants, "CACHE_REFRESCO_SEGUNDOS", 0)
+    at = AppTest.from_function(_app, default_timeout=30).run()
+    filas = len(at.session_state.tomas)
+
+    _escribir(web_app, {"fecha": "01/10/2026", "hora": "10:00:00", "ml": 2.5})
+    _caducar()
+    at.run()
+    # La revisión nueva obliga a sincronizar ya, no a servir el snapshot antiguo con esa revisión
+    assert len(at.session_state.tomas) == filas + 1
+
+    _caducar()
+    at.run()
+    assert len(at.session_state.tomas) == filas + 1